@@ -1,7 +1,8 @@
 import os
 import platform
+import sys
 import searchcake.libcreateWF as libcreateWF
-import pandas as pd
+from searchcake.flow.batch import run_batch
 
 import pepidentWFconfig as pwconf
 
@@ -22,10 +23,11 @@ def run(files, alleles, organism, massspec, MHC_class, workDir):
                                         'JOB_ID': workDir,
                                         'ALLELE_LIST': alleles})
 
+    # as many ruffus processes as the scheduler has cores
     if MHC_class == 'class I':
-        libcreateWF.run_libcreate_withNetMHC_WF(nrthreads= 4)
+        libcreateWF.run_libcreate_withNetMHC_WF()
     else:
-        libcreateWF.run_libcreate_WF(nrthreads=4)
+        libcreateWF.run_libcreate_WF()
 
 
 def processByBatch(allMzXMLs, sample, df):
@@ -62,16 +64,20 @@ def processByBatch(allMzXMLs, sample, df):
     MHC_class = MHC_class[0]
 
     run(files, alleles, organism, massspec, MHC_class, sample)
+    return 0
 
-def processAllBatches(files):
+def processAllBatches(files, parallel=2):
     #path = "{}/SysteMHC_Data/annotation/cleanedTable_id.csv".format(os.environ.get('SYSTEMHC'))
     #path = "/mnt/Systemhc/Data/data_annotation.csvh"
     path = "/mnt/Systemhc/Data/data_annotation_20170213.csv"
+    import pandas as pd
+
     df = pd.read_csv(path)
-    for sample in df["SampleID"].unique():
-        print ">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>{}<<<<<<<<<<<<<<<<<<<<<<<<<<<<<".format(sample)
-        print "\n\n\n\n"
-        processByBatch(files, sample, df)
+    # each sample in its own directory batch/<sample>, several of them at once
+    samples = [(str(sample), processByBatch, (files, sample, df)) for sample in df["SampleID"].unique()]
+    exitcodes = run_batch(samples, parallel=parallel)
+    print "failed samples: {}".format(", ".join(s for s, code in exitcodes.items() if code) or "none")
+    return 1 if any(exitcodes.values()) else 0
 
 
 if __name__ == '__main__':
@@ -87,7 +93,7 @@ if __name__ == '__main__':
     #files = pwconf.getMzXMLFiles("/mnt/Systemhc/data/SYSMHC00006/analysis/temp/")
     #files = pwconf.getMzXMLFiles("/mnt/Systemhc/wshao/test_2/data/")
      #   print files
-    processAllBatches(files)
+    sys.exit(processAllBatches(files))
     #run(files, "dummydir" + str(random.randint(1000,9999)))
 
 
@@ -1,7 +1,6 @@
 import os
 import platform
 import searchcake.libcreateWF as libcreateWF
-import pandas as pd
 import pepidentWFconfig as pwconf
 import ntpath
 import datetime
@@ -29,6 +28,8 @@ def run(files, db_path, work_dir):
 def processAllFiles(all_mz_xmls,work_dir):
     db_path = "{}/SysteMHC_Data/annotation/cleanedTable_id.csv".format(
         os.environ.get('SYSTEMHC'))
+    import pandas as pd
+
     df = pd.read_csv(db_path)
 
     filesIds = df['FileName']
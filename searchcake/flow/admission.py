@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Memory admission of search tasks. The peak RSS of every search is recorded against the size of its
+inputs (spectra of the mzXML, residues of the FASTA), and a new search reserves the memory predicted
+from that history with the core scheduler, so that concurrent searches stay within the budget.
+
+The history is kept in SEARCHCAKE_MEMORY_HISTORY, default ~/.searchcake/memory_history.json.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from searchcake.flow.executor import dispatched
+from searchcake.flow.procstats import PeakSampler
+from searchcake.flow.scheduler import CoreScheduler
+from searchcake.flow.statestore import task_info
+from searchcake.utils.filecache import FileLock, file_signature, read_json, write_json
+from searchcake.utils.mzxml import read_scan_offsets
+
+# records kept per engine
+history_size = 200
+# reserved by an engine without history
+default_memory = 2 * 1024 ** 3
+# headroom on top of predictions
+safety = 1.25
+# shorter runs are not recorded, they did not search (e.g. search cache hits)
+min_record_seconds = 10
+# searches sharing the machine at most, each is granted at least its share of the cores
+max_searches = 4
+
+
+def history_path():
+    return os.environ.get('SEARCHCAKE_MEMORY_HISTORY') or \
+        os.path.join(os.path.expanduser('~'), '.searchcake', 'memory_history.json')
+
+
+class MemoryHistory(object):
+    def __init__(self, path=None):
+        self.path = path or history_path()
+        self.lock = FileLock(self.path + '.lock')
+
+    def update(self, func):
+        with self.lock:
+            state = read_json(self.path)
+            result = func(state)
+            write_json(self.path, state)
+        return result
+
+    def residues(self, fasta):
+        """
+        :return: number of residues of a FASTA, remembered as long as the file does not change
+        """
+        key, signature = os.path.abspath(fasta), file_signature(fasta)
+        known = read_json(self.path).get('fasta', {}).get(key)
+        if known and known['signature'] == signature:
+            return known['residues']
+
+        residues = 0
+        with open(fasta, 'rb') as f:
+            for line in f:
+                if not line.startswith(b'>'):
+                    residues += len(line.strip())
+        self.update(lambda state: state.setdefault('fasta', {}).__setitem__(
+            key, {'signature': signature, 'residues': residues}))
+        return residues
+
+    def record(self, engine, spectra, residues, threads, peak):
+        def _record(state):
+            records = state.setdefault('engines', {}).setdefault(engine, [])
+            records.append({'spectra': spectra, 'residues': residues, 'threads': threads, 'peak': peak})
+            del records[:-history_size]
+
+        self.update(_record)
+
+    def predict(self, engine, spectra, residues):
+        """
+        :return: bytes a search of the given size is expected to need at most
+        """
+        records = read_json(self.path).get('engines', {}).get(engine, [])
+        if not records:
+            return default_memory
+        import numpy  # the workflow modules import this one, numpy is only needed here
+
+        peaks = numpy.array([r['peak'] for r in records], dtype=float)
+
+        # upper bound: a known peak grown linearly with the larger of the two input ratios
+        scale = numpy.array([max(1.0, float(spectra) / max(1, r['spectra']), float(residues) / max(1, r['residues']))
+                             for r in records])
+        prediction = (peaks * scale).min()
+        if len(records) >= 3:
+            x = numpy.array([[1.0, r['spectra'], r['residues']] for r in records])
+            fit = numpy.dot([1.0, spectra, residues], numpy.linalg.lstsq(x, peaks, rcond=-1)[0])
+            if fit > 0:
+                prediction = min(prediction, fit)
+        # never less than seen for an input at most as large
+        smaller = [r['peak'] for r in records if r['spectra'] <= spectra and r['residues'] <= residues]
+        return int(max([prediction] + smaller) * safety)
+
+
+@contextmanager
+def search_slot(engine, inifile, want=None):
+    """
+    Cores and memory for a search, sized from MZXML and DBASE of the task's ini:
+
+    with search_slot('Comet', infile) as threads:
+        sys.argv = [..., '--THREADS', str(threads)]
+
+    A search dispatched to a worker node (see flow.executor) is neither admitted nor recorded here,
+    the worker sets its threads.
+    """
+    if dispatched():
+        yield int(want or 1)
+        return
+    info = task_info(inifile)
+    history = MemoryHistory()
+    spectra = len(read_scan_offsets(info['MZXML']))
+    residues = history.residues(info['DBASE'])
+    memory = history.predict(engine, spectra, residues)
+
+    scheduler = CoreScheduler()
+    # ruffus may start a search per core, they would get a core each
+    granted = scheduler.acquire(want, max(1, scheduler.cores // max_searches), memory)
+    try:
+        start = time.time()
+        # the search runs in this process (flow.runner.run_local)
+        with PeakSampler(os.getpid()) as sampler:
+            yield granted
+        if time.time() - start >= min_record_seconds:
+            history.record(engine, spectra, residues, granted, sampler.peak)
+    finally:
+        scheduler.release(granted, memory)
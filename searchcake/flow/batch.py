@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Runs the workflows of several samples at once. Every sample runs in a process of its own with a
+directory of its own for ini, log and metrics files, all of them share the cores and memory of
+one ledger (see flow.scheduler), so the tail stages of one sample overlap with the searches of the
+next without oversubscribing the machine.
+"""
+import os
+import sys
+import time
+import traceback
+from multiprocessing import Process
+
+from searchcake.flow.runner import scoped_environ
+from searchcake.flow.scheduler import settings
+from searchcake.utils.filecache import makedirs
+
+
+def _run_sample(workdir, func, args):
+    os.chdir(workdir)
+    log = open('batch.log', 'a', 0)
+    os.dup2(log.fileno(), sys.stdout.fileno())
+    os.dup2(log.fileno(), sys.stderr.fileno())
+    try:
+        exitcode = func(*args) or 0
+    except SystemExit as e:
+        exitcode = 1 if e.code else 0
+    except BaseException:
+        traceback.print_exc()
+        exitcode = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(exitcode)
+
+
+def run_batch(samples, basedir='batch', parallel=2, cores=None, memory_budget=None):
+    """
+    :param samples: list of (name, func, args), func(*args) runs the workflow of a sample in the
+     current directory, which is basedir/name, and returns a non-zero exit code or raises if it
+     failed. Use the name as JOB_ID to keep the work directories apart as well.
+    :param parallel: samples running at once
+    :return: dict name -> exit code of the sample
+    """
+    basedir = os.path.abspath(basedir)
+    makedirs(basedir)
+    env = settings(cores, memory_budget)
+    env['SEARCHCAKE_LEDGER'] = os.environ.get('SEARCHCAKE_LEDGER') or os.path.join(basedir, 'cores.ledger')
+    with scoped_environ(env):
+        return _run_samples(samples, basedir, parallel)
+
+
+def _run_samples(samples, basedir, parallel):
+    todo, running, exitcodes = list(samples), {}, {}
+    while todo or running:
+        while todo and len(running) < parallel:
+            name, func, args = todo.pop(0)
+            workdir = os.path.join(basedir, name)
+            makedirs(workdir)
+            process = Process(target=_run_sample, args=(workdir, func, args))
+            process.start()
+            running[name] = process
+            print "sample %s started in %s" % (name, workdir)
+        for name, process in running.items():
+            if not process.is_alive():
+                process.join()
+                exitcodes[name] = process.exitcode
+                del running[name]
+                print "sample %s %s" % (name, 'done' if process.exitcode == 0 else 'FAILED, see batch.log')
+        time.sleep(1)
+    return exitcodes
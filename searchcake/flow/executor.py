@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+"""
+Executors of workflow tasks, chosen by SEARCHCAKE_EXECUTOR (executor= of the run_* functions):
+'local' or not set runs a task in the ruffus process, a directory on a shared file system queues
+it there for the workers of any number of nodes.
+
+Queue layout: jobs/<id>.json (app, argv, working directory and SEARCHCAKE_* environment of a
+task), locks/<id>.lock (claim of a worker, created exclusively and touched as heartbeat),
+results/<id>.json (status), logs/<id>.log (output of the task), workers/<id> (touched as heartbeat
+of a running worker). A claim without heartbeat for `stale` seconds is broken and the job runs
+again, failed jobs are retried too, both up to `retries` times. The ruffus task waits for the
+result, so ruffus still decides what runs, and its number of processes (SEARCHCAKE_CORES of the
+workflow process) should be the slots of all nodes. It fails if no worker is alive for `stale`
+seconds. Ages of heartbeats are taken against the clock file of the queue, touched through the
+same file system, the clocks of the nodes need not agree.
+
+Tasks cannot run in scratch on worker nodes (see flow.runner.run_settings), the copy back of
+their outputs would outlive them.
+
+Cores and memory of dispatched tasks are not admitted by the workflow process (see dispatched),
+a worker runs up to slots jobs at once and gives each of them its threads (--THREADS).
+
+usage: python -m searchcake.flow.executor worker QUEUE [--slots N] [--threads N] [--node NAME]
+       python -m searchcake.flow.executor stop QUEUE
+"""
+import argparse
+import errno
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import uuid
+from multiprocessing import Process
+
+from searchcake.utils.filecache import makedirs, read_json, write_json
+
+# seconds between heartbeats of a worker, after which a claim is stale, between polls
+heartbeat = 10
+stale = 60
+poll = 1.0
+retries = 2
+
+
+def settings(executor=None):
+    """
+    :param executor: 'local' or queue directory of worker nodes
+    """
+    if not executor:
+        return {}
+    return {'SEARCHCAKE_EXECUTOR': executor if executor == 'local' else os.path.abspath(executor)}
+
+
+def dispatched():
+    """
+    :return: True if tasks run on worker nodes, not in this process
+    """
+    return (os.environ.get('SEARCHCAKE_EXECUTOR') or 'local') != 'local'
+
+
+def get_executor():
+    name = os.environ.get('SEARCHCAKE_EXECUTOR') or 'local'
+    return LocalExecutor() if name == 'local' else QueueExecutor(name)
+
+
+def app_name(app):
+    return app if isinstance(app, basestring) else '%s:%s' % (app.__module__, app.__name__)
+
+
+class LocalExecutor(object):
+    def run(self, app, argv, stage=None):
+        from searchcake.flow.runner import run_local
+        run_local(app, argv, stage)
+
+
+class JobQueue(object):
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        for name in ('jobs', 'locks', 'results', 'logs', 'workers'):
+            makedirs(os.path.join(self.path, name))
+
+    def _file(self, kind, jobid, ext):
+        return os.path.join(self.path, kind, jobid + ext)
+
+    def now(self):
+        """
+        :return: time of the file system of the queue, to compare the modification times there with
+        """
+        clock = os.path.join(self.path, 'clock')
+        open(clock, 'a').close()
+        os.utime(clock, None)
+        return os.path.getmtime(clock)
+
+    def _age(self, path, now=None):
+        """
+        :return: seconds since path was modified, None if it is gone
+        """
+        try:
+            return (now or self.now()) - os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def submit(self, job):
+        job = dict(job, id=uuid.uuid4().hex, attempts=0, submitted=time.time())
+        write_json(self._file('jobs', job['id'], '.json'), job)
+        return job['id']
+
+    def result(self, jobid):
+        return read_json(self._file('results', jobid, '.json')) or None
+
+    def remove(self, jobid, log=False):
+        for kind, ext in (('jobs', '.json'), ('results', '.json')) + ((('logs', '.log'),) if log else ()):
+            if os.path.exists(self._file(kind, jobid, ext)):
+                os.remove(self._file(kind, jobid, ext))
+
+    def _claim(self, lock):
+        """
+        :return: content of a lock (worker and token of the claim) and its age, None if it is gone
+        """
+        try:
+            with open(lock) as f:
+                claim = f.read()
+        except IOError:
+            return None, None
+        return claim, self._age(lock)
+
+    def _lock(self, jobid, worker):
+        lock = self._file('locks', jobid, '.lock')
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            claim, age = self._claim(lock)
+            if age is None:
+                return self._lock(jobid, worker)
+            if age < stale:
+                return False
+            breaking = '%s.%s.stale' % (lock, worker.replace(':', '_'))
+            try:
+                os.rename(lock, breaking)
+            except OSError:
+                return False
+            taken, age = self._claim(breaking)
+            if taken != claim or age < stale:
+                # another worker broke the stale claim and claimed the job since it was read, or its
+                # worker is alive after all: the claim goes back, unless the job was claimed again
+                # meanwhile, the worker whose claim is lost then finds it broken (see finish)
+                try:
+                    os.link(breaking, lock)
+                except OSError:
+                    pass
+                os.remove(breaking)
+                return False
+            os.remove(breaking)
+            return self._lock(jobid, worker)
+        # the token tells claims of the same worker apart
+        os.write(fd, '%s\n%s' % (worker, uuid.uuid4().hex))
+        os.close(fd)
+        return True
+
+    def claim(self, worker):
+        """
+        :return: the oldest job without result and valid claim, claimed for worker, None if there is none
+        """
+        jobs = [read_json(os.path.join(self.path, 'jobs', name)) for name in os.listdir(os.path.join(self.path, 'jobs'))
+                if name.endswith('.json')]
+        for job in sorted([j for j in jobs if j], key=lambda j: j['submitted']):
+            if self.result(job['id']) or not self._lock(job['id'], worker):
+                continue
+            job = read_json(self._file('jobs', job['id'], '.json'))
+            if not job or self.result(job['id']):
+                self.release(job['id'] if job else None)
+                continue
+            job['attempts'] += 1
+            if job['attempts'] > retries + 1:
+                self.finish(job, worker, None)
+                continue
+            write_json(self._file('jobs', job['id'], '.json'), job)
+            return job
+        return None
+
+    def owner(self, jobid):
+        try:
+            with open(self._file('locks', jobid, '.lock')) as f:
+                return f.read().split('\n')[0]
+        except IOError:
+            return None
+
+    def heartbeat(self, jobid, worker):
+        if self.owner(jobid) == worker:
+            try:
+                os.utime(self._file('locks', jobid, '.lock'), None)
+            except OSError:
+                pass  # being broken
+
+    def release(self, jobid):
+        if jobid and os.path.exists(self._file('locks', jobid, '.lock')):
+            os.remove(self._file('locks', jobid, '.lock'))
+
+    def finish(self, job, worker, exitcode):
+        """
+        Records the result of a job, or puts it back into the queue if it failed and has retries left.
+
+        :param exitcode: None if the job was lost
+        """
+        if self.owner(job['id']) != worker:
+            return  # claim broken meanwhile, the job runs elsewhere
+        if exitcode == 0 or job['attempts'] > retries:
+            status = 'ok' if exitcode == 0 else 'failed'
+            write_json(self._file('results', job['id'], '.json'), {'status': status, 'worker': worker,
+                                                                  'exitcode': exitcode, 'attempts': job['attempts']})
+        self.release(job['id'])
+
+    def alive(self, worker):
+        open(self._file('workers', worker.replace(':', '_'), ''), 'a').close()
+        os.utime(self._file('workers', worker.replace(':', '_'), ''), None)
+
+    def retire(self, worker):
+        if os.path.exists(self._file('workers', worker.replace(':', '_'), '')):
+            os.remove(self._file('workers', worker.replace(':', '_'), ''))
+
+    def live_workers(self):
+        """
+        :return: workers with a heartbeat in the last stale seconds
+        """
+        now = self.now()
+        workers = os.listdir(os.path.join(self.path, 'workers'))
+        ages = [(w, self._age(os.path.join(self.path, 'workers', w), now)) for w in workers]
+        return sorted(w for w, age in ages if age is not None and age < stale)
+
+    def stop(self):
+        open(os.path.join(self.path, 'stop'), 'w').close()
+
+    def stopped(self):
+        return os.path.exists(os.path.join(self.path, 'stop'))
+
+
+class QueueExecutor(object):
+    def __init__(self, path):
+        self.queue = JobQueue(path)
+
+    def run(self, app, argv, stage=None, timeout=None):
+        """
+        Queues the task and waits for its result.
+
+        :param timeout: seconds to wait at most, default without limit while workers are alive
+        :raise RuntimeError: if it failed on all its attempts, no worker was alive for stale seconds
+         or the timeout passed
+        """
+        env = dict((k, v) for k, v in os.environ.items() if k.startswith('SEARCHCAKE_') and k != 'SEARCHCAKE_EXECUTOR')
+        jobid = self.queue.submit({'app': app_name(app), 'argv': argv, 'stage': stage, 'cwd': os.getcwd(),
+                                   'env': env})
+        start = last_alive = time.time()
+        while True:
+            result = self.queue.result(jobid)
+            if result:
+                break
+            if self.queue.live_workers():
+                last_alive = time.time()
+            elif time.time() - last_alive > stale:
+                self.queue.remove(jobid)
+                raise RuntimeError('task %s %s not run, no worker alive on %s for %d seconds' % (
+                    app_name(app), ' '.join(argv), self.queue.path, stale))
+            if timeout is not None and time.time() - start > timeout:
+                self.queue.remove(jobid)
+                raise RuntimeError('task %s %s not done after %d seconds' % (app_name(app), ' '.join(argv), timeout))
+            time.sleep(poll)
+        # the log of a failed task is kept
+        self.queue.remove(jobid, log=result['status'] == 'ok')
+        if result['status'] != 'ok':
+            raise RuntimeError('task %s %s failed %d times, last on %s, see %s' % (
+                app_name(app), ' '.join(argv), result['attempts'], result['worker'],
+                self.queue._file('logs', jobid, '.log')))
+
+
+def with_threads(argv, threads):
+    """
+    :return: argv with the value of --THREADS replaced by threads
+    """
+    argv = list(argv)
+    if '--THREADS' in argv and argv.index('--THREADS') + 1 < len(argv):
+        argv[argv.index('--THREADS') + 1] = str(threads)
+    return argv
+
+
+def _run_job(job, logfile):
+    os.chdir(job['cwd'])
+    log = open(logfile, 'a', 0)
+    os.dup2(log.fileno(), sys.stdout.fileno())
+    os.dup2(log.fileno(), sys.stderr.fileno())
+    os.environ.update(job['env'])
+    from searchcake.flow.runner import run_local
+    try:
+        run_local(job['app'], job['argv'], job['stage'])
+    except SystemExit as e:
+        sys.exit(1 if e.code else 0)
+
+
+class Worker(object):
+    """
+    Runs up to slots jobs of a queue at once, until the queue is stopped and no job is left running.
+    Jobs taking threads get threads each, default an equal share of the cores of the node.
+    """
+
+    def __init__(self, path, slots=1, node=None, threads=None):
+        self.queue = JobQueue(path)
+        self.slots = slots
+        self.threads = int(threads or max(1, multiprocessing.cpu_count() // slots))
+        self.id = '%s:%d' % (node or socket.gethostname(), os.getpid())
+        # job id -> (job, process)
+        self.running = {}
+
+    def run(self):
+        try:
+            self._run()
+        finally:
+            self.queue.retire(self.id)
+
+    def _run(self):
+        last_beat = 0
+        while self.running or not self.queue.stopped():
+            for jobid, (job, process) in self.running.items():
+                if not process.is_alive():
+                    process.join()
+                    self.queue.finish(job, self.id, process.exitcode)
+                    del self.running[jobid]
+            if time.time() - last_beat > heartbeat:
+                self.queue.alive(self.id)
+                for jobid in self.running:
+                    self.queue.heartbeat(jobid, self.id)
+                last_beat = time.time()
+            job = self.queue.claim(self.id) if len(self.running) < self.slots else None
+            if job:
+                job['argv'] = with_threads(job['argv'], self.threads)
+                process = Process(target=_run_job, args=(job, self.queue._file('logs', job['id'], '.log')))
+                process.start()
+                self.running[job['id']] = (job, process)
+            else:
+                time.sleep(poll)
+
+
+def _work(path, slots, node, threads):
+    Worker(path, slots, node, threads).run()
+
+
+class LocalNodes(object):
+    """
+    Worker processes standing in for nodes, on this machine:
+
+    with LocalNodes(queue, 3):
+        run_peptide_WF(executor=queue)
+    """
+
+    def __init__(self, path, nodes=2, slots=1, threads=None):
+        self.path = os.path.abspath(path)
+        self.nodes = nodes
+        self.slots = slots
+        # the nodes share this machine
+        self.threads = threads or max(1, multiprocessing.cpu_count() // (nodes * slots))
+        self.processes = []
+
+    def __enter__(self):
+        queue = JobQueue(self.path)
+        if queue.stopped():
+            os.remove(os.path.join(self.path, 'stop'))
+        for i in range(self.nodes):
+            process = Process(target=_work, args=(self.path, self.slots, 'node%d' % (i + 1), self.threads))
+            process.start()
+            self.processes.append(process)
+        return self
+
+    def __exit__(self, *exc):
+        JobQueue(self.path).stop()
+        for process in self.processes:
+            process.join()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Workers of a shared file system queue of workflow tasks.')
+    parser.add_argument('command', choices=['worker', 'stop'])
+    parser.add_argument('queue', help='queue directory, SEARCHCAKE_EXECUTOR of the workflow')
+    parser.add_argument('--slots', type=int, default=1, help='jobs run at once')
+    parser.add_argument('--threads', type=int, help='threads of a job, default cores / slots')
+    parser.add_argument('--node', help='name of the worker, default the host name')
+    args = parser.parse_args(argv)
+    if args.command == 'stop':
+        JobQueue(args.queue).stop()
+    else:
+        Worker(args.queue, args.slots, args.node, args.threads).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Content based up-to-date checks of workflow tasks, for incremental runs (SEARCHCAKE_INCREMENTAL=1).
+
+A task is identified by its app and output ini. Its key covers the app code and template, the
+sources of the searchcake package (source_digest), the arguments and the input inis: every key/value, the content of the files they point to (mzXML, FASTA, compiled
+parameters, upstream results) and the executables of the *_EXE keys. After a successful run the
+output inis are kept with the key in a manifest (SEARCHCAKE_MANIFESTS, default .manifests in the
+working directory, which survives the removal of the *.ini files). A later run of the task with
+the same key only restores its output inis, as long as the result files they point to are unchanged.
+"""
+import glob
+import hashlib
+import inspect
+import json
+import os
+import re
+from distutils.spawn import find_executable
+
+from configobj import ConfigObj
+
+from searchcake.utils.filecache import file_digest, file_signature, makedirs, read_json, write_json
+
+# arguments and ini keys which do not change the results
+IGNORED = ('THREADS',)
+# files of the package which make its code
+SOURCE_EXTENSIONS = ('.py', '.tpl', '.ini', '.tsv')
+
+_source_digest = None
+
+
+def incremental():
+    return os.environ.get('SEARCHCAKE_INCREMENTAL') == '1'
+
+
+def settings(incremental=False):
+    """
+    :param incremental: skip tasks with unchanged inputs
+    """
+    return {'SEARCHCAKE_INCREMENTAL': '1'} if incremental else {}
+
+
+def source_digest():
+    """
+    sha1 of the code, templates and tables of the searchcake package, computed once per process.
+    """
+    global _source_digest
+    if _source_digest is None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        sha = hashlib.sha1()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.endswith(SOURCE_EXTENSIONS):
+                    path = os.path.join(dirpath, name)
+                    sha.update(os.path.relpath(path, root))
+                    with open(path, 'rb') as f:
+                        sha.update(f.read())
+        _source_digest = sha.hexdigest()
+    return _source_digest
+
+
+def manifest_dir():
+    return os.path.abspath(os.environ.get('SEARCHCAKE_MANIFESTS') or '.manifests')
+
+
+def _argv_value(argv, flag):
+    if flag in argv and argv.index(flag) + 1 < len(argv):
+        return argv[argv.index(flag) + 1]
+    return None
+
+
+def _values(info):
+    for key in sorted(info):
+        values = info[key] if isinstance(info[key], list) else [info[key]]
+        for value in values:
+            yield key, value
+
+
+class TaskManifest(object):
+    def __init__(self, app, argv, root=None):
+        self.app = app
+        self.argv = argv
+        self.root = root or manifest_dir()
+        name = re.sub(r'[^\w.-]', '_', '%s-%s' % (app.__name__, '-'.join(self.output_patterns())))
+        self.path = os.path.join(self.root, name + '.json')
+        self._key = None
+
+    def input_patterns(self):
+        # --INPUT x reads x, --MERGE x merges x_*
+        patterns = [_argv_value(self.argv, '--INPUT')]
+        if _argv_value(self.argv, '--MERGE'):
+            patterns.append(_argv_value(self.argv, '--MERGE') + '_*')
+        return [p for p in patterns if p]
+
+    def output_patterns(self):
+        # --OUTPUT x writes x, --SPLIT x and --MERGED x write x_*
+        patterns = [_argv_value(self.argv, '--OUTPUT')]
+        for flag in ('--SPLIT', '--MERGED'):
+            if _argv_value(self.argv, flag):
+                patterns.append(_argv_value(self.argv, flag) + '_*')
+        return [p for p in patterns if p]
+
+    @staticmethod
+    def _files(patterns):
+        return sorted(set(f for p in patterns for f in glob.glob(p)))
+
+    def key(self):
+        """
+        Key of the inputs, computed once, before the task runs.
+        """
+        if self._key is None:
+            self._key = self._compute_key()
+        return self._key
+
+    def _compute_key(self):
+        sha = hashlib.sha1()
+        sha.update(self.app.__name__)
+        source = os.path.splitext(inspect.getfile(self.app))[0]
+        for path in (source + '.py', source + '.tpl'):
+            if os.path.exists(path):
+                sha.update(file_digest(path, self.root))
+        sha.update(source_digest())
+        argv = list(self.argv)
+        for flag in ['--' + i for i in IGNORED] + ['--INPUT', '--OUTPUT', '--MERGE', '--MERGED', '--SPLIT']:
+            if flag in argv:
+                del argv[argv.index(flag):argv.index(flag) + 2]
+        sha.update(json.dumps(argv))
+
+        for ini in self._files(self.input_patterns()):
+            for key, value in _values(ConfigObj(ini)):
+                if key in IGNORED:
+                    continue
+                sha.update('%s=%s\n' % (key, value))
+                if os.path.isfile(value):
+                    sha.update(file_digest(value, self.root))
+                elif key.endswith('_EXE') and find_executable(value):
+                    sha.update(file_signature(find_executable(value)))
+        return sha.hexdigest()
+
+    def _result_files(self, outputs):
+        inputs = set(v for ini in self._files(self.input_patterns()) for _, v in _values(ConfigObj(ini)))
+        return sorted(set(v for ini in outputs for _, v in _values(ConfigObj(ini))
+                          if v not in inputs and os.path.isfile(v)))
+
+    def restore(self):
+        """
+        Writes the output inis of the last run with the same key.
+
+        :return: True if restored, False if the task has to run
+        """
+        manifest = read_json(self.path)
+        if not manifest.get('outputs') or manifest.get('key') != self.key():
+            return False
+        for path, signature in manifest['results'].items():
+            if not os.path.exists(path) or file_signature(path) != signature:
+                return False
+        for name, content in manifest['outputs'].items():
+            with open(name, 'w') as f:
+                f.write(content)
+        return True
+
+    def store(self):
+        outputs = self._files(self.output_patterns())
+        manifest = {'key': self.key(), 'outputs': dict((name, open(name).read()) for name in outputs),
+                    'results': dict((path, file_signature(path)) for path in self._result_files(outputs))}
+        makedirs(self.root)
+        write_json(self.path, manifest)
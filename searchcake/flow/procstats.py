@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+Resource usage of a process and all its descendants, read from /proc (Linux only).
+"""
+import os
+import threading
+import time
+
+pagesize = os.sysconf('SC_PAGE_SIZE')
+clock_ticks = os.sysconf('SC_CLK_TCK')
+
+# processes which only run the sub-commands, not accounted as such
+SHELLS = ('sh', 'bash', 'dash', 'csh', 'tcsh', 'zsh')
+
+
+def children_map():
+    """
+    :return: dict pid -> list of child pids of all processes
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % entry) as f:
+                stat = f.read()
+        except IOError:
+            continue  # gone meanwhile
+        # the command name may contain blanks and parentheses, the fields follow the last ')'
+        ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def read_stat(pid):
+    """
+    :return: dict with name, ppid, user and sys CPU seconds and start (epoch) of a process, None if
+     it is gone
+    """
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            stat = f.read()
+    except IOError:
+        return None
+    fields = stat[stat.rindex(')') + 2:].split()
+    return {'name': stat[stat.index('(') + 1:stat.rindex(')')], 'ppid': int(fields[1]),
+            'user': int(fields[11]) / float(clock_ticks), 'sys': int(fields[12]) / float(clock_ticks),
+            'start': boot_time() + int(fields[19]) / float(clock_ticks)}
+
+
+_boot_time = []
+
+
+def boot_time():
+    if not _boot_time:
+        with open('/proc/uptime') as f:
+            _boot_time.append(time.time() - float(f.read().split()[0]))
+    return _boot_time[0]
+
+
+def read_io(pid):
+    """
+    :return: dict of /proc/<pid>/io counters (rchar, wchar, read_bytes, write_bytes, ...), including
+     those of reaped children, empty if not readable
+    """
+    try:
+        with open('/proc/%d/io' % pid) as f:
+            return dict((k, int(v)) for k, v in (line.split(':') for line in f if ':' in line))
+    except IOError:
+        return {}
+
+
+def read_cmdline(pid):
+    try:
+        with open('/proc/%d/cmdline' % pid) as f:
+            return f.read().replace('\0', ' ').strip()
+    except IOError:
+        return ''
+
+
+def process_tree(pid):
+    children = children_map()
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree
+
+
+def rss(pid):
+    """
+    :return: resident set size in bytes, 0 if the process is gone
+    """
+    try:
+        with open('/proc/%d/statm' % pid) as f:
+            return int(f.read().split()[1]) * pagesize
+    except IOError:
+        return 0
+
+
+def tree_rss(pid):
+    return sum(rss(p) for p in process_tree(pid))
+
+
+def total_memory():
+    with open('/proc/meminfo') as f:
+        for line in f:
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError('MemTotal not found in /proc/meminfo')
+
+
+class PeakSampler(object):
+    """
+    Samples the RSS of a process tree in a background thread and keeps the peak:
+
+    with PeakSampler(os.getpid()) as sampler:
+        ...
+    sampler.peak
+    """
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        self.peak = max(self.peak, tree_rss(self.pid))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+class TreeMonitor(PeakSampler):
+    """
+    PeakSampler which also accounts the sub-commands run by the process: every process below it
+    which is not a shell and has no ancestor other than shells below it, together with its own
+    descendants. Their CPU, RSS and I/O are sampled, so the last interval before a process ends
+    is missed and commands shorter than an interval may not be seen at all.
+    """
+
+    def __init__(self, pid, interval=0.2):
+        super(TreeMonitor, self).__init__(pid, interval)
+        # command root pid -> record, pid -> latest counters of each process of the command
+        self.commands = {}
+        self._latest = {}
+
+    def sample(self):
+        children = children_map()
+        now = time.time()
+        total = rss(self.pid)
+        todo = [(c, None) for c in children.get(self.pid, [])]
+        command_rss = {}
+        while todo:
+            p, root = todo.pop()
+            stat = read_stat(p)
+            if stat is None:
+                continue
+            if root is None and stat['name'] not in SHELLS:
+                root = p
+                if p not in self.commands:
+                    self.commands[p] = {'command': read_cmdline(p), 'start': min(now, stat['start']), 'peak_rss': 0}
+            size = rss(p)
+            total += size
+            if root is not None:
+                io = read_io(p)
+                self._latest.setdefault(root, {})[p] = (stat['user'], stat['sys'], io.get('rchar', 0),
+                                                        io.get('wchar', 0))
+                command_rss[root] = command_rss.get(root, 0) + size
+                self.commands[root]['end'] = now
+            todo.extend((c, root) for c in children.get(p, []))
+        for root, size in command_rss.items():
+            self.commands[root]['peak_rss'] = max(self.commands[root]['peak_rss'], size)
+        self.peak = max(self.peak, total)
+
+    def records(self):
+        """
+        :return: list of dicts command, start, wall, user, sys, peak_rss, read, written, by start time
+        """
+        records = []
+        for root, command in sorted(self.commands.items(), key=lambda item: item[1]['start']):
+            latest = self._latest.get(root, {}).values()
+            records.append({'command': command['command'], 'start': command['start'],
+                            'wall': command.get('end', command['start']) - command['start'],
+                            'user': sum(l[0] for l in latest), 'sys': sum(l[1] for l in latest),
+                            'peak_rss': command['peak_rss'], 'read': sum(l[2] for l in latest),
+                            'written': sum(l[3] for l in latest)})
+        return records
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""
+Runs the apps of the workflow tasks with performance records: wall time, user/sys CPU, peak RSS of
+the process tree and bytes read/written, for every stage and every sub-command it runs. The
+records are appended as JSON lines to SEARCHCAKE_METRICS (default metrics.jsonl in the working
+directory) and tagged with SEARCHCAKE_RUN, set by start_run.
+
+The settings of a workflow run go to its ruffus processes through SEARCHCAKE_* variables of the
+environment, set by workflow_run for the duration of the run:
+
+with workflow_run(run_settings(cores=16, scratch='/scratch'), trace, APPS):
+    pipeline_run(...)
+"""
+import importlib
+import json
+import os
+import socket
+import sys
+import time
+from contextlib import contextmanager
+
+from searchcake.flow.manifest import TaskManifest, incremental
+from searchcake.flow.procstats import TreeMonitor, read_io
+from searchcake.flow.staging import finalize, scratch_dir, staged
+
+
+def metrics_path():
+    return os.path.abspath(os.environ.get('SEARCHCAKE_METRICS') or 'metrics.jsonl')
+
+
+def start_run():
+    """
+    Tags the records of a workflow run, call before pipeline_run.
+
+    :return: id of the run, None within a run already started (a workflow run as task of another)
+    """
+    if os.environ.get('SEARCHCAKE_RUN'):
+        return None
+    os.environ['SEARCHCAKE_RUN'] = '%s-%d-%d' % (socket.gethostname(), os.getpid(), int(time.time()))
+    return os.environ['SEARCHCAKE_RUN']
+
+
+def end_run(run, trace=None):
+    """
+    Prints the summary of a run started by start_run and writes its Chrome trace to trace if given.
+    With staging on scratch it waits for the outputs still being copied back, with a state file
+    it exports its infos as ini files if SEARCHCAKE_STATE_EXPORT=1.
+    """
+    if run is None:
+        return
+    del os.environ['SEARCHCAKE_RUN']
+    records = read_records(run=run)
+    print summary(records)
+    print "metrics in", metrics_path()
+    if trace:
+        from searchcake.flow.trace import write_trace
+        print "trace in", write_trace(records, trace)
+    if scratch_dir():
+        finalize(run)
+    if os.environ.get('SEARCHCAKE_STATE') and os.environ.get('SEARCHCAKE_STATE_EXPORT') == '1':
+        from searchcake.flow.statestore import StateStore
+        StateStore().export()
+
+
+def run_settings(cores=None, memory_budget=None, incremental=False, scratch=None, inprocess=False, state=None,
+                 export_inis=False, executor=None):
+    """
+    Environment of a workflow run, made of the settings of the flow modules. Settings not given
+    are left as they are, a workflow run as task of another one keeps those of the outer run.
+
+    :param memory_budget: GB, see flow.scheduler
+    :param incremental: skip tasks with unchanged inputs (see flow.manifest)
+    :param scratch: node local directory to run the tasks in (see flow.staging), not with worker nodes
+    :param inprocess: run the apps of the tasks on info dicts, preloaded (see flow.warmpool)
+    :param state: file of the info dicts of the tasks, instead of ini files (see flow.statestore),
+     runs the tasks in process
+    :param export_inis: write the info dicts of the state file as ini files at the end of the run
+    :param executor: 'local' or queue directory of worker nodes (see flow.executor)
+    :raise ValueError: for settings which do not go together
+    """
+    # warmpool imports this module
+    from searchcake.flow import executor as executors, manifest, scheduler, staging, statestore, warmpool
+    if state and (incremental or scratch):
+        raise ValueError('incremental and scratch runs need the ini files of the tasks, not a state file')
+    env = {}
+    env.update(scheduler.settings(cores, memory_budget))
+    env.update(manifest.settings(incremental))
+    env.update(staging.settings(scratch))
+    env.update(warmpool.settings(inprocess or bool(state)))
+    env.update(statestore.settings(state, export_inis))
+    env.update(executors.settings(executor))
+    run = dict(os.environ, **env)
+    if run.get('SEARCHCAKE_SCRATCH') and (run.get('SEARCHCAKE_EXECUTOR') or 'local') != 'local':
+        # the copy back of a task outlives it, a worker node would report it done before its outputs are
+        raise ValueError('tasks on worker nodes cannot run in scratch, its outputs are copied back asynchronously')
+    return env
+
+
+@contextmanager
+def scoped_environ(env):
+    """
+    Sets the variables of env in os.environ, as they were before afterwards.
+    """
+    saved = dict((name, os.environ.get(name)) for name in env)
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def workflow_run(env, trace=None, apps=()):
+    """
+    A workflow run with the settings of env (see run_settings): apps are preloaded for in-process
+    runs, the records are tagged (start_run) and summed up at the end (end_run). With a state file
+    ruffus checks the jobs against it (see flow.statestore.tracked).
+    """
+    with scoped_environ(env):
+        if os.environ.get('SEARCHCAKE_INPROCESS') == '1':
+            from searchcake.flow.warmpool import preload
+            preload(apps)
+        run = start_run()
+        try:
+            if os.environ.get('SEARCHCAKE_STATE'):
+                from searchcake.flow.statestore import tracked
+                with tracked():
+                    yield run
+            else:
+                yield run
+        finally:
+            end_run(run, trace)
+
+
+def write_records(records, path=None):
+    lines = ''.join(json.dumps(r, sort_keys=True) + '\n' for r in records)
+    # one write on an append only file, records of concurrent tasks do not interleave
+    fd = os.open(path or metrics_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        os.write(fd, lines.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+def read_records(path=None, run=None):
+    records = []
+    path = path or metrics_path()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if run is None or record.get('run') == run:
+                    records.append(record)
+    return records
+
+
+def load_app(app):
+    """
+    :param app: app class, or 'module:Class' to import it only in the process which runs it
+    """
+    if isinstance(app, basestring):
+        module, name = app.split(':')
+        app = getattr(importlib.import_module(module), name)
+    return app
+
+
+def run_app(app, argv, stage=None):
+    """
+    Runs a task with the executor of SEARCHCAKE_EXECUTOR (see flow.executor), in this process if not set.
+    """
+    if os.environ.get('SEARCHCAKE_EXECUTOR'):
+        from searchcake.flow.executor import get_executor
+        return get_executor().run(app, argv, stage)
+    return run_local(app, argv, stage)
+
+
+def run_local(app, argv, stage=None):
+    """
+    Runs app.main() with sys.argv = argv, like the ruffus tasks do, and records its metrics.
+    In incremental runs a task whose inputs did not change only gets its output inis restored.
+    With SEARCHCAKE_SCRATCH set the task runs on scratch (see flow.staging), with
+    SEARCHCAKE_INPROCESS=1 through flow.warmpool.run_task, on the infos of a state store if set.
+    """
+    app = load_app(app)
+    stage = stage or app.__name__
+    sys.argv = argv
+    pid = os.getpid()
+    common = {'run': os.environ.get('SEARCHCAKE_RUN'), 'stage': stage, 'host': socket.gethostname(),
+              'pid': pid, 'argv': argv}
+    manifest = TaskManifest(app, argv) if incremental() else None
+    if manifest and manifest.restore():
+        write_records([dict(common, command=None, start=time.time(), wall=0, status='skipped', user=0, sys=0,
+                            peak_rss=0, read=0, written=0)])
+        return
+    start, times, io = time.time(), os.times(), read_io(pid)
+    status = 'failed'
+    try:
+        with TreeMonitor(pid) as monitor, staged(argv):
+            if os.environ.get('SEARCHCAKE_INPROCESS') == '1':
+                from searchcake.flow.warmpool import run_task
+                run_task(app, sys.argv)
+            else:
+                app.main()
+        status = 'ok'
+        if manifest:
+            manifest.store()
+    except SystemExit as e:
+        status = 'failed' if e.code else 'ok'
+        if manifest and not e.code:
+            manifest.store()
+        raise
+    finally:
+        end_times, end_io = os.times(), read_io(pid)
+        # user/sys of the process and its reaped children, io of /proc/<pid>/io includes them too
+        stage_record = dict(common, command=None, start=start, wall=time.time() - start, status=status,
+                            user=(end_times[0] - times[0]) + (end_times[2] - times[2]),
+                            sys=(end_times[1] - times[1]) + (end_times[3] - times[3]),
+                            peak_rss=monitor.peak, read=end_io.get('rchar', 0) - io.get('rchar', 0),
+                            written=end_io.get('wchar', 0) - io.get('wchar', 0))
+        write_records([stage_record] + [dict(common, **r) for r in monitor.records()])
+
+
+def summary(records):
+    """
+    :return: table of the stage records, with their sub-commands below
+    """
+    mb = 1024.0 ** 2
+    header = '%-36s %5s %9s %9s %9s %9s %10s %10s %10s' % (
+        'stage / command', 'runs', 'wall[s]', 'max[s]', 'user[s]', 'sys[s]', 'peakRSS[MB]', 'read[MB]', 'write[MB]')
+    groups = {}
+    for r in records:
+        name = r['stage'] if r['command'] is None else '  ' + os.path.basename(r['command'].split(' ')[0])
+        groups.setdefault(r['stage'], {}).setdefault(name, []).append(r)
+
+    lines = [header, '-' * len(header)]
+    for stage in sorted(groups, key=lambda s: min(r['start'] for r in groups[s].get(s, [{'start': 0}]))):
+        for name in sorted(groups[stage], key=lambda n: (n != stage, n)):
+            rs = groups[stage][name]
+            failed = len([r for r in rs if r.get('status') == 'failed'])
+            lines.append('%-36s %5s %9.1f %9.1f %9.1f %9.1f %10.0f %10.0f %10.0f' % (
+                name[:36], '%d%s' % (len(rs), '!' if failed else ''), sum(r['wall'] for r in rs),
+                max(r['wall'] for r in rs), sum(r['user'] for r in rs), sum(r['sys'] for r in rs),
+                max(r['peak_rss'] for r in rs) / mb, sum(r['read'] for r in rs) / mb,
+                sum(r['written'] for r in rs) / mb))
+    return '\n'.join(lines)
+
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Hands out cores to the tasks of a workflow, which run in separate (ruffus) processes, so that the
+searches of all ready splits share the machine without oversubscribing it.
+
+The grants are kept in a ledger file (SEARCHCAKE_LEDGER, default cores.ledger in the working
+directory) guarded by a lock file. SEARCHCAKE_CORES overrides the number of cores of the machine,
+SEARCHCAKE_MEMORY_BUDGET (GB) the memory tasks may reserve, default 90% of the machine's.
+"""
+import errno
+import multiprocessing
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+from searchcake.flow.executor import dispatched
+from searchcake.flow.procstats import total_memory
+from searchcake.utils.filecache import FileLock, read_json, write_json
+
+# seconds between attempts of a waiting task
+poll = 0.5
+# time for tasks started together to register before the first one is served
+settle = 0.2
+
+
+def machine_cores():
+    return int(os.environ.get('SEARCHCAKE_CORES') or multiprocessing.cpu_count())
+
+
+def memory_budget():
+    if os.environ.get('SEARCHCAKE_MEMORY_BUDGET'):
+        return int(float(os.environ['SEARCHCAKE_MEMORY_BUDGET']) * 1024 ** 3)
+    return int(total_memory() * 0.9)
+
+
+def settings(cores=None, memory_budget=None):
+    """
+    Environment of a workflow run for the scheduler (see flow.runner.run_settings).
+
+    :param memory_budget: GB
+    """
+    env = {}
+    if cores:
+        env['SEARCHCAKE_CORES'] = str(cores)
+    if memory_budget:
+        env['SEARCHCAKE_MEMORY_BUDGET'] = str(memory_budget)
+    return env
+
+
+def ledger_path():
+    return os.path.abspath(os.environ.get('SEARCHCAKE_LEDGER') or 'cores.ledger')
+
+
+def task_id():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def alive(tid):
+    host, pid = tid.rsplit(':', 1)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class CoreScheduler(object):
+    """
+    First come first served: the longest waiting task gets an equal share of the free cores among
+    all waiting tasks, at least its minimum and at most what it wants. Cores released by finished
+    tasks go to the tasks still waiting, so a few long searches at the end of a dataset get more
+    cores than the many started together at the beginning.
+
+    Tasks may also reserve memory, they are only admitted while the reservations of all running
+    tasks stay within the memory budget (a task running alone is always admitted).
+    """
+
+    def __init__(self, path=None, cores=None, memory=None):
+        self.path = path or ledger_path()
+        self.cores = int(cores or machine_cores())
+        self.memory = int(memory or memory_budget())
+        self.lock = FileLock(self.path + '.lock')
+
+    def update(self, func):
+        """
+        Calls func with the ledger state, under lock and with tasks of dead processes removed.
+        """
+        with self.lock:
+            state = read_json(self.path)
+            for key in ('granted', 'waiting', 'memory'):
+                entries = state.setdefault(key, {})
+                for tid in [t for t in entries if not alive(t)]:
+                    del entries[tid]
+            result = func(state)
+            write_json(self.path, state)
+        return result
+
+    def acquire(self, want=None, minimum=1, memory=0):
+        """
+        Blocks until it is the turn of this task, at least minimum cores are free and the memory
+        fits into the budget.
+
+        :param want: most cores the task can use, default all of the machine
+        :param memory: bytes to reserve
+        :return: number of cores granted
+        """
+        tid = task_id()
+        want = min(int(want or self.cores), self.cores)
+        minimum = max(1, min(int(minimum), want))
+        self.update(lambda state: state['waiting'].__setitem__(tid, time.time()))
+        try:
+            time.sleep(settle)
+            while True:
+                granted = self.update(lambda state: self._grant(state, tid, want, minimum, memory))
+                if granted:
+                    return granted
+                time.sleep(poll)
+        except BaseException:
+            self.update(lambda state: state['waiting'].pop(tid, None))
+            raise
+
+    def _grant(self, state, tid, want, minimum, memory):
+        waiting = sorted(state['waiting'], key=lambda t: state['waiting'][t])
+        free = self.cores - sum(state['granted'].values())
+        if waiting[0] != tid or free < minimum:
+            return 0
+        if state['granted'] and sum(state['memory'].values()) + memory > self.memory:
+            return 0
+        granted = max(minimum, min(want, free // len(waiting)))
+        del state['waiting'][tid]
+        state['granted'][tid] = state['granted'].get(tid, 0) + granted
+        state['memory'][tid] = state['memory'].get(tid, 0) + memory
+        return granted
+
+    def release(self, nrcores, memory=0):
+        tid = task_id()
+
+        def _release(state):
+            for key, amount in (('granted', nrcores), ('memory', memory)):
+                left = state[key].get(tid, 0) - amount
+                if left > 0:
+                    state[key][tid] = left
+                else:
+                    state[key].pop(tid, None)
+
+        self.update(_release)
+
+
+@contextmanager
+def cores(want=None, minimum=1, memory=0):
+    """
+    Cores for the duration of a task:
+
+    with cores() as threads:
+        sys.argv = [..., '--THREADS', str(threads)]
+
+    Tasks dispatched to worker nodes (see flow.executor) take no cores here.
+    """
+    if dispatched():
+        yield int(want or 1)
+        return
+    scheduler = CoreScheduler()
+    granted = scheduler.acquire(want, minimum, memory)
+    try:
+        yield granted
+    finally:
+        scheduler.release(granted, memory)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+"""
+Staging of workflow tasks on node local scratch (SEARCHCAKE_SCRATCH, e.g. /scratch or /dev/shm),
+off if not set.
+
+A task (--INPUT ini, --OUTPUT ini) runs with BASEDIR mirrored below the scratch directory, so its
+work directory and everything written there stay local. The inputs of INPUT_KEYS (mzXML, FASTA)
+are copied once into a cache on scratch and shared by all tasks of the node, outputs of upstream
+tasks still on scratch are used from there. Afterwards only the declared outputs (OUTPUT_KEYS and
+their companions of COMPANION_EXTENSIONS, e.g. consensus.sptxt next to consensus.splib) are copied
+back to BASEDIR by a detached process (python -m searchcake.flow.staging JOBFILE), checked against
+the digest of what was written, while the next task starts. The output ini points to the final
+locations. finalize, called by flow.runner.end_run, waits for the copies of a run and removes the
+work directories of its tasks from scratch, but those the output ini of their task still points
+into.
+"""
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from configobj import ConfigObj
+
+from searchcake.flow.scheduler import alive, task_id
+from searchcake.utils.filecache import FileLock, blocksize, evict_lru, file_digest, file_signature, makedirs, \
+    read_json, write_json
+from searchcake.utils.processes import python_env
+
+INPUT_KEYS = ('MZXML', 'DBASE')
+OUTPUT_KEYS = ('PEPXML', 'PROTXML', 'PEPCSV', 'PEPCSVERROR', 'SPLIB', 'TSV', 'TRAML')
+# files next to an output, named like it with one of these extensions instead of its own (SpectraST)
+COMPANION_EXTENSIONS = ('.sptxt', '.spidx', '.pepidx')
+# outputs with paths of the work directory inside, rewritten to the final paths on copy back
+REWRITE_EXTENSIONS = ('.xml',)
+
+
+def scratch_dir():
+    scratch = os.environ.get('SEARCHCAKE_SCRATCH')
+    return os.path.abspath(scratch) if scratch else None
+
+
+def settings(scratch=None):
+    """
+    :param scratch: node local directory to run the tasks in
+    """
+    return {'SEARCHCAKE_SCRATCH': os.path.abspath(scratch)} if scratch else {}
+
+
+def output_keys():
+    keys = os.environ.get('SEARCHCAKE_STAGE_OUTPUTS')
+    return tuple(k.strip() for k in keys.split(',')) if keys else OUTPUT_KEYS
+
+
+def _argv_value(argv, flag):
+    if flag in argv and argv.index(flag) + 1 < len(argv):
+        return argv[argv.index(flag) + 1]
+    return None
+
+
+def copy_verified(src, dest, replace=(), retries=3):
+    """
+    Copies src to dest through a temporary file, which is read back and compared with the digest
+    of the written content before it is renamed to dest.
+
+    :param replace: (old, new) strings replaced line by line
+    """
+    makedirs(os.path.dirname(dest))
+    for _ in range(retries):
+        tmp = '%s.part%d' % (dest, os.getpid())
+        sha = hashlib.sha1()
+        with open(src, 'rb') as fin:
+            with open(tmp, 'wb') as fout:
+                for block in (fin if replace else iter(lambda: fin.read(blocksize), b'')):
+                    for old, new in replace:
+                        block = block.replace(old, new)
+                    sha.update(block)
+                    fout.write(block)
+                fout.flush()
+                os.fsync(fout.fileno())
+        if file_digest(tmp) == sha.hexdigest():
+            shutil.copystat(src, tmp)
+            os.rename(tmp, dest)
+            return
+        os.remove(tmp)
+    raise IOError('copy of %s to %s failed the integrity check %d times' % (src, dest, retries))
+
+
+def _values(config):
+    for value in config.values():
+        for v in (value if isinstance(value, list) else [value]):
+            if isinstance(v, basestring):
+                yield v
+
+
+class Scratch(object):
+    """
+    Layout of the scratch directory: work/ mirrors the absolute paths of BASEDIRs, inputs/ caches
+    input files by signature, copyback/ has an entry per file copied back (src, dest, run, status).
+    """
+
+    def __init__(self, root=None):
+        self.root = root or scratch_dir()
+        self.work = os.path.join(self.root, 'work')
+        self.inputs = os.path.join(self.root, 'inputs')
+        self.copyback = os.path.join(self.root, 'copyback')
+
+    def mirror(self, path):
+        return os.path.join(self.work, os.path.abspath(path).lstrip(os.sep))
+
+    def unmirror(self, path):
+        if path.startswith(self.work + os.sep):
+            return os.sep + os.path.relpath(path, self.work)
+        return None
+
+    def stage_input(self, path):
+        """
+        :return: path of the copy of the file in the input cache
+        """
+        entry = os.path.join(self.inputs, hashlib.sha1(file_signature(path)).hexdigest()[:16])
+        staged = os.path.join(entry, os.path.basename(path))
+        with FileLock(entry + '.lock'):
+            if not os.path.exists(staged):
+                makedirs(entry)
+                copy_verified(path, staged)
+            os.utime(entry, None)
+        limit = os.environ.get('SEARCHCAKE_SCRATCH_CACHE')
+        if limit:
+            with FileLock(self.inputs + '.lock'):
+                evict_lru(self.inputs, float(limit) * 1024 ** 3, keep=(entry,))
+        return staged
+
+    def _entry_path(self, dest):
+        return os.path.join(self.copyback, hashlib.sha1(os.path.abspath(dest)).hexdigest() + '.json')
+
+    def local_copy(self, path):
+        """
+        :return: the scratch original of a file copied back (or still being copied), None if there is none
+        """
+        entry = read_json(self._entry_path(path))
+        if not entry or entry['status'] == 'failed' or not os.path.exists(entry['src']):
+            return None
+        if entry['status'] == 'done' and (not os.path.exists(path) or file_signature(path) != entry['dest_signature']):
+            return None  # replaced meanwhile
+        return entry['src']
+
+    def entries(self, run=None):
+        entries = [read_json(p) for p in glob.glob(os.path.join(self.copyback, '*.json'))]
+        return [e for e in entries if e and (run is None or e.get('run') == run)]
+
+    def _set_status(self, entry, status, **kw):
+        entry.update(kw, status=status)
+        write_json(self._entry_path(entry['dest']), entry)
+
+    def copy_back(self, files, replace=(), workdir=None):
+        """
+        Copies (src, dest) pairs back in a detached process, returns at once.
+
+        :param workdir: scratch work directory of the task, removed by finalize
+        """
+        makedirs(self.copyback)
+        entries = []
+        for src, dest in files:
+            entries.append({'src': src, 'dest': dest, 'run': os.environ.get('SEARCHCAKE_RUN'), 'workdir': workdir})
+            self._set_status(entries[-1], 'pending')
+        jobfile = os.path.join(self.copyback, '%d-%d.job' % (os.getpid(), time.time() * 1e6))
+        write_json(jobfile, {'root': self.root, 'entries': entries, 'replace': list(replace)})
+        # a new interpreter, not a fork: the task process has threads running (flow.procstats)
+        process = subprocess.Popen([sys.executable, '-m', 'searchcake.flow.staging', jobfile], env=python_env(),
+                                   close_fds=True)
+        # reaped when done, the task goes on meanwhile
+        reaper = threading.Thread(target=process.wait)
+        reaper.daemon = True
+        reaper.start()
+
+    def run_copies(self, entries, replace=()):
+        """
+        The copies of copy_back, in the copy process.
+        """
+        for entry in entries:
+            self._set_status(entry, 'pending', copier=task_id())
+        for entry in entries:
+            try:
+                rewrite = replace if entry['dest'].endswith(REWRITE_EXTENSIONS) else ()
+                copy_verified(entry['src'], entry['dest'], rewrite)
+                self._set_status(entry, 'done', dest_signature=file_signature(entry['dest']))
+            except Exception as e:
+                self._set_status(entry, 'failed', error=str(e))
+
+    def finalize(self, run=None, cleanup=True, poll=1.0):
+        """
+        Waits for the copies of a run. With cleanup the scratch originals of the copied files and the
+        work directories of the tasks all of whose copies are done are removed.
+
+        :return: list of entries of failed copies
+        """
+        while True:
+            pending = [e for e in self.entries(run) if e['status'] == 'pending']
+            if not pending:
+                break
+            for entry in pending:
+                if entry.get('copier') and not alive(entry['copier']):
+                    self._set_status(entry, 'failed', error='copy process %s died' % entry['copier'])
+            time.sleep(poll)
+        entries = self.entries(run)
+        failed = [e for e in entries if e['status'] == 'failed']
+        if cleanup:
+            for entry in entries:
+                if entry['status'] != 'failed':
+                    if os.path.exists(entry['src']):
+                        os.remove(entry['src'])
+                    os.remove(self._entry_path(entry['dest']))
+            kept = set(e.get('workdir') for e in failed)
+            for workdir in set(e.get('workdir') for e in entries) - kept:
+                if workdir and workdir.startswith(self.work + os.sep):
+                    shutil.rmtree(workdir, ignore_errors=True)
+        return failed
+
+
+class StagedTask(object):
+    """
+    Runs a task on scratch, see the module doc:
+
+    with StagedTask(argv) as staged_argv:
+        ...
+    """
+
+    def __init__(self, argv, scratch=None):
+        self.argv = argv
+        self.scratch = scratch or Scratch()
+        self.infile = _argv_value(argv, '--INPUT')
+        self.outfile = _argv_value(argv, '--OUTPUT')
+        self.staged_ini = None
+        # staged path -> original path
+        self.replaced = {}
+
+    def _stage(self, key, value):
+        if key == 'BASEDIR':
+            staged = self.scratch.mirror(value)
+            makedirs(staged)
+        elif os.path.isabs(value) and self.scratch.local_copy(value):
+            # output of an upstream task, may not be copied back yet
+            staged = self.scratch.local_copy(value)
+        elif key in INPUT_KEYS and os.path.isfile(value):
+            staged = self.scratch.stage_input(value)
+        else:
+            staged = value
+        if staged != value:
+            self.replaced[staged] = value
+        return staged
+
+    def stage(self):
+        """
+        Writes the input ini of the task on scratch.
+
+        :return: argv with this ini as --INPUT
+        """
+        config = ConfigObj(self.infile)
+        for key, value in config.items():
+            if isinstance(value, list):
+                config[key] = [self._stage(key, v) for v in value]
+            elif isinstance(value, basestring):
+                config[key] = self._stage(key, value)
+        taskdir = os.path.join(self.scratch.root, 'tasks')
+        makedirs(taskdir)
+        config.filename = os.path.join(taskdir, '%d-%s' % (os.getpid(), os.path.basename(self.infile)))
+        config.write()
+        self.staged_ini = config.filename
+        argv = list(self.argv)
+        argv[argv.index('--INPUT') + 1] = self.staged_ini
+        return argv
+
+    def _unstage(self, key, value, copies):
+        if value in self.replaced:
+            return self.replaced[value]
+        final = self.scratch.unmirror(value)
+        if final is None:
+            return value
+        if os.path.isdir(value):
+            makedirs(final)
+            return final
+        if key in output_keys() and os.path.isfile(value):
+            copies.append((value, final))
+            base = os.path.splitext(value)[0]
+            for src in [base + ext for ext in COMPANION_EXTENSIONS if base + ext != value]:
+                if os.path.isfile(src):
+                    copies.append((src, self.scratch.unmirror(src)))
+            return final
+        return value
+
+    def finish(self):
+        """
+        Points the output ini to the final locations and starts the copy back of the outputs.
+        """
+        config = ConfigObj(self.outfile)
+        workdir = config.get('WORKDIR') if self.scratch.unmirror(config.get('WORKDIR') or '') else None
+        copies = []
+        for key, value in config.items():
+            if isinstance(value, list):
+                config[key] = [self._unstage(key, v, copies) for v in value]
+            elif isinstance(value, basestring):
+                config[key] = self._unstage(key, value, copies)
+        config.write()
+        if workdir and [v for v in _values(config) if v.startswith(workdir + os.sep)]:
+            workdir = None  # files of the info which are not copied back stay
+        if copies:
+            replace = [(staged, original) for staged, original in self.replaced.items()]
+            replace.append((self.scratch.work + os.sep, os.sep))
+            self.scratch.copy_back(copies, replace, workdir)
+
+    def __enter__(self):
+        return self.stage()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or (exc_type is SystemExit and not exc.code):
+            self.finish()
+        os.remove(self.staged_ini)
+
+
+@contextmanager
+def staged(argv):
+    """
+    Sets sys.argv to the argv of the task staged on scratch, to argv if staging is off or the task
+    does not have an input and output ini.
+    """
+    if not scratch_dir() or not _argv_value(argv, '--INPUT') or not _argv_value(argv, '--OUTPUT'):
+        sys.argv = argv
+        yield
+        return
+    with StagedTask(argv) as staged_argv:
+        sys.argv = staged_argv
+        yield
+
+
+def finalize(run=None):
+    """
+    Waits for the copies back of a run.
+
+    :raise RuntimeError: if some failed
+    """
+    failed = Scratch().finalize(run)
+    if failed:
+        raise RuntimeError('copy back from scratch failed:\n' +
+                           '\n'.join('%s -> %s: %s' % (e['src'], e['dest'], e['error']) for e in failed))
+
+
+def main(argv):
+    # the copies outlive the task process and are not part of its process group
+    os.setsid()
+    job = read_json(argv[0])
+    os.remove(argv[0])
+    replace = [(str(old), str(new)) for old, new in job['replace']]
+    Scratch(job['root']).run_copies(job['entries'], replace)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Info dicts of the tasks of a workflow run in one binary store (SEARCHCAKE_STATE, a sqlite file
+of pickled dicts) instead of an ini file per task and split.
+
+Tasks run in process (see flow.warmpool) and read the info of their input from the store, the
+ini file of the run's first input if it is not there. Their output info goes into the store and
+no file is written for it: ruffus checks the jobs of the run against the store (see tracked),
+code reading the info of a task outside of its app (e.g. flow.admission) goes through task_info.
+Split and Merge work on the stored infos, a split leaves an empty file per part only because
+ruffus finds the parts of a split by globbing. export writes the stored infos as ini files, as
+audit of a run. flow.manifest and flow.staging read ini files, incremental and scratch runs
+cannot use the store.
+"""
+import cPickle
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+
+from applicake2.base.coreutils import IniInfoHandler
+
+# seconds a writer waits for the lock of the store
+timeout = 60
+
+
+def state_path():
+    path = os.environ.get('SEARCHCAKE_STATE')
+    return os.path.abspath(path) if path else None
+
+
+def settings(state=None, export_inis=False):
+    """
+    :param state: file of the info dicts of the tasks, instead of ini files
+    :param export_inis: write the info dicts as ini files at the end of the run
+    """
+    env = {}
+    if state:
+        env['SEARCHCAKE_STATE'] = os.path.abspath(state)
+        if export_inis:
+            env['SEARCHCAKE_STATE_EXPORT'] = '1'
+    return env
+
+
+class StateStore(object):
+    def __init__(self, path=None):
+        self.path = path or state_path()
+        self._db = None
+        self._pid = None
+
+    def _connection(self):
+        # a connection must not be shared with forked processes
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=timeout)
+            self._db.text_factory = str
+            self._db.execute('CREATE TABLE IF NOT EXISTS info (name TEXT PRIMARY KEY, data BLOB)')
+            self._pid = os.getpid()
+        return self._db
+
+    def get(self, name):
+        """
+        :return: info stored as name, None if there is none
+        """
+        row = self._connection().execute('SELECT data FROM info WHERE name = ?', (name,)).fetchone()
+        return cPickle.loads(str(row[0])) if row else None
+
+    def put(self, name, info):
+        data = sqlite3.Binary(cPickle.dumps(dict(info), cPickle.HIGHEST_PROTOCOL))
+        with self._connection() as db:
+            db.execute('INSERT OR REPLACE INTO info (name, data) VALUES (?, ?)', (name, data))
+
+    def stamps(self, names):
+        """
+        :return: name -> order in which the infos of names were stored, of those stored
+        """
+        # a replaced row gets a rowid above all others, unless it was the last one already
+        rows = self._connection().execute('SELECT name, rowid FROM info WHERE name IN (%s)' % ','.join('?' * len(names)),
+                                          list(names))
+        return dict(rows)
+
+    def names(self, prefix=''):
+        rows = self._connection().execute('SELECT name FROM info WHERE substr(name, 1, ?) = ?',
+                                          (len(prefix), prefix))
+        return sorted(row[0] for row in rows)
+
+    def export(self, directory='.'):
+        """
+        Writes every stored info as ini file named after it.
+        """
+        ih = IniInfoHandler()
+        for name in self.names():
+            ih.write(self.get(name), os.path.join(directory, name))
+
+
+def read_info(store, name):
+    info = store.get(name)
+    if info is None:
+        info = IniInfoHandler().read(name)
+    return info
+
+
+def task_info(inifile):
+    """
+    :return: info of a task's ini file, from the state store of the run if there is one
+    """
+    if state_path():
+        return read_info(StateStore(), inifile)
+    return IniInfoHandler().read(inifile)
+
+
+def split_info(info, key):
+    """
+    :return: one info per value of key
+    """
+    values = info[key] if isinstance(info[key], list) else [info[key]]
+    return [dict(info, **{key: value}) for value in values]
+
+
+def merge_infos(infos):
+    """
+    :return: info with the values equal in all infos, lists of the values of the other keys
+    """
+    merged = {}
+    for key in sorted(set(k for info in infos for k in info)):
+        values = [info[key] for info in infos if key in info]
+        if all(v == values[0] for v in values):
+            merged[key] = values[0]
+        else:
+            merged[key] = [v for value in values for v in (value if isinstance(value, list) else [value])]
+    return merged
+
+
+def _index(name):
+    return int(re.search(r'_(\d+)$', name).group(1))
+
+
+def run_flow_task(store, args):
+    """
+    Split (INPUT, SPLIT, SPLIT_KEY) or Merge (MERGE, MERGED) of the infos in the store.
+    """
+    if 'SPLIT' in args:
+        for i, info in enumerate(split_info(read_info(store, args['INPUT']), args['SPLIT_KEY'])):
+            store.put('%s_%d' % (args['SPLIT'], i), info)
+            # ruffus globs for the parts
+            open('%s_%d' % (args['SPLIT'], i), 'w').close()
+    else:
+        names = sorted(store.names(args['MERGE'] + '_'), key=_index)
+        store.put(args['MERGED'] + '_0', merge_infos([store.get(name) for name in names]))
+
+
+def _names(value):
+    if isinstance(value, basestring):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [name for item in value for name in _names(item)]
+    return []
+
+
+def uptodate(*params):
+    """
+    Up-to-date check of a ruffus job (input, output, ...) on the infos of the store: the job runs if
+    one of its outputs is not stored or was stored before one of its inputs. Inputs not stored (the
+    ini of the run's input) are older than every stored info.
+
+    :return: whether the job needs to run, and why
+    """
+    inputs, outputs = _names(params[0] if params else []), _names(params[1] if len(params) > 1 else [])
+    stamps = StateStore().stamps(inputs + outputs)
+    missing = [name for name in outputs if name not in stamps]
+    if not outputs or missing:
+        return True, 'Missing infos %s' % ', '.join(missing)
+    if max([stamps.get(name, 0) for name in inputs] or [0]) > min(stamps[name] for name in outputs):
+        return True, 'Infos of the inputs stored after those of the outputs'
+    return False, 'Infos up to date'
+
+
+@contextmanager
+def tracked(pipeline=None):
+    """
+    Checks the jobs of a ruffus pipeline, default the main one, against the store (see uptodate)
+    instead of files, which the tasks of a store do not write.
+    """
+    from ruffus.task import main_pipeline
+    tasks = list((pipeline or main_pipeline).tasks)
+    saved = [task.needs_update_func for task in tasks]
+    for task in tasks:
+        task.check_if_uptodate(uptodate)
+    try:
+        yield
+    finally:
+        for task, func in zip(tasks, saved):
+            task.needs_update_func = func
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Chrome trace event files (chrome://tracing, https://ui.perfetto.dev) of workflow runs, from the
+records of flow.runner: one lane per worker process, a span per task with spans of its
+sub-commands below.
+
+usage: python -m searchcake.flow.trace METRICS TRACE [RUN]
+"""
+import json
+import os
+import sys
+
+
+def trace_events(records):
+    records = sorted(records, key=lambda r: r['start'])
+    hosts, lanes, events = {}, {}, []
+    for r in records:
+        host = hosts.setdefault(r['host'], len(hosts) + 1)
+        if (r['host'], r['pid']) not in lanes:
+            lanes[(r['host'], r['pid'])] = len([k for k in lanes if k[0] == r['host']]) + 1
+            events.append({'ph': 'M', 'name': 'thread_name', 'pid': host, 'tid': lanes[(r['host'], r['pid'])],
+                           'args': {'name': 'worker %d (pid %d)' % (lanes[(r['host'], r['pid'])], r['pid'])}})
+        if r['command'] is None:
+            name, cat = r['stage'], 'stage'
+            # the ini of the task tells the splits apart
+            inis = [a for a in r['argv'] if '.ini' in a]
+            if inis:
+                name += ' ' + os.path.basename(inis[-1])
+        else:
+            name, cat = os.path.basename(r['command'].split(' ')[0]), 'command'
+        args = dict((k, r[k]) for k in ('user', 'sys', 'peak_rss', 'read', 'written', 'status', 'command') if r.get(k))
+        events.append({'ph': 'X', 'name': name, 'cat': cat, 'pid': host, 'tid': lanes[(r['host'], r['pid'])],
+                       'ts': int(r['start'] * 1e6), 'dur': max(1, int(r['wall'] * 1e6)), 'args': args})
+    for host, index in hosts.items():
+        events.append({'ph': 'M', 'name': 'process_name', 'pid': index, 'args': {'name': host}})
+    return events
+
+
+def write_trace(records, outfile):
+    with open(outfile, 'w') as f:
+        json.dump({'traceEvents': trace_events(records), 'displayTimeUnit': 'ms'}, f)
+    return outfile
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        sys.stderr.write(__doc__)
+        sys.exit(2)
+    from searchcake.flow.runner import read_records
+    write_trace(read_records(sys.argv[1], sys.argv[3] if len(sys.argv) == 4 else None), sys.argv[2])
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+In-process execution of workflow tasks (SEARCHCAKE_INPROCESS=1, inprocess=True of the run_* functions).
+
+preload imports the apps of a workflow, builds their instances and loads the shared tables
+(Unimod masses) once in the workflow process, before ruffus forks its workers, so that every
+worker starts warm. A task then calls run(log, info) of the instance of its app on the info dict
+of its input: no sys.argv, no argument parsing, no imports per task. run_info does what the main
+of an app does around run: argument defaults < info < arguments of the task, logging named after
+NAME, the work directory BASEDIR/JOB_ID/NAME.
+
+The info comes from the input ini and goes to the output ini, with a state store (see
+flow.statestore) from and to the store, no ini file is read or written then. WarmPool runs info
+dicts in and out for callers outside of ruffus.
+"""
+import logging
+import os
+from multiprocessing import Pool
+
+from applicake2.base.coreutils import IniInfoHandler
+from applicake2.base.coreutils.keys import Keys
+
+from searchcake.flow.runner import load_app
+from searchcake.flow.statestore import StateStore, read_info, run_flow_task, state_path
+from searchcake.utils.filecache import makedirs
+
+# app class -> instance, per process
+_instances = {}
+
+
+def settings(inprocess=False):
+    """
+    :param inprocess: run the apps of the tasks on info dicts, preloaded
+    """
+    return {'SEARCHCAKE_INPROCESS': '1'} if inprocess else {}
+
+
+def _instance(app):
+    app = load_app(app)
+    if app not in _instances:
+        _instances[app] = app()
+    return _instances[app]
+
+
+def preload(apps):
+    """
+    :param apps: app classes or 'module:Class'
+    """
+    from searchcake.searchengines.unimodmasses import load_table
+    for app in apps:
+        _instance(app)
+    load_table()
+
+
+def task_log(name, level=None):
+    """
+    :return: logger of a task, on stderr like the one of main
+    """
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    log = logging.getLogger(name)
+    log.setLevel(str(level or 'INFO').upper())
+    return log
+
+
+def run_info(app, info, args=None):
+    """
+    Runs app on a copy of info, as its main would.
+
+    :param args: arguments of the task (KEY: value), over the info
+    :return: the info returned by the app
+    """
+    instance = _instance(app)
+    app_args = instance.add_args()
+    task = dict((arg.name, arg.default) for arg in app_args if arg.default is not None)
+    task.update(info)
+    task.update(args or {})
+    task.setdefault(Keys.NAME, type(instance).__name__)
+    if Keys.WORKDIR in [arg.name for arg in app_args]:
+        task[Keys.WORKDIR] = os.path.join(task.get(Keys.BASEDIR, '.'), task.get(Keys.JOB_ID, ''), task[Keys.NAME])
+        makedirs(task[Keys.WORKDIR])
+    return instance.run(task_log(task[Keys.NAME], task.get('LOG_LEVEL')), task)
+
+
+def run_task(app, argv):
+    """
+    Runs a task given as ruffus arguments (--INPUT ini --OUTPUT ini --KEY value ...) on the info of
+    its input ini, with SEARCHCAKE_STATE set on the infos of the state store (see flow.statestore).
+    Split and Merge tasks work on the store, without one they run through their main (sys.argv).
+    """
+    args = dict((flag[2:], value) for flag, value in zip(argv[::2], argv[1::2]))
+    store = StateStore() if state_path() else None
+    if set(args) & set(['SPLIT', 'MERGE', 'MERGED']) or 'INPUT' not in args or 'OUTPUT' not in args:
+        if store:
+            run_flow_task(store, args)
+        else:
+            load_app(app).main()
+        return
+    infile, outfile = args.pop('INPUT'), args.pop('OUTPUT')
+    if store:
+        store.put(outfile, run_info(app, read_info(store, infile), args))
+    else:
+        ih = IniInfoHandler()
+        ih.write(run_info(app, ih.read(infile), args), outfile)
+
+
+class WarmPool(object):
+    """
+    Worker processes forked with the apps preloaded, running tasks on info dicts:
+
+    with WarmPool(4, [COMET]) as pool:
+        info = pool.run(COMET, info)
+    """
+
+    def __init__(self, processes=None, apps=()):
+        preload(apps)
+        self.pool = Pool(processes)
+
+    def submit(self, app, info, args=None):
+        """
+        :return: AsyncResult of the output info (see run_info)
+        """
+        return self.pool.apply_async(run_info, (app, info, args))
+
+    def run(self, app, info, args=None):
+        return self.submit(app, info, args).get()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.pool.close()
+        else:
+            self.pool.terminate()
+        self.pool.join()
@@ -23,6 +23,7 @@ class SpectrastRTcalib(WrappedApp):
             Argument('MAYUOUT', 'mayu out csv'),
             Argument('FDR_TYPE', "type of FDR: iprophet/mayu m/pep/protFDR",default='iprophet'),
             Argument("FDR_CUTOFF", "cutoff for FDR",default=0.1),
+            Argument('FDR_INTERPOLATE', 'Interpolate iprob if FDR_CUTOFF is not in the error table', default=False),
 
             Argument('RUNRT', "Boolean to activate iRT calibration",default=False),
             Argument('RSQ_THRESHOLD', 'specify r-squared threshold to accept linear regression' , default =0.9 ),
@@ -43,7 +44,8 @@ class SpectrastRTcalib(WrappedApp):
         # get iProb corresponding FDR for IDFilter
         info['IPROB'], info['FDR'] = get_iprob_for_fdr(info['FDR_CUTOFF'], info['FDR_TYPE'],
                                                        mayuout=info.get('MAYUOUT'),
-                                                       pepxml=info.get(Keys.PEPXML))
+                                                       pepxml=info.get(Keys.PEPXML),
+                                                       interpolate=info.get('FDR_INTERPOLATE') == 'True')
 
         if info.get("RUNRT") == "True":
             rtcorrect = "-c_IRT%s -c_IRR" % info['RTKIT']
@@ -1,74 +1,86 @@
 #!/usr/bin/env python
-import sys
 
 # identification workflow for systeMHC
 
 from ruffus import *
-from applicake2.apps.flow.jobid import Jobid
-from applicake2.apps.flow.merge import Merge
-from applicake2.apps.flow.split import Split
-from searchengines.comet import Comet
-from searchengines.iprophetpepxml2csv import IprohetPepXML2CSV
-from searchengines.myrimatch import Myrimatch
-from searchengines.xtandem import Xtandem
-from prophets.interprophet import InterProphet
-from prophets.peptideprophet import PeptideProphetSequence
-from libcreate.spectrast import Spectrast
 from multiprocessing import freeze_support
-from systemhccake.netMHC import NetMHC
-from systemhccake.netMHC2 import NetMHC2
-from systemhccake.gibbscluster import GibbsCluster
-from systemhccake.gibbsclusterNetMHC import GibbsClusterNETHMC
+from flow.admission import search_slot
+from flow.runner import run_app, run_settings, workflow_run
+from flow.scheduler import cores, machine_cores
+
+# apps by module:class, each is imported only by the tasks running it
+JOBID = 'applicake2.apps.flow.jobid:Jobid'
+PARAM_COMPILE = 'searchcake.searchengines.paramcompile:ParamCompile'
+SPLIT = 'applicake2.apps.flow.split:Split'
+MYRIMATCH = 'searchcake.searchengines.myrimatch:Myrimatch'
+PEPTIDE_PROPHET = 'searchcake.prophets.peptideprophet:PeptideProphetSequence'
+XTANDEM = 'searchcake.searchengines.xtandem:Xtandem'
+COMET = 'searchcake.searchengines.comet:Comet'
+MERGE = 'applicake2.apps.flow.merge:Merge'
+INTERPROPHET = 'searchcake.prophets.interprophet:InterProphet'
+PEPXML2CSV = 'searchcake.searchengines.iprophetpepxml2csv:IprohetPepXML2CSV'
+SPECTRAST = 'searchcake.libcreate.spectrast:Spectrast'
+GIBBS_CLUSTER = 'systemhccake.gibbscluster:GibbsCluster'
+NETMHC = 'systemhccake.netMHC:NetMHC'
+GIBBS_NETMHC = 'systemhccake.gibbsclusterNetMHC:GibbsClusterNETHMC'
+NETMHC2 = 'systemhccake.netMHC2:NetMHC2'
+# preloaded by in-process runs
+APPS = [JOBID, PARAM_COMPILE, SPLIT, MYRIMATCH, PEPTIDE_PROPHET, XTANDEM, COMET, MERGE, INTERPROPHET, PEPXML2CSV,
+        SPECTRAST]
 
 
 @files("input.ini", "jobid.ini")
 def jobid(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    Jobid.main()
+    run_app(JOBID, ['--INPUT', infile, '--OUTPUT', outfile])
 
 
 @follows(jobid)
-@split("jobid.ini", "split.ini_*")
+@files("jobid.ini", "params.ini")
+def compile_params(infile, outfile):
+    run_app(PARAM_COMPILE, ['--INPUT', infile, '--OUTPUT', outfile])
+
+
+@follows(compile_params)
+@split("params.ini", "split.ini_*")
 def split_dataset(infile, unused_outfile):
-    sys.argv = ['--INPUT', infile, '--SPLIT', 'split.ini', '--SPLIT_KEY', 'MZXML']
-    Split.main()
+    run_app(SPLIT, ['--INPUT', infile, '--SPLIT', 'split.ini', '--SPLIT_KEY', 'MZXML'])
 
 
 ####################################################################
 @transform(split_dataset, regex("split.ini_"), "rawmyri.ini_")
 def myri(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', '4']
-    Myrimatch.main()
+    with search_slot('Myrimatch', infile) as threads:
+        run_app(MYRIMATCH, ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', str(threads)])
 
 @transform(myri, regex("rawmyri.ini_"), "myrimatch.ini_")
 def peppromyri(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepmyri']
-    PeptideProphetSequence.main()
+    with cores(1):
+        run_app(PEPTIDE_PROPHET, ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepmyri'])
 
 
 ####### TANDEM NOT YET THERE ########################################
 @transform(split_dataset, regex("split.ini_"), "rawtandem.ini_")
 def tandem(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', '4']
-    Xtandem.main()
+    with search_slot('Xtandem', infile) as threads:
+        run_app(XTANDEM, ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', str(threads)])
 
 
 @transform(tandem, regex("rawtandem.ini_"), "tandem.ini_")
 def pepprotandem(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'peptandem']
-    PeptideProphetSequence.main()
+    with cores(1):
+        run_app(PEPTIDE_PROPHET, ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'peptandem'])
 
 ####################################################################
 @transform(split_dataset, regex("split.ini_"), "rawcomet.ini_")
 def comet(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', '4']
-    Comet.main()
+    with search_slot('Comet', infile) as threads:
+        run_app(COMET, ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', str(threads)])
 
 
 @transform(comet, regex("rawcomet.ini_"), "comet.ini_")
 def pepprocomet(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepcomet']
-    PeptideProphetSequence.main()
+    with cores(1):
+        run_app(PEPTIDE_PROPHET, ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepcomet'])
 
 
 ############################# TAIL: PARAMGENERATE ##################
@@ -80,71 +92,76 @@ def pepprocomet(infile, outfile):
 #def merge_datasets(unused_infiles, outfile):
 def merge_datasets(unused_infiles, outfile):
     #sys.argv = ['--MERGE', 'comet.ini', '--MERGED', outfile]
-    sys.argv = ['--MERGE', 'comet.ini', '--MERGED', outfile]
-    Merge.main()
+    run_app(MERGE, ['--MERGE', 'comet.ini', '--MERGED', outfile])
 
 ############################## RunProphets #########################
 @follows(merge_datasets)
 @files("ecollate.ini_0", "datasetiprophet.ini")
 def datasetiprophet(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    InterProphet.main()
+    run_app(INTERPROPHET, ['--INPUT', infile, '--OUTPUT', outfile])
 
 
 ########################## MERGE ALL DATASETS ######################
 @follows(datasetiprophet)
 @files("datasetiprophet.ini", "convert2csv.ini")
 def convert2csv(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    IprohetPepXML2CSV.main()
+    run_app(PEPXML2CSV, ['--INPUT', infile, '--OUTPUT', outfile])
 
 
 ####################### Spectrast ###################################
 @follows(convert2csv)
 @files("datasetiprophet.ini", "spectrast.ini")
 def pepxml2spectrast(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    Spectrast.main()
+    run_app(SPECTRAST, ['--INPUT', infile, '--OUTPUT', outfile])
 
 #################### GIBBS ########################################
 @follows(pepxml2spectrast)
 @files("convert2csv.ini", "Gibbs.ini")
 def runGIBBS(infile, outfile):
-    sys.argv = ['--INPUT', infile, "--OUTPUT", outfile]
-    GibbsCluster.main()
+    run_app(GIBBS_CLUSTER, ['--INPUT', infile, "--OUTPUT", outfile])
 
 ################################ NETMHC #############################
 @follows(pepxml2spectrast)
 @files("convert2csv.ini", "netMHC.ini")
 def runNetMHC(infile, outfile):
-    sys.argv = ['--INPUT', infile, "--OUTPUT", outfile]
-    NetMHC.main()
+    run_app(NETMHC, ['--INPUT', infile, "--OUTPUT", outfile])
 
 ################################ NETMHC #############################
 @follows(runNetMHC)
 @files("netMHC.ini", "gibbsNetMHC.ini")
 def runGIBBSNETMHC(infile, outfile):
-    sys.argv = ['--INPUT', infile, "--OUTPUT", outfile]
-    GibbsClusterNETHMC.main()
+    run_app(GIBBS_NETMHC, ['--INPUT', infile, "--OUTPUT", outfile])
 
 
 
 @follows(pepxml2spectrast)
 @files("convert2csv.ini", "netMHC.ini")
 def runNetMHC2(infile, outfile):
-    sys.argv = ['--INPUT', infile, "--OUTPUT", outfile]
-    NetMHC2.main()
+    run_app(NETMHC2, ['--INPUT', infile, "--OUTPUT", outfile])
 
-def run_libcreate_withNetMHC_WF(nrthreads=3):
+def run_libcreate_withNetMHC_WF(nrthreads=None, memory_budget=None, trace=None, incremental=False, scratch=None,
+                                inprocess=False, state=None, export_inis=False, executor=None):
     freeze_support()
-    #pipeline_run([runGIBBSNETMHC], multiprocess=nrthreads)
-    pipeline_run([runNetMHC], multiprocess=nrthreads)
-
-def run_libcreate_WF(nrthreads=2):
+    env = run_settings(memory_budget=memory_budget, incremental=incremental, scratch=scratch,
+                       inprocess=inprocess, state=state, export_inis=export_inis, executor=executor)
+    with workflow_run(env, trace, APPS + [NETMHC]):
+        # tasks wait for cores of the scheduler, enough of them can be ready
+        #pipeline_run([runGIBBSNETMHC], multiprocess=nrthreads or machine_cores())
+        pipeline_run([runNetMHC], multiprocess=nrthreads or machine_cores())
+
+def run_libcreate_WF(nrthreads=None, memory_budget=None, trace=None, incremental=False, scratch=None,
+                     inprocess=False, state=None, export_inis=False, executor=None):
     freeze_support()
-    pipeline_run([pepxml2spectrast], multiprocess=nrthreads)
+    env = run_settings(memory_budget=memory_budget, incremental=incremental, scratch=scratch,
+                       inprocess=inprocess, state=state, export_inis=export_inis, executor=executor)
+    with workflow_run(env, trace, APPS):
+        pipeline_run([pepxml2spectrast], multiprocess=nrthreads or machine_cores())
 
-def run_libcreate_withNetMHC2_WF(nrthreads=2):
+def run_libcreate_withNetMHC2_WF(nrthreads=None, memory_budget=None, trace=None, incremental=False, scratch=None,
+                                 inprocess=False, state=None, export_inis=False, executor=None):
     freeze_support()
-    pipeline_run([runNetMHC2], multiprocess=nrthreads)
+    env = run_settings(memory_budget=memory_budget, incremental=incremental, scratch=scratch,
+                       inprocess=inprocess, state=state, export_inis=export_inis, executor=executor)
+    with workflow_run(env, trace, APPS + [NETMHC2]):
+        pipeline_run([runNetMHC2], multiprocess=nrthreads or machine_cores())
 
@@ -1,104 +1,118 @@
 #!/usr/bin/env python
-import sys
 
 # identification workflow for systeMHC
 
 from ruffus import *
-from applicake2.apps.flow.jobid import Jobid
-from applicake2.apps.flow.merge import Merge
-from applicake2.apps.flow.split import Split
 from applicake2.base import BasicApp
 from applicake2.base.coreutils import IniInfoHandler
-from searchengines.comet import Comet
-from searchengines.iprophetpepxml2csv import IprohetPepXML2CSV
-from searchengines.myrimatch import Myrimatch
-from searchengines.xtandem import Xtandem
-from prophets.interprophet import InterProphet
-from prophets.peptideprophet import PeptideProphetSequence
 
 from multiprocessing import freeze_support
+from flow.admission import search_slot
+from flow.runner import load_app, run_app, run_settings, workflow_run
+from flow.scheduler import cores, machine_cores
+from flow.statestore import task_info
+
+# apps by module:class, each is imported only by the tasks running it
+JOBID = 'applicake2.apps.flow.jobid:Jobid'
+PARAM_COMPILE = 'searchcake.searchengines.paramcompile:ParamCompile'
+SPLIT = 'applicake2.apps.flow.split:Split'
+MYRIMATCH = 'searchcake.searchengines.myrimatch:Myrimatch'
+PEPTIDE_PROPHET = 'searchcake.prophets.peptideprophet:PeptideProphetSequence'
+XTANDEM = 'searchcake.searchengines.xtandem:Xtandem'
+COMET = 'searchcake.searchengines.comet:Comet'
+MERGE = 'applicake2.apps.flow.merge:Merge'
+INTERPROPHET = 'searchcake.prophets.interprophet:InterProphet'
+PEPXML2CSV = 'searchcake.searchengines.iprophetpepxml2csv:IprohetPepXML2CSV'
+# preloaded by in-process runs
+APPS = [JOBID, PARAM_COMPILE, SPLIT, MYRIMATCH, PEPTIDE_PROPHET, XTANDEM, COMET, MERGE, INTERPROPHET, PEPXML2CSV]
 
 
 @files("input.ini", "jobid.ini")
 def jobid(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    Jobid.main()
+    run_app(JOBID, ['--INPUT', infile, '--OUTPUT', outfile])
 
 
 @follows(jobid)
-@split("jobid.ini", "split.ini_*")
+@files("jobid.ini", "params.ini")
+def compile_params(infile, outfile):
+    run_app(PARAM_COMPILE, ['--INPUT', infile, '--OUTPUT', outfile])
+
+
+@follows(compile_params)
+@split("params.ini", "split.ini_*")
 def split_dataset(infile, unused_outfile):
-    sys.argv = ['--INPUT', infile, '--SPLIT', 'split.ini', '--SPLIT_KEY', 'MZXML']
-    Split.main()
+    run_app(SPLIT, ['--INPUT', infile, '--SPLIT', 'split.ini', '--SPLIT_KEY', 'MZXML'])
 
 
 ###################################################################################
 
 @transform(split_dataset, regex("split.ini_"), "rawmyri.ini_")
 def myri(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', '4']
-    Myrimatch.main()
+    with search_slot('Myrimatch', infile) as threads:
+        run_app(MYRIMATCH, ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', str(threads)])
 
 
 @transform(myri, regex("rawmyri.ini_"), "myrimatch.ini_")
 def peppromyri(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepmyri']
-    PeptideProphetSequence.main()
+    with cores(1):
+        run_app(PEPTIDE_PROPHET, ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepmyri'])
 
 
 ### TANDEM ###################################################################
 
 @transform(split_dataset, regex("split.ini_"), "rawtandem.ini_")
 def tandem(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', '4']
-    Xtandem.main()
+    with search_slot('Xtandem', infile) as threads:
+        run_app(XTANDEM, ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', str(threads)])
 
 
 @transform(tandem, regex("rawtandem.ini_"), "tandem.ini_")
 def pepprotandem(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'peptandem']
-    PeptideProphetSequence.main()
+    with cores(1):
+        run_app(PEPTIDE_PROPHET, ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'peptandem'])
 
 
 ###################################################################################
 
 @transform(split_dataset, regex("split.ini_"), "rawcomet.ini_")
 def comet(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', '4']
-    Comet.main()
+    with search_slot('Comet', infile) as threads:
+        run_app(COMET, ['--INPUT', infile, '--OUTPUT', outfile, '--THREADS', str(threads)])
 
 
 @transform(comet, regex("rawcomet.ini_"), "comet.ini_")
 def pepprocomet(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepcomet']
-    PeptideProphetSequence.main()
+    with cores(1):
+        run_app(PEPTIDE_PROPHET, ['--INPUT', infile, '--OUTPUT', outfile, '--NAME', 'pepcomet'])
 
 
 ############################# TAIL: PARAMGENERATE ##################################
 
 @merge([pepprocomet, peppromyri], "ecollate.ini")
 def merge_datasets(unused_infiles, outfile):
-    sys.argv = ['--MERGE', 'comet.ini', '--MERGED', outfile]
-    Merge.main()
+    run_app(MERGE, ['--MERGE', 'comet.ini', '--MERGED', outfile])
 
 
 @follows(merge_datasets)
 @files("ecollate.ini_0", "datasetiprophet.ini")
 def datasetiprophet(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    InterProphet.main()
+    run_app(INTERPROPHET, ['--INPUT', infile, '--OUTPUT', outfile])
 
 
 @follows(datasetiprophet)
 @files("datasetiprophet.ini", "convert2csv.ini")
 def convert2csv(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    IprohetPepXML2CSV.main()
+    run_app(PEPXML2CSV, ['--INPUT', infile, '--OUTPUT', outfile])
 
 
-def run_peptide_WF(nrthreads=2):
+def run_peptide_WF(nrthreads=None, memory_budget=None, trace=None, incremental=False, scratch=None,
+                   inprocess=False, state=None, export_inis=False, executor=None):
     freeze_support()
-    pipeline_run([convert2csv], multiprocess=nrthreads)
+    env = run_settings(memory_budget=memory_budget, incremental=incremental, scratch=scratch,
+                       inprocess=inprocess, state=state, export_inis=export_inis, executor=executor)
+    with workflow_run(env, trace, APPS):
+        # tasks wait for cores of the scheduler, enough of them can be ready
+        pipeline_run([convert2csv], multiprocess=nrthreads or machine_cores())
 
 
 class PepidentWF(BasicApp):
@@ -108,13 +122,14 @@ class PepidentWF(BasicApp):
                #Comet().add_args() + \
                #PeptideProphetSequence().add_args() + \
                #InterProphet().add_args() + \
-        return IprohetPepXML2CSV().add_args()
+        return load_app(PEPXML2CSV)().add_args()
 
     def run(self,log, info):
         ih = IniInfoHandler()
         ih.write(info,"pepinput.ini")
         run_peptide_WF()
-        info = ih.read("convert2csv.ini")
+        # with a state store the info is only stored
+        info = task_info("convert2csv.ini")
         return info
 
 if __name__ == "__main__":
@@ -1,37 +1,46 @@
-import sys
 from ruffus import *
 
 from applicake2.base import BasicApp
 from applicake2.base.coreutils import IniInfoHandler
 from searchcake.pepidentWF import PepidentWF
-from searchcake.prophets.proteinprophet import ProteinProphet
+from searchcake.flow.runner import load_app, run_app, run_settings, workflow_run
+from searchcake.flow.statestore import task_info
 from multiprocessing import freeze_support
 
+# apps by module:class, each is imported only by the tasks running it
+PROTEINPROPHET = 'searchcake.prophets.proteinprophet:ProteinProphet'
+# preloaded by in-process runs
+APPS = [PROTEINPROPHET]
+
+
 @files("input.ini", "pepwf.ini")
 def peptidewf(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    PepidentWF.main()
+    run_app(PepidentWF, ['--INPUT', infile, '--OUTPUT', outfile])
 
 
 @files("pepwf.ini","protprophet.ini")
 def proteinprophet(infile, outfile):
-    sys.argv = ['--INPUT', infile, '--OUTPUT', outfile]
-    ProteinProphet.main()
+    run_app(PROTEINPROPHET, ['--INPUT', infile, '--OUTPUT', outfile])
 
-def run_pepprot_WF(nrthreads=2):
+def run_pepprot_WF(nrthreads=2, memory_budget=None, trace=None, incremental=False, scratch=None,
+                   inprocess=False, state=None, export_inis=False, executor=None):
     freeze_support()
-    pipeline_run([proteinprophet], multiprocess=nrthreads)
+    env = run_settings(memory_budget=memory_budget, incremental=incremental, scratch=scratch,
+                       inprocess=inprocess, state=state, export_inis=export_inis, executor=executor)
+    with workflow_run(env, trace, APPS):
+        pipeline_run([proteinprophet], multiprocess=nrthreads)
 
 class Protid(BasicApp):
     def add_args(self):
         return PepidentWF().add_args() + \
-               ProteinProphet().add_args()
+               load_app(PROTEINPROPHET)().add_args()
 
     def run(self,log, info):
         ih = IniInfoHandler()
         ih.write(info,"input.ini")
         run_pepprot_WF()
-        info = ih.read("protprophet.ini")
+        # with a state store the info is only stored
+        info = task_info("protprophet.ini")
         return info
 
 if __name__ == "__main__":
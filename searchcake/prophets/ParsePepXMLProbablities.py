@@ -1,28 +1,9 @@
-from lxml import etree
-import re
-import csv
+from searchcake.utils.pepxmlheader import write_error_table
 
 
 def parsePepXMLProbToErroMapping(file,outfile):
-    header_set = False
-    f = open(outfile, 'wb')
-    writer = csv.writer(f, delimiter='\t', lineterminator="\n")
-    for event, elem in etree.iterparse(file):
-
-        if event == 'end' and re.search("error_point$", elem.tag):
-            result = {}
-            result['min_prob'] = elem.get("min_prob")
-            result['error'] = elem.get("error")
-            result['num_incorr'] = elem.get("num_incorr")
-            result['num_corr'] = elem.get("num_corr")
-            if not header_set:
-                writer.writerow(result.keys())
-                header_set = True
-            writer.writerow(result.values())
-        if event == 'end' and re.search("roc_error_data$", elem.tag):
-            print(elem.tag)
-            f.close()
-            return
+    # only reads the header of the pepxml, see read_error_points
+    write_error_table(file, outfile)
 
 
 if __name__ == "__main__":
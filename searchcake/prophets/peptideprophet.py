@@ -2,6 +2,7 @@
 import os
 
 from searchcake.searchengines.enzymes import enzymestr_to_engine
+from searchcake.utils.pepxmlfifo import fifo_command, make_fifo
 from applicake2.base.app import WrappedApp
 from applicake2.base.apputils import validation
 from applicake2.base.coreutils.arguments import Argument
@@ -21,7 +22,9 @@ class PeptideProphetSequence(WrappedApp):
             Argument('DBASE', 'FASTA dbase'),
             Argument('MZXML', 'Path to the original MZXML inputfile'),
             Argument('DECOY', 'Decoy pattern', default='DECOY_'),
-            Argument('TPPDIR', 'Path to the tpp',  default='')
+            Argument('TPPDIR', 'Path to the tpp',  default=''),
+            Argument('PEPXML_FILTERS', 'pepXML fixups (see utils.pepxmlfifo) streamed into InteractParser through '
+                                       'a named pipe', default='')
         ]
 
     def prepare_run(self, log, info):
@@ -39,9 +42,16 @@ class PeptideProphetSequence(WrappedApp):
 
         command = []
         tpp_dir = info['TPPDIR']
-        command.append(
-            "{exe} {result} {pepxml} -E{enzyme}".format(exe=os.path.join(info['TPPDIR'],"InteractParser"),result=result,pepxml=info[Keys.PEPXML],enzyme=enz)
-        )
+        if info.get('PEPXML_FILTERS'):
+            # fixed pepxml goes through a pipe instead of being rewritten on disk
+            fifo = make_fifo(os.path.join(info[Keys.WORKDIR], os.path.basename(info[Keys.PEPXML])))
+            command.append(fifo_command(info['PEPXML_FILTERS'], info[Keys.PEPXML], fifo,
+                "{exe} {result} {pepxml} -E{enzyme}".format(exe=os.path.join(info['TPPDIR'],"InteractParser"),result=result,pepxml=fifo,enzyme=enz)
+            ))
+        else:
+            command.append(
+                "{exe} {result} {pepxml} -E{enzyme}".format(exe=os.path.join(info['TPPDIR'],"InteractParser"),result=result,pepxml=info[Keys.PEPXML],enzyme=enz)
+            )
         command.append(
             "{exe} {result} {database}".format(
             exe=os.path.join(info['TPPDIR'],"RefreshParser"), result=result, pepxml=info[Keys.PEPXML],enzyme=enz,database=info['DBASE'])
@@ -22,6 +22,7 @@ class ProteinProphet(WrappedApp):
             Argument('MAYUOUT','mayu out csv'),
             Argument('FDR_TYPE', "type of FDR: iprophet/mayu m/pep/protFDR"),
             Argument("FDR_CUTOFF", "cutoff for FDR"),
+            Argument('FDR_INTERPOLATE', 'Interpolate iprob if FDR_CUTOFF is not in the error table', default=False),
         ]
 
     def prepare_run(self, log, info):
@@ -29,7 +30,8 @@ class ProteinProphet(WrappedApp):
             raise RuntimeError("This ProteinProphet only takes one iProphet inputfile!")
 
         info['IPROB'],info['FDR'] = get_iprob_for_fdr(info['FDR_CUTOFF'], info['FDR_TYPE'], mayuout=info.get('MAYUOUT'),
-                                                      pepxml=info[Keys.PEPXML])
+                                                      pepxml=info[Keys.PEPXML],
+                                                      interpolate=info.get('FDR_INTERPOLATE') == 'True')
 
         info['PROTEINPROPHET'] = 'IPROPHET MINPROB%s' % info['IPROB']
         wd = info[Keys.WORKDIR]
@@ -8,24 +8,28 @@ from applicake2.base.apputils.validation import check_exitcode, check_xml, check
 from applicake2.base.coreutils.arguments import Argument
 from applicake2.base.coreutils.keys import Keys
 from searchenginebase import SearchEnginesBase
+from searchcake.utils.mzxml import scan_ranges
+from searchcake.utils.pepxmlmerge import merge_pepxml
+from searchcake.utils.shell import run_commands_parallel
 
 
 class Comet(SearchEnginesBase):
     """
     Wrapper for the search engine comet.
     """
+    params_key = 'COMET_PARAMS'
+    params_name = 'comet.params'
+
     def add_args(self):
         args = super(Comet, self).add_args()
         args.append(Argument('COMET_DIR', 'executable location.', default=''))
         args.append(Argument('COMET_EXE', 'executable name.', default='comet'))
+        args.append(Argument('COMET_SHARDS', 'Number of scan range shards of the mzXML searched in parallel, '
+                                             'THREADS are divided among them (1 = no sharding)', default=1))
 
         return args
 
-    def prepare_run(self, log, info):
-        wd = info[Keys.WORKDIR]
-        basename = os.path.join(wd, os.path.splitext(os.path.split(info[Keys.MZXML])[1])[0])
-        info[Keys.PEPXML] = basename + '.pep.xml'
-
+    def param_info(self, log, info):
         # need to create a working copy to prevent replacement or generic definitions
         # with app specific definitions
         app_info = info.copy()
@@ -46,20 +50,59 @@ class Comet(SearchEnginesBase):
         app_info["STATIC_MODS"], app_info["VARIABLE_MODS"], _ = genmodstr_to_engine(info["STATIC_MODS"],
                                                                                  info["VARIABLE_MODS"], 'Comet')
         app_info['ENZYME'], app_info['NUM_TERM_CLEAVAGES'] = enzymestr_to_engine(info['ENZYME'], 'Comet')
+        return app_info
 
-        tplfile = os.path.join(wd, "comet.params")
-        template = get_tpl_of_class(self)
-        read_mod_write(app_info,template, tplfile)
+    def prepare_run(self, log, info):
+        wd = info[Keys.WORKDIR]
+        basename = os.path.join(wd, os.path.splitext(os.path.split(info[Keys.MZXML])[1])[0])
+        info[Keys.PEPXML] = basename + '.pep.xml'
+
+        tplfile = os.path.join(wd, self.params_name)
+        ranges = []
+        if int(info.get('COMET_SHARDS', 1)) > 1:
+            ranges = scan_ranges(info[Keys.MZXML], info['COMET_SHARDS'])
+        if len(ranges) > 1:
+            # threads per shard differ from the dataset wide parameters, render our own
+            app_info = self.param_info(log, info)
+            app_info[Keys.THREADS] = str(max(1, int(info[Keys.THREADS]) // len(ranges)))
+            log.info('searching %s scan range shards with %s threads each' % (len(ranges), app_info[Keys.THREADS]))
+            read_mod_write(app_info, get_tpl_of_class(self), tplfile)
+        else:
+            tplfile = self.params_file(log, info, tplfile)
+        self.rendered_params = [tplfile]
 
-        exe_path = app_info['COMET_DIR']
-        exe = app_info['COMET_EXE']
+        exe_path = info['COMET_DIR']
+        exe = info['COMET_EXE']
 
         command = "{exe} -N{basename} -P{tplfile} {mzxml}".format(exe=os.path.join(exe_path, exe), basename=basename, tplfile=tplfile, mzxml=info[Keys.MZXML])
         #command = []
+
+        self.shards = []
+        if len(ranges) > 1:
+            command = []
+            for i, (first, last) in enumerate(ranges):
+                shardbase = "%s.shard%02d" % (basename, i)
+                self.shards.append(shardbase + '.pep.xml')
+                command.append("{exe} -N{basename} -P{tplfile} -F{first} -L{last} {mzxml}".format(
+                    exe=os.path.join(exe_path, exe), basename=shardbase, tplfile=tplfile, first=first, last=last,
+                    mzxml=info[Keys.MZXML]))
         return info, command
 
+    def execute_search(self, log, info, cmd):
+        if not self.shards:
+            return super(Comet, self).execute_search(log, info, cmd)
+
+        exit_code, stdout = run_commands_parallel(log, cmd)
+        if exit_code == 0:
+            merge_pepxml(self.shards, info[Keys.PEPXML], log)
+            for shard in self.shards:
+                if os.path.exists(shard):
+                    os.remove(shard)
+        return exit_code, stdout
+
     def validate_run(self, log, info, exit_code, stdout):
-        if "Warning - no spectra searched" in stdout:
+        # with shards only fail if none of them had spectra
+        if stdout.count("Warning - no spectra searched") >= max(1, len(self.shards)):
             raise RuntimeError("No spectra in mzXML!")
         check_stdout(log,stdout)
         check_exitcode(log, exit_code)
@@ -4,21 +4,18 @@
 from __future__ import print_function
 
 import sys
-from pyteomics import pepxml
-
-import csv
 import os
 
 from applicake2.base.app import BasicApp
 from applicake2.base.coreutils.arguments import Argument
 from applicake2.base.coreutils.keys import Keys, KeyHelp
-from searchcake.prophets.ParsePepXMLProbablities import parsePepXMLProbToErroMapping
 
 class IprohetPepXML2CSV(BasicApp):
     def add_args(self):
         return [
             Argument(Keys.WORKDIR, KeyHelp.WORKDIR),
             Argument(Keys.PEPXML, Keys.PEPXML),
+            Argument(Keys.THREADS, 'Number of processes parsing the pepXML', default=1),
         ]
 
 
@@ -27,63 +24,34 @@ class IprohetPepXML2CSV(BasicApp):
         After ProteinQuantifier puts abundances from consensusXML to csv,
         put abundances back to original protXML file.
         """
+        # lxml and numpy, imported by the task only
+        from searchcake.utils.pepxmlsinks import ErrorTableSink, PsmTsvSink, run_sinks
+
         # correct csv with right header
         pepxml_in = info[Keys.PEPXML]
         info['PEPCSV'] = os.path.join(info[Keys.WORKDIR], "ipeptide.tsvh")
         info['PEPCSVERROR'] = os.path.join(info[Keys.WORKDIR], "error.tsvh")
 
-        csv_out = info['PEPCSV']
-        self.iprophetpepxml_csv(pepxml_in, csv_out)
-        parsePepXMLProbToErroMapping(pepxml_in, info['PEPCSVERROR'] )
+        # both tables in a single pass over the pepxml
+        psms = PsmTsvSink(info['PEPCSV'])
+        run_sinks(pepxml_in, [psms, ErrorTableSink(info['PEPCSVERROR'])], int(info.get(Keys.THREADS) or 1))
+        log.info('wrote %s psms to %s' % (psms.nr_rows, info['PEPCSV']))
         return info
 
     @staticmethod
-    def iprophetpepxml_csv(infile, outfile):
+    def iprophetpepxml_csv(infile, outfile, nrprocs=1):
         """
         :param infile: input pepxml
         :param outfile: outcsv
+        :param nrprocs: number of processes parsing the pepxml
         :return:
         """
-        # outfile = os.path.splitext(infile)[0] + '.csv'
-        reader = pepxml.read(infile)
-        f = open(outfile, 'wb')
-        writer = csv.writer(f, delimiter='\t')
-        # modifications_example = [{'position': 20, 'mass': 160.0306}]
-
-        header_set = False
-
-        nr_rows = 0
-        result = {}
-        for hit in reader:
-            if 'error_point' in hit:
-                print (hit)
-
-#wenguang: remove all decoy hits!
-            if 'search_hit' in hit and hit['search_hit'][0]['proteins'][0]['protein'].find("DECOY") == -1:
-                #continue
-                #else :
-                # result = hit#
-                #print(hit['search_hit'][0]['proteins'][0]['protein'])
-                nr_rows +=1
-                result['retention_time_sec'] = hit['retention_time_sec']
-                result['assumed_charge'] = hit['assumed_charge']
-                result['spectrum'] = hit['spectrum']
-                result['nrhit'] = len(hit['search_hit'])
-                search_hit = hit['search_hit'][0]
+        from searchcake.utils.pepxmlsinks import PsmTsvSink, run_sinks
 
-                result['modified_peptide'] = search_hit['modified_peptide']
-                result['search_hit'] = search_hit['peptide']
-                analysis_result = search_hit['analysis_result'][1]
-                iprophet_probability = analysis_result['interprophet_result']['probability']
-                result['iprophet_probability'] = iprophet_probability
-                result['protein_id'] = search_hit['proteins'][0]['protein']
-                result['nrproteins'] = len(search_hit['proteins'])
-                if not header_set:
-                    writer.writerow(result.keys())
-                    header_set = True
-                writer.writerow(result.values())
-        print(nr_rows)
-        f.close()
+        # wenguang: remove all decoy hits!
+        psms = PsmTsvSink(outfile)
+        run_sinks(infile, [psms], nrprocs)
+        print(psms.nr_rows)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 import re
 from string import Template
-from Unimod.unimod import database
+from unimodmasses import get_mass
 
 
 def genmodstr_to_engine(static_genmodstr, var_genmodstr, engine):
@@ -56,16 +56,16 @@ class AbstractModConverter(object):
             raise Exception("Malformed modification string '%s'. Should be 'Name (Residues)'" % modstr)
 
     def _get_mass_from_unimod_or_string(self, key):
-        entry = database.get_label(key)
-        if entry:
-            return float(entry['delta_mono_mass']), float(entry['delta_avge_mass'])
-        else:
-            # if its not a unimod entry try to parse masses from name itself
-            try:
-                mm, am = key.split("/")
-                return float(mm), float(am)
-            except:
-                raise Exception(key + ": not found unimod and no valid mono/avg mass pair")
+        # a mono/avg mass pair is no unimod label, no need to look it up
+        try:
+            mm, am = key.split("/")
+            return float(mm), float(am)
+        except ValueError:
+            pass
+        masses = get_mass(key)
+        if masses:
+            return masses
+        raise Exception(key + ": not found unimod and no valid mono/avg mass pair")
 
     def _modstr_to_list(self, modstr):
         modlist = []
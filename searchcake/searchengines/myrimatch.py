@@ -1,13 +1,11 @@
 #!/usr/bin/env python
 import os
-import shutil
-import re
 
 from enzymes import enzymestr_to_engine
 from modifications import genmodstr_to_engine
 from searchenginebase import SearchEnginesBase
+from searchcake.utils.pepxmlstream import rewrite_pepxml, strip_native_id
 
-from applicake2.base.apputils.templates import read_mod_write, get_tpl_of_class
 from applicake2.base.apputils.validation import check_exitcode, check_xml
 from applicake2.base.coreutils.keys import Keys, KeyHelp
 from applicake2.base.coreutils.arguments import Argument
@@ -17,18 +15,18 @@ class Myrimatch(SearchEnginesBase):
     """
     Wrapper for the search engine Myrimatch.
     """
+    params_key = 'MYRIMATCH_PARAMS'
+    params_name = 'myrimatch.cfg'
 
     def add_args(self):
         args = super(Myrimatch, self).add_args()
         args.append(Argument('MYRIMATCH_DIR', 'executable location.', default=''))
         args.append(Argument('MYRIMATCH_EXE',KeyHelp.EXECUTABLE, default='myrimatch'))
+        args.append(Argument('PEPXML_STREAMING', 'Leave fixups of the pepXML to a filter streaming into the '
+                                                 'InteractParser of PeptideProphetSequence', default=False))
         return args
 
-    def prepare_run(self, log, info):
-        wd = info[Keys.WORKDIR]
-        basename = os.path.splitext(os.path.split(info[Keys.MZXML])[1])[0]
-        info[Keys.PEPXML] = os.path.join(wd, basename + ".pepXML")  #myrimatch default is pepXML NOT pep.xml
-
+    def param_info(self, log, info):
         # need to create a working copy to prevent replacement or generic definitions
         # with app specific definitions
         app_info = info.copy()
@@ -38,20 +36,22 @@ class Myrimatch(SearchEnginesBase):
                                                                                  info["VARIABLE_MODS"], 'Myrimatch')
         if app_info['FRAGMASSUNIT'] == 'Da':
             app_info['FRAGMASSUNIT'] = 'daltons'
+        return app_info
+
+    def prepare_run(self, log, info):
+        wd = info[Keys.WORKDIR]
+        basename = os.path.splitext(os.path.split(info[Keys.MZXML])[1])[0]
+        info[Keys.PEPXML] = os.path.join(wd, basename + ".pepXML")  #myrimatch default is pepXML NOT pep.xml
 
-        #tpl = os.path.join(wd, 'myrimatch.cfg')
-        tpl = 'myrimatch.cfg'
-        tplfile = os.path.join(wd, tpl)
-        read_mod_write(app_info, get_tpl_of_class(self), tplfile)
+        tplfile = self.params_file(log, info, os.path.join(wd, self.params_name))
+        self.rendered_params = [tplfile]
 
-        exe_path = app_info['MYRIMATCH_DIR']
-        exe = app_info['MYRIMATCH_EXE']
+        exe_path = info['MYRIMATCH_DIR']
+        exe = info['MYRIMATCH_EXE']
         command = "{exe} -cpus {threads} -cfg {tpl} -workdir {workdir} -ProteinDatabase {dbase} {mzxml}".format(
-            exe=os.path.join(exe_path, exe), threads=app_info['THREADS'], tpl=tpl,
-            workdir=app_info[Keys.WORKDIR], dbase=app_info['DBASE'],
-            mzxml=app_info[Keys.MZXML])
-        # update original info object with new keys from working copy
-        #info = DictUtils.merge(log, info, app_info, priority='left')        
+            exe=os.path.join(exe_path, exe), threads=info['THREADS'], tpl=tplfile,
+            workdir=info[Keys.WORKDIR], dbase=info['DBASE'],
+            mzxml=info[Keys.MZXML])
         return info, command
 
     def validate_run(self, log, info, exit_code, stdout):
@@ -59,13 +59,11 @@ class Myrimatch(SearchEnginesBase):
         check_xml(log, info[Keys.PEPXML])
 
         #https://groups.google.com/forum/#!topic/spctools-discuss/dV8LSaE60ao
-        shutil.move(info[Keys.PEPXML], info[Keys.PEPXML]+'.broken')
-        fout = open(info[Keys.PEPXML],'w')
-        for line in open(info[Keys.PEPXML]+'.broken').readlines():
-            if 'spectrumNativeID' in line:
-                line = re.sub('spectrumNativeID="[^"]*"', '', line)
-            fout.write(line)
-        fout.close()
+        # True from the ini, or from the defaults and the workflow in process
+        if str(info.get('PEPXML_STREAMING')) == 'True':
+            info['PEPXML_FILTERS'] = 'strip_native_id'
+        else:
+            rewrite_pepxml(info[Keys.PEPXML], [strip_native_id])
 
         return info
 
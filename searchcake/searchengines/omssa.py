@@ -1,13 +1,16 @@
 #!/usr/bin/env python
 import os
+import sys
 
 from enzymes import enzymestr_to_engine
 from modifications import genmodstr_to_engine
 from searchenginebase import SearchEnginesBase
+from searchcake.utils.blastdb import shared_blastdb
 
 from applicake.base.apputils import validation
 from applicake.base.apputils import templates
 from applicake.base.coreutils.keys import Keys
+from applicake2.base.coreutils.arguments import Argument
 
 
 class Omssa(SearchEnginesBase):
@@ -45,31 +48,28 @@ class Omssa(SearchEnginesBase):
        Default = `2'
     """
 
-    def prepare_run(self, log, info):
-        wd = info[Keys.WORKDIR]
-
-        #add in blast and mzxml2mgf conversion
-        omssadbase = os.path.join(wd, os.path.basename(info['DBASE']))
-        os.symlink(info['DBASE'], omssadbase)
-        mzxmlbase = os.path.basename(info[Keys.MZXML])
-        mzxmllink = os.path.join(wd, mzxmlbase)
-        mgffile = os.path.join(wd, os.path.splitext(mzxmlbase)[0] + '.mgf')
-        os.symlink(info[Keys.MZXML], mzxmllink)
-
-        basename = os.path.splitext(os.path.split(info[Keys.MZXML])[1])[0]
-        result = os.path.join(wd, basename+'.pep.xml')
-        iresult = os.path.join(wd, basename+'.withRT.pep.xml')
-        info[Keys.PEPXML] = iresult
-
+    def add_args(self):
+        args = super(Omssa, self).add_args()
+        args.append(Argument('BLASTDB_CACHE_DIR', 'Directory for BLAST databases shared by all OMSSA runs '
+                                                  '(empty = format DBASE in every run)', default=''))
+        args.append(Argument('MGF_CONVERTER', 'mzXML to mgf conversion: native or MzXML2Search', default='native'))
+        args.append(Argument('MGF_CACHE_DIR', 'Directory to keep converted mgf files for reuse (empty = no reuse)',
+                             default=''))
+        return args
+
+    def param_info(self, log, info):
+        """
+        OMSSA takes its parameters on the command line (no params_key), only the user
+        modifications go to a file, usermod.xml in the work directory.
+        """
         # need to create a working copy to prevent replacement or generic definitions
         # with app specific definitions
         app_info = info.copy()
-        app_info['DBASE'] = omssadbase
 
         if info['FRAGMASSUNIT'] == 'ppm':
             raise RuntimeError("OMSSA does not support frag mass error unit PPM")
 
-        app_info['USERMODXML'] = os.path.join(wd, 'usermod.xml')
+        app_info['USERMODXML'] = os.path.join(info[Keys.WORKDIR], 'usermod.xml')
         app_info["STATIC_MODS"], app_info["VARIABLE_MODS"], tpl = genmodstr_to_engine(info["STATIC_MODS"],
                                                                                    info["VARIABLE_MODS"], 'Omssa')
         if app_info['STATIC_MODS']:
@@ -79,6 +79,40 @@ class Omssa(SearchEnginesBase):
 
         open(app_info['USERMODXML'], 'w').write(tpl)
         app_info['ENZYME'], _ = enzymestr_to_engine(info['ENZYME'], 'Omssa')
+        return app_info
+
+    def prepare_run(self, log, info):
+        wd = info[Keys.WORKDIR]
+
+        #add in blast and mzxml2mgf conversion
+        if info.get('BLASTDB_CACHE_DIR'):
+            omssadbase = shared_blastdb(info['DBASE'], info['BLASTDB_CACHE_DIR'], log)
+            makeblastdb = ""
+        else:
+            omssadbase = os.path.join(wd, os.path.basename(info['DBASE']))
+            os.symlink(info['DBASE'], omssadbase)
+            makeblastdb = "makeblastdb -dbtype prot -in %s && " % omssadbase
+        mzxmlbase = os.path.basename(info[Keys.MZXML])
+        mzxmllink = os.path.join(wd, mzxmlbase)
+        mgffile = os.path.join(wd, os.path.splitext(mzxmlbase)[0] + '.mgf')
+        os.symlink(info[Keys.MZXML], mzxmllink)
+        # mgf stays next to the mzXML link, base names in the pepXML refer to it. The conversion is
+        # part of the command, a search restored from the result cache does not convert
+        if info.get('MGF_CONVERTER', 'native') == 'native':
+            mzxml2mgf = "%s -m searchcake.utils.mzxml2mgf --procs %d %s%s %s && " % (
+                sys.executable, int(info.get(Keys.THREADS) or 1),
+                '--cache %s ' % info['MGF_CACHE_DIR'] if info.get('MGF_CACHE_DIR') else '', info[Keys.MZXML], mgffile)
+        else:
+            mzxml2mgf = "MzXML2Search -mgf %s | grep -v scan && " % mzxmllink
+
+        basename = os.path.splitext(os.path.split(info[Keys.MZXML])[1])[0]
+        result = os.path.join(wd, basename+'.pep.xml')
+        iresult = os.path.join(wd, basename+'.withRT.pep.xml')
+        info[Keys.PEPXML] = iresult
+
+        app_info = self.param_info(log, info)
+        app_info['DBASE'] = omssadbase
+        self.rendered_params = [app_info['USERMODXML']]
         mod_template = templates.modify_template(app_info, templates.read_template(templates.get_tpl_of_class(self)))
         # necessary check for the precursor mass unig
         if app_info['PRECMASSUNIT'].lower() == "ppm":
@@ -88,12 +122,9 @@ class Omssa(SearchEnginesBase):
         exe = app_info.get(Keys.EXECUTABLE, 'omssacl')
 
         #grep to prevent log overflow, InteractParser to add RT to pepXML
-        command = "makeblastdb -dbtype prot -in %s && " \
-                  "MzXML2Search -mgf %s | grep -v scan && " \
+        command = makeblastdb + mzxml2mgf + \
                   "%s %s -fm %s -op %s && " \
                   "InteractParser %s %s -S" % (
-                      omssadbase,
-                      mzxmllink,
                       exe, mod_template, mgffile, result,
                       iresult, result)
         return info, command
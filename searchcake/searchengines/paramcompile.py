@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+import hashlib
+import os
+
+from applicake2.base.app import BasicApp
+from applicake2.base.apputils.templates import read_mod_write, get_tpl_of_class
+from applicake2.base.coreutils.arguments import Argument
+from applicake2.base.coreutils.keys import Keys
+from comet import Comet
+from myrimatch import Myrimatch
+from searchenginebase import SearchEnginesBase
+from xtandem import Xtandem
+
+
+class ParamCompile(BasicApp):
+    """
+    Renders the parameter files of the search engines once per dataset instead of once per mzXML.
+    Run before the split, all splits then reference the same content hashed files through the
+    COMET_PARAMS, MYRIMATCH_PARAMS and XTANDEM_PARAMS keys.
+
+    The thread count is left open ($THREADS) and filled in by each search with its own. OMSSA
+    has no parameter file (no params_key) and renders its command line per search.
+    """
+    engines = [Comet, Myrimatch, Xtandem]
+
+    def add_args(self):
+        args = SearchEnginesBase().add_args()
+        args.append(Argument('XTANDEM_SCORE', 'Scoring algorithm used in the search.'))
+        return args
+
+    def run(self, log, info):
+        wd = info[Keys.WORKDIR]
+        for cls in self.engines:
+            if not cls.params_key or not cls.params_name:
+                raise RuntimeError('%s has no parameter file to compile' % cls.__name__)
+            engine = cls()
+            name, ext = os.path.splitext(engine.params_name)
+            tmp = os.path.join(wd, '%s.tmp%d%s' % (name, os.getpid(), ext))
+            app_info = engine.param_info(log, info)
+            app_info[Keys.THREADS] = '$THREADS'
+            read_mod_write(app_info, get_tpl_of_class(engine), tmp)
+            digest = hashlib.sha1(open(tmp, 'rb').read()).hexdigest()[:16]
+            path = os.path.join(wd, '%s.%s%s' % (name, digest, ext))
+            if os.path.exists(path):
+                os.remove(tmp)
+            else:
+                os.rename(tmp, path)
+            log.info('%s parameters compiled to %s' % (cls.__name__, path))
+            info[engine.params_key] = path
+        return info
+
+
+if __name__ == "__main__":
+    ParamCompile.main()
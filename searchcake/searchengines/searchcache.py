@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+import hashlib
+import os
+import re
+import shutil
+from distutils.spawn import find_executable
+
+from searchcake.utils.filecache import FileLock, evict_lru, file_digest, file_signature, makedirs, read_json, \
+    write_json
+
+# thread counts do not change search results and must not change the cache key
+_THREADS = re.compile(r'-cpus\s+\d+|-nt\s+\d+|--procs\s+\d+|num_threads\s*=\s*\d+|label="spectrum, threads">\d+<')
+# separators of the commands of a shell command line
+_CHAIN = re.compile(r'&&|\|\||[|;&]')
+
+
+def executables(command):
+    """
+    :return: paths of the executables of all commands of a chain (a && b | c), in order
+    """
+    found = []
+    for part in _CHAIN.split(command):
+        words = part.split()
+        exe = find_executable(words[0]) if words else None
+        if exe:
+            found.append(exe)
+    return found
+
+
+class SearchCache(object):
+    """
+    Content addressed cache of search engine results.
+
+    An entry is keyed by the content and base names of the mzXML and the FASTA, the rendered
+    parameter files and the engine executables, and holds the result files plus the engine output.
+    The directories of the run the entry was stored from are rewritten to the ones of the run
+    restoring it.
+    """
+
+    def __init__(self, cachedir, maxsize_gb=None):
+        self.cachedir = cachedir
+        self.maxbytes = int(float(maxsize_gb) * 1024 ** 3) if maxsize_gb else None
+        makedirs(cachedir)
+
+    def key(self, engine, inputs, rendered_params, commands, replace=None):
+        """
+        :param engine: name of the engine
+        :param inputs: input files (mzXML, FASTA), hashed by content and base name, results name
+         the spectra after the mzXML
+        :param rendered_params: rendered parameter files, hashed by content
+        :param commands: command or list of commands, every executable of a command chain is hashed
+        :param replace: dict of strings (e.g. workdir paths) to neutralize in commands and parameters
+        """
+        if not isinstance(commands, list):
+            commands = [commands]
+        # longest first, a path is not cut by a replaced prefix of it
+        replace = sorted((replace or {}).items(), key=lambda item: -len(item[0]))
+
+        def neutral(text):
+            for old, new in replace:
+                text = text.replace(old, new)
+            return _THREADS.sub('', text)
+
+        sha = hashlib.sha1(engine.encode('utf-8'))
+        for path in inputs:
+            sha.update(os.path.basename(path).encode('utf-8'))
+            sha.update(file_digest(path, self.cachedir).encode('utf-8'))
+        for path in rendered_params:
+            sha.update(neutral(open(path).read()).encode('utf-8'))
+        for cmd in commands:
+            sha.update(neutral(cmd).encode('utf-8'))
+            for exe in executables(cmd):
+                # binary version, path independent
+                sha.update(file_signature(exe).split(':', 1)[1].encode('utf-8'))
+        return sha.hexdigest()
+
+    def restore(self, log, key, outputs, dirs=()):
+        """
+        Puts the cached result files to the given output paths.
+
+        :param dirs: directories of the run (work directory, of the mzXML, of the FASTA), the ones
+         of the stored run are replaced by them in the result files and the engine output
+        :return: cached engine output if found, else None
+        """
+        entry = self._entry(key)
+        stdout = None
+        if os.path.exists(os.path.join(entry, 'stdout.txt')):
+            # entries are complete once renamed into place, copied without the lock; one evicted
+            # meanwhile is a miss
+            try:
+                replace = _replacements(read_json(os.path.join(entry, 'dirs.json')).get('dirs', []), dirs)
+                for i, out in enumerate(outputs):
+                    _copy(os.path.join(entry, str(i)), out, replace)
+                stdout = open(os.path.join(entry, 'stdout.txt')).read()
+                if replace:
+                    stdout = replace[0].sub(replace[1], stdout)
+                os.utime(entry, None)
+            except (IOError, OSError) as e:
+                log.debug('cache entry %s gone while restoring: %s' % (key, e))
+                stdout = None
+        self._count(log, stdout is not None, key)
+        return stdout
+
+    def store(self, log, key, outputs, stdout, dirs=()):
+        """
+        :param dirs: directories of the run, see restore
+        """
+        entry = self._entry(key)
+        tmp = os.path.join(self.cachedir, 'tmp', '%s.%d' % (key, os.getpid()))
+        makedirs(tmp)
+        # copies, not links: later steps may rewrite the outputs in place
+        for i, out in enumerate(outputs):
+            shutil.copy2(out, os.path.join(tmp, str(i)))
+        with open(os.path.join(tmp, 'stdout.txt'), 'wb') as f:
+            f.write(stdout.encode('utf-8') if isinstance(stdout, type(u'')) else stdout)
+        write_json(os.path.join(tmp, 'dirs.json'), {'dirs': list(dirs)})
+
+        with FileLock(self._lockfile):
+            if os.path.exists(entry):
+                shutil.rmtree(tmp)
+            else:
+                os.rename(tmp, entry)
+            if self.maxbytes:
+                evict_lru(self._entries, self.maxbytes, log, keep=(entry,))
+        log.debug('stored search result %s in cache' % key)
+
+    @property
+    def _entries(self):
+        return os.path.join(self.cachedir, 'entries')
+
+    @property
+    def _lockfile(self):
+        return os.path.join(self.cachedir, 'cache.lock')
+
+    def _entry(self, key):
+        makedirs(self._entries)
+        return os.path.join(self._entries, key)
+
+    def _count(self, log, hit, key):
+        statsfile = os.path.join(self.cachedir, 'stats.json')
+        counter = 'hits' if hit else 'misses'
+        with FileLock(self._lockfile):
+            stats = read_json(statsfile)
+            stats[counter] = stats.get(counter, 0) + 1
+            write_json(statsfile, stats)
+        log.info('search cache %s for %s (hits=%d misses=%d)' % (
+            'hit' if hit else 'miss', key, stats.get('hits', 0), stats.get('misses', 0)))
+
+
+def _replacements(stored, current):
+    """
+    :return: pattern matching the stored directories which differ from the current ones, and a
+     function replacing a match by the current directory
+    """
+    pairs = dict((_str(old).rstrip(os.sep), _str(new).rstrip(os.sep)) for old, new in zip(stored, current)
+                 if old and new and old.rstrip(os.sep) != new.rstrip(os.sep))
+    if not pairs:
+        return None
+    # longest first, and only whole directories: /data is not replaced in /data2
+    olds = sorted(pairs, key=lambda old: -len(old))
+    pattern = re.compile('(%s)(?=[/\\s"\'<>]|$)' % '|'.join(re.escape(old) for old in olds), re.M)
+    return pattern, lambda m: pairs[m.group(1)]
+
+
+def _str(path):
+    return path.encode('utf-8') if isinstance(path, type(u'')) else path
+
+
+def _copy(src, dest, replace):
+    # through a temporary file renamed into place, a half restored output is never seen
+    tmp = '%s.tmp%d' % (dest, os.getpid())
+    try:
+        if replace:
+            with open(src, 'rb') as fin, open(tmp, 'wb') as fout:
+                for line in fin:
+                    fout.write(replace[0].sub(replace[1], line))
+            shutil.copystat(src, tmp)
+        else:
+            shutil.copy2(src, tmp)
+        os.rename(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -1,10 +1,19 @@
 __author__ = 'wolski'
 
+import os
+
 from applicake2.base.app import WrappedApp
+from applicake2.base.apputils.templates import read_mod_write, get_tpl_of_class
 from applicake2.base.coreutils.arguments import Argument
 from applicake2.base.coreutils.keys import Keys, KeyHelp
+from searchcache import SearchCache
 
 class SearchEnginesBase(WrappedApp):
+    #: info key of the parameter file rendered once per dataset by ParamCompile, and its file name.
+    #: None for engines without parameter file, ParamCompile does not take them.
+    params_key = None
+    params_name = None
+
     def add_args(self):
          return [
             Argument(Keys.EXECUTABLE, KeyHelp.EXECUTABLE),
@@ -25,4 +34,82 @@ class SearchEnginesBase(WrappedApp):
             Argument('comet_theoretical_fragment_ions', 'wenguang added temp', default=1),
 
             Argument('DBASE', 'Sequence database file with target/decoy entries'),
+
+            Argument('SEARCH_CACHE_DIR', 'Directory of the search result cache (empty = no caching)', default=''),
+            Argument('SEARCH_CACHE_MAXSIZE', 'Maximal size of the search result cache in GB', default=''),
         ]
+
+    def param_info(self, log, info):
+        """
+        Working copy of info with the engine specific definitions the template is rendered with,
+        implemented by every engine.
+        """
+        raise NotImplementedError
+
+    def params_file(self, log, info, tplfile):
+        """
+        Parameter file for the search: the one rendered by ParamCompile if there is one, else
+        the template rendered to tplfile.
+        """
+        if info.get(self.params_key):
+            log.debug('using compiled parameters ' + info[self.params_key])
+            return self._with_threads(info[self.params_key], info[Keys.THREADS])
+        read_mod_write(self.param_info(log, info), get_tpl_of_class(self), tplfile)
+        return tplfile
+
+    @staticmethod
+    def _with_threads(path, threads):
+        # compiled parameters leave the thread count open, one file per thread count
+        content = open(path).read()
+        if '$THREADS' not in content:
+            return path
+        base, ext = os.path.splitext(path)
+        target = '%s.t%s%s' % (base, threads, ext)
+        if not os.path.exists(target):
+            tmp = target + '.tmp%d' % os.getpid()
+            with open(tmp, 'w') as f:
+                f.write(content.replace('$THREADS', str(threads)))
+            os.rename(tmp, target)
+        return target
+
+    def run(self, log, info):
+        self._cache_key = None
+        # parameter files written by prepare_run, part of the result cache key
+        self.rendered_params = []
+        info = super(SearchEnginesBase, self).run(log, info)
+        # only validated results go to the cache
+        if self._cache_key:
+            self._cache.store(log, self._cache_key, self.search_outputs(info), self._stdout, self._cache_dirs(info))
+        return info
+
+    def execute_run(self, log, info, cmd):
+        if not info.get('SEARCH_CACHE_DIR'):
+            return self.execute_search(log, info, cmd)
+
+        self._cache = SearchCache(info['SEARCH_CACHE_DIR'], info.get('SEARCH_CACHE_MAXSIZE'))
+        key = self._cache.key(self.__class__.__name__, [info[Keys.MZXML], info['DBASE']], self.rendered_params, cmd,
+                              replace={info[Keys.WORKDIR]: '',
+                                       info[Keys.MZXML]: os.path.basename(info[Keys.MZXML]),
+                                       info['DBASE']: os.path.basename(info['DBASE'])})
+        stdout = self._cache.restore(log, key, self.search_outputs(info), self._cache_dirs(info))
+        if stdout is not None:
+            return 0, stdout
+
+        exit_code, stdout = self.execute_search(log, info, cmd)
+        if exit_code == 0:
+            self._cache_key, self._stdout = key, stdout
+        return exit_code, stdout
+
+    def execute_search(self, log, info, cmd):
+        return super(SearchEnginesBase, self).execute_run(log, info, cmd)
+
+    @staticmethod
+    def _cache_dirs(info):
+        # directories named in the results, rewritten on restore
+        return [info[Keys.WORKDIR], os.path.dirname(info[Keys.MZXML]), os.path.dirname(info['DBASE'])]
+
+    def search_outputs(self, info):
+        """
+        Result files restored from the cache instead of running the search.
+        """
+        return [info[Keys.PEPXML]]
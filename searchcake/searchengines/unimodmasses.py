@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Unimod label -> (mono, avg) delta masses from a small table next to this module
+(unimod_masses.tsv), so that looking up a modification does not load the whole Unimod database.
+The table is part of the package and only read: labels missing in it are looked up in Unimod
+once per process, with a warning to add them by running this module.
+
+usage: python -m searchcake.searchengines.unimodmasses [LABEL ...]
+rebuilds the table from Unimod with the given labels and all those already in it
+"""
+import csv
+import logging
+import os
+import sys
+
+MASSFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'unimod_masses.tsv')
+
+# label -> masses of the table and of the labels looked up in Unimod, None if unknown there
+_table = None
+
+
+def get_mass(label):
+    """
+    :return: (mono, avg) delta mass of a Unimod label, None if Unimod does not know it
+    """
+    table = load_table()
+    if label not in table:
+        table[label] = unimod_mass(label)
+        logging.getLogger(__name__).warning(
+            "%s is not in %s, looked up in Unimod; add it with python -m searchcake.searchengines.unimodmasses %s"
+            % (label, MASSFILE, label))
+    return table[label]
+
+
+def load_table():
+    """
+    Reads the mass table once per process, processes forked afterwards share it.
+    """
+    global _table
+    if _table is None:
+        _table = read_mass_table(MASSFILE)
+    return _table
+
+
+def unimod_mass(label):
+    """
+    Looks up a label in the Unimod database (slow, loads the whole database on first use).
+    """
+    from Unimod.unimod import database
+    entry = database.get_label(label)
+    if not entry:
+        return None
+    return float(entry['delta_mono_mass']), float(entry['delta_avge_mass'])
+
+
+def read_mass_table(path):
+    table = {}
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            for row in csv.DictReader(f, delimiter='\t'):
+                table[row['label']] = float(row['delta_mono_mass']), float(row['delta_avge_mass'])
+    return table
+
+
+def write_mass_table(path, table):
+    tmp = path + '.tmp%d' % os.getpid()
+    with open(tmp, 'wb') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(['label', 'delta_mono_mass', 'delta_avge_mass'])
+        for label in sorted(table, key=lambda l: l.lower()):
+            writer.writerow([label] + ['%r' % m for m in table[label]])
+    os.rename(tmp, path)
+
+
+def main(labels):
+    table = {}
+    for label in set(read_mass_table(MASSFILE)) | set(labels):
+        masses = unimod_mass(label)
+        if masses is None:
+            sys.stderr.write("%s not found in unimod, skipped\n" % label)
+            continue
+        table[label] = masses
+    write_mass_table(MASSFILE, table)
+    print "Wrote %d labels to %s" % (len(table), MASSFILE)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -5,7 +5,6 @@ from searchenginebase import SearchEnginesBase
 from enzymes import enzymestr_to_engine
 from modifications import genmodstr_to_engine
 
-from applicake2.base.apputils import templates
 from applicake2.base.coreutils.arguments import Argument
 from applicake2.base.coreutils.keys import Keys, KeyHelp
 from applicake2.base.apputils import validation
@@ -15,6 +14,8 @@ class Xtandem(SearchEnginesBase):
     """
     Wrapper for the search engine X!Tandem.
     """
+    params_key = 'XTANDEM_PARAMS'
+    params_name = 'xtandem.params'
 
     def add_args(self):
         args = super(Xtandem, self).add_args()
@@ -25,11 +26,7 @@ class Xtandem(SearchEnginesBase):
         args.append(Argument('XTANDEM_SCORE', 'Scoring algorithm used in the search.'))
         return args
 
-    def prepare_run(self, log, info):
-        wd = info[Keys.WORKDIR]
-        tandemexe = info.get('TANDEM_EXE')
-        tandem2xmlexe = info.get('TANDEM2XML_EXE')
-
+    def param_info(self, log, info):
         # need to create a working copy to prevent replacement with app specific definitions
         app_info = info.copy()
 
@@ -42,9 +39,17 @@ class Xtandem(SearchEnginesBase):
 
         app_info['ENZYME'] =cleavage
         app_info['XTANDEM_SEMI_CLEAVAGE'] = enzyme
+        return app_info
+
+    def prepare_run(self, log, info):
+        wd = info[Keys.WORKDIR]
+        tandemexe = info.get('TANDEM_EXE')
+        tandem2xmlexe = info.get('TANDEM2XML_EXE')
+
         #files required and written
-        app_info['XTANDEM_PARAMS'] = os.path.join(wd, 'xtandem.params')
-        templates.read_mod_write(app_info, templates.get_tpl_of_class(self), app_info['XTANDEM_PARAMS'])
+        app_info = info.copy()
+        app_info['XTANDEM_PARAMS'] = self.params_file(log, info, os.path.join(wd, self.params_name))
+        self.rendered_params = [app_info['XTANDEM_PARAMS']]
         app_info['XTANDEM_INPUT'] = os.path.join(wd, 'xtandem.input')
         app_info['XTANDEM_TAXONOMY'] = os.path.join(wd, 'xtandem.taxonomy')
         app_info['XTANDEM_RESULT'] = os.path.join(wd, 'xtandem.result')
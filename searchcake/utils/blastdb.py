@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+import hashlib
+import os
+import shutil
+import subprocess
+
+from searchcake.utils.filecache import FileLock, file_signature, makedirs
+
+
+def shared_blastdb(fasta, cachedir, log, exe='makeblastdb'):
+    """
+    Returns a BLAST formatted protein database for fasta, built once per FASTA version (path,
+    size, mtime) in cachedir and reused by all concurrent and later runs.
+
+    :return: database name as given to omssacl -d
+    """
+    leaf = os.path.basename(fasta)
+    key = hashlib.sha1(file_signature(fasta).encode('utf-8')).hexdigest()[:16]
+    entry = os.path.join(cachedir, '%s.%s' % (leaf, key))
+    dbname = os.path.join(entry, leaf)
+
+    with FileLock(entry + '.lock'):
+        if os.path.exists(os.path.join(entry, 'done')):
+            log.debug('using shared blast database %s' % dbname)
+            return dbname
+
+        tmp = entry + '.tmp%d' % os.getpid()
+        shutil.rmtree(tmp, ignore_errors=True)
+        makedirs(tmp)
+        os.symlink(os.path.abspath(fasta), os.path.join(tmp, leaf))
+        cmd = [exe, '-dbtype', 'prot', '-in', os.path.join(tmp, leaf)]
+        log.info('building shared blast database [%s]' % ' '.join(cmd))
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out = p.communicate()[0]
+        if p.returncode != 0:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise RuntimeError("makeblastdb failed for %s: %s" % (fasta, out))
+        open(os.path.join(tmp, 'done'), 'w').close()
+        os.rename(tmp, entry)
+    return dbname
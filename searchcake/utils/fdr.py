@@ -2,10 +2,14 @@
 import csv
 import os
 
+import numpy
+
+from searchcake.utils.pepxmlheader import read_error_table
+
 precision = 6
 
 
-def get_iprob_for_fdr(requested_fdr, tool_type, mayuout=None, pepxml=None):
+def get_iprob_for_fdr(requested_fdr, tool_type, mayuout=None, pepxml=None, interpolate=False):
     """
     Retrieves interprophet_probability corresponding requested fdr&type
 
@@ -13,67 +17,117 @@ def get_iprob_for_fdr(requested_fdr, tool_type, mayuout=None, pepxml=None):
     :param tool_type: one of iprophet-pepFDR iprophet-iprob mayu-mFDR mayu-pepFDR mayu-protFDR
     :param mayuout: needed if mayu-* fdr type requested
     :param pepxml: needed if iprophet-* fdr type requested
+    :param interpolate: interpolate between tabulated FDRs instead of exact (iprophet) or closest (mayu) match
     :return: float iprob, str nicely formatted fdr string and iprob mapping
     """
+    iprobs, effective_fdrs = resolve_iprobs([requested_fdr], tool_type, mayuout, pepxml, interpolate)
+
+    # harmonize to 6digits after comma (%g without trailing zeroes)
+    iprob = round(float(iprobs[0]), precision)
+    effective_fdr = round(float(effective_fdrs[0]), precision)
+    fdr_str = "%g %s (=%g iprob)" % (effective_fdr, tool_type, iprob)
+    print "Requested", requested_fdr, 'got', fdr_str
+    return iprob, fdr_str
+
+
+def resolve_iprobs(requested_fdrs, tool_type, mayuout=None, pepxml=None, interpolate=False):
+    """
+    Vectorized get_iprob_for_fdr for any number of requested fdrs.
 
-    requested_fdr = float(requested_fdr)
+    :return: numpy arrays iprobs, effective fdrs
+    """
+    requested_fdrs = numpy.asarray(requested_fdrs, dtype=float)
     tool, type = tool_type.split("-")
 
     if tool == "iprophet":
-        iprob, effective_fdr = _get_iprob_for_fdr_iprophet(requested_fdr, type, pepxml)
+        if type == 'iprob':
+            # dummy, input is taken 1:1
+            return requested_fdrs.copy(), requested_fdrs.copy()
+        if type != 'pepFDR':
+            raise RuntimeError("No iprob found for iprophet-%s" % type)
+        resolver = get_resolver(pepxml, 'iprophet')
+        if interpolate:
+            return resolver.interpolate(requested_fdrs), requested_fdrs.copy()
+        iprobs = resolver.exact(requested_fdrs)
+        if numpy.isnan(iprobs).any():
+            raise RuntimeError("No iprob found for iprophet-%s of %s" % (
+                type, ", ".join("%g" % f for f in requested_fdrs[numpy.isnan(iprobs)])))
+        return iprobs, requested_fdrs.copy()
     elif tool == "mayu":
-        iprob, effective_fdr = _get_iprob_for_fdr_mayu(requested_fdr, type, mayuout)
+        if not mayuout or not os.path.exists(mayuout):
+            raise RuntimeError("Mayu file not available. Please make sure to run latest TPP first.")
+        resolver = get_resolver(mayuout, 'mayu', type)
+        if interpolate:
+            return resolver.interpolate(requested_fdrs), requested_fdrs.copy()
+        return resolver.closest(requested_fdrs)
     else:
         raise RuntimeError("Unknown tool " + tool)
 
-    # harmonize to 6digits after comma (%g without trailing zeroes)
-    iprob = round(iprob, precision)
-    effective_fdr = round(effective_fdr, precision)
-    fdr_str = "%g %s (=%g iprob)" % (effective_fdr, tool_type, iprob)
-    print "Requested", requested_fdr, 'got', fdr_str
-    return iprob, fdr_str
-
 
-def _get_iprob_for_fdr_iprophet(requested_fdr, type, source):
+class FdrResolver(object):
     """
-    Reads out the iprob corresponding pepFDR from the iProphet header.
-    If type is iprob (=dummy) input is taken 1:1
+    Maps FDRs to probability cutoffs of one error table, kept sorted by FDR so that queries are
+    answered by binary search.
     """
-    iprob = None
 
-    if type == 'iprob':
-        iprob = requested_fdr
-    if type == 'pepFDR':
-        for line in open(source):
-            if line.startswith('<error_point error="%s' % requested_fdr):
-                iprob = float(line.split(" ")[2].split("=")[1].replace('"', ''))
-                break
+    def __init__(self, fdrs, probs):
+        fdrs = numpy.asarray(fdrs, dtype=float)
+        probs = numpy.asarray(probs, dtype=float)
+        # stable sort, of equal fdrs the first in the table wins
+        order = numpy.argsort(fdrs, kind='mergesort')
+        self.fdrs = fdrs[order]
+        self.probs = probs[order]
+        if not len(self.fdrs):
+            raise RuntimeError("Empty FDR table")
+
+    def exact(self, requested, atol=1e-9):
+        """
+        :return: probabilities of tabulated fdrs equal to requested ones, nan where there is none
+        """
+        idx = numpy.searchsorted(self.fdrs, numpy.asarray(requested, dtype=float) - atol)
+        found = numpy.minimum(idx, len(self.fdrs) - 1)
+        return numpy.where(numpy.abs(self.fdrs[found] - requested) <= atol, self.probs[found], numpy.nan)
+
+    def closest(self, requested):
+        """
+        :return: probabilities and fdrs of the tabulated fdrs closest to the requested ones
+        """
+        requested = numpy.asarray(requested, dtype=float)
+        hi = numpy.minimum(numpy.searchsorted(self.fdrs, requested), len(self.fdrs) - 1)
+        lo = numpy.maximum(hi - 1, 0)
+        # first of the run of equal fdrs below
+        lo = numpy.searchsorted(self.fdrs, self.fdrs[lo])
+        best = numpy.where(numpy.abs(self.fdrs[lo] - requested) <= numpy.abs(self.fdrs[hi] - requested), lo, hi)
+        return self.probs[best], self.fdrs[best]
+
+    def interpolate(self, requested):
+        """
+        :return: linearly interpolated probabilities, made monotone (a higher fdr never needs a
+         higher probability), clipped to the tabulated range
+        """
+        fdrs, first = numpy.unique(self.fdrs, return_index=True)
+        probs = numpy.minimum.accumulate(self.probs[first])
+        return numpy.interp(numpy.asarray(requested, dtype=float), fdrs, probs)
+
 
-    if not iprob:
-        raise RuntimeError("No iprob found for iprophet-%s of %s" % (type, requested_fdr))
-    return iprob, requested_fdr
+# resolvers by (source, kind, column, mtime), shared by all callers within a process
+_resolvers = {}
 
 
-def _get_iprob_for_fdr_mayu(requested_fdr, type, source):
+def get_resolver(source, kind, column=None):
     """
-    Finds closest available FDR to requested one, and gives back adjusted FDR
+    :param source: iProphet pepXML (kind 'iprophet') or Mayu csv (kind 'mayu')
+    :param column: FDR column of the Mayu csv (mFDR, pepFDR, protFDR)
     """
-    iprob = None
-    effective_fdr = None
-    mindiff = 1.0
-    if not source or not os.path.exists(source):
-        raise RuntimeError("Mayu file not available. Please make sure to run latest TPP first.")
-    reader = csv.DictReader(open(source, "rb"))
-    for line in reader:
-        linefdr = float(line[type])
-        diff = abs(linefdr - requested_fdr)
-        if diff < mindiff:
-            mindiff = diff
-            effective_fdr = linefdr
-            iprob = float(line['IP/PPs'])
-
-    # if mindiff > 0.01:
-    #    raise RuntimeError("No close match found for %s mayu-%s" % (fdr, type))
-    if not iprob:
-        raise RuntimeError("No iprob found for %s mayu-%s" % (requested_fdr, type))
-    return iprob, effective_fdr
\ No newline at end of file
+    key = (os.path.abspath(source), kind, column, os.path.getmtime(source))
+    if key not in _resolvers:
+        if kind == 'iprophet':
+            table = read_error_table(source)
+            _resolvers[key] = FdrResolver(table['error'], table['min_prob'])
+        else:
+            fdrs, probs = [], []
+            for line in csv.DictReader(open(source, "rb")):
+                fdrs.append(float(line[column]))
+                probs.append(float(line['IP/PPs']))
+            _resolvers[key] = FdrResolver(fdrs, probs)
+    return _resolvers[key]
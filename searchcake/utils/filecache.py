@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+
+blocksize = 4 * 1024 * 1024
+
+
+def file_signature(path):
+    """
+    Cheap identity of a file: absolute path, size and modification time.
+    """
+    st = os.stat(path)
+    return "%s:%d:%d" % (os.path.abspath(path), st.st_size, int(st.st_mtime))
+
+
+def file_digest(path, memo_dir=None):
+    """
+    sha1 of the file content. If memo_dir is given digests are remembered there by file
+    signature, so unchanged (multi GB) files are read only once.
+    """
+    memo = os.path.join(memo_dir, 'digests.json') if memo_dir else None
+    signature = file_signature(path)
+    if memo:
+        with FileLock(memo + '.lock'):
+            digests = read_json(memo)
+        if signature in digests:
+            return digests[signature]
+
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha.update(block)
+    digest = sha.hexdigest()
+
+    if memo:
+        with FileLock(memo + '.lock'):
+            digests = read_json(memo)
+            digests[signature] = digest
+            write_json(memo, digests)
+    return digest
+
+
+def link_or_copy(src, dest):
+    """
+    Hard links src to dest, copies if linking is not possible (e.g. across file systems).
+    """
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def evict_lru(root, maxbytes, log=None, keep=()):
+    """
+    Removes the least recently used entries (direct subdirectories of root, by mtime) until
+    their total size is below maxbytes. Entries in keep are never removed.
+
+    :return: number of bytes freed
+    """
+    entries = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and path not in keep:
+            entries.append((os.path.getmtime(path), dir_size(path), path))
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= maxbytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        freed += size
+        if log:
+            log.debug('evicted cache entry %s (%d bytes)' % (path, size))
+    return freed
+
+
+class FileLock(object):
+    """
+    Exclusive advisory lock on a lock file, usable across processes (and nodes on file systems
+    supporting fcntl locks).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        makedirs(os.path.dirname(self.path))
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o666)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+
+def makedirs(path):
+    if not path:
+        return
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def read_json(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def write_json(path, obj):
+    tmp = path + '.tmp%d' % os.getpid()
+    with open(tmp, 'w') as f:
+        json.dump(obj, f)
+    os.rename(tmp, path)
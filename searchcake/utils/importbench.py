@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Import time of the entry points of the workflow tasks, each measured in a fresh interpreter as a
+ruffus task process pays it. Without a baseline file the results are written to it, with one they
+are compared to it and the exit code is 1 if an entry point got slower by more than the tolerance,
+imports a heavy module it did not import before or fails to import.
+
+usage: python -m searchcake.utils.importbench [--repeat N] [--tolerance F] [--update] BASELINE
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from searchcake.utils.filecache import read_json, write_json
+
+ENTRY_POINTS = [
+    'searchcake.pepidentWF:run_peptide_WF',
+    'searchcake.libcreateWF:run_libcreate_WF',
+    'searchcake.searchengines.paramcompile:ParamCompile',
+    'searchcake.searchengines.comet:Comet',
+    'searchcake.searchengines.myrimatch:Myrimatch',
+    'searchcake.searchengines.xtandem:Xtandem',
+    'searchcake.prophets.peptideprophet:PeptideProphetSequence',
+    'searchcake.prophets.interprophet:InterProphet',
+    'searchcake.prophets.proteinprophet:ProteinProphet',
+    'searchcake.searchengines.iprophetpepxml2csv:IprohetPepXML2CSV',
+    'searchcake.libcreate.spectrast:Spectrast',
+]
+
+# modules which should only be imported by the tasks which need them
+HEAVY = ('numpy', 'lxml', 'pandas', 'pyteomics', 'scipy', 'ruffus', 'Unimod', 'systemhccake')
+
+# seconds of noise below which a slower import is not a regression
+noise = 0.02
+
+_probe = """
+import json, sys, time
+start = time.time()
+import importlib
+module, name = sys.argv[1].split(':')
+getattr(importlib.import_module(module), name)
+print json.dumps({'seconds': time.time() - start, 'modules': sorted(m for m in sys.modules if sys.modules[m])})
+"""
+
+
+def measure(entry, repeat=5):
+    """
+    :return: dict seconds (best import time), wall (best time of the interpreter incl. startup),
+     modules (number imported), heavy (heavy modules imported) or error
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        proc = subprocess.Popen([sys.executable, '-c', _probe, entry], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        wall = time.time() - start
+        if proc.returncode:
+            return {'error': (err.strip().splitlines() or ['exit code %d' % proc.returncode])[-1]}
+        result = json.loads(out.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = {'seconds': result['seconds'], 'wall': wall, 'modules': len(result['modules']),
+                    'heavy': sorted(set(m.split('.')[0] for m in result['modules'] if m.split('.')[0] in HEAVY))}
+    return best
+
+
+def regressions(results, baseline, tolerance=0.2):
+    """
+    :return: list of messages, empty if no entry point regressed
+    """
+    messages = []
+    for entry, result in sorted(results.items()):
+        if 'error' in result:
+            messages.append('%s: %s' % (entry, result['error']))
+            continue
+        base = baseline.get(entry)
+        if not base or 'error' in base:
+            continue
+        if result['seconds'] > base['seconds'] * (1 + tolerance) + noise:
+            messages.append('%s: import took %.3fs, baseline %.3fs' % (entry, result['seconds'], base['seconds']))
+        new = set(result['heavy']) - set(base['heavy'])
+        if new:
+            messages.append('%s: imports %s now' % (entry, ', '.join(sorted(new))))
+    return messages
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Import time of the workflow entry points.')
+    parser.add_argument('baseline', help='json file of earlier results, written if missing')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per entry point, the best counts')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--update', action='store_true', help='write the results to the baseline')
+    parser.add_argument('--entry', action='append', help='module:attribute to measure, default all')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print "%-64s %8s %8s %5s  %s" % ('entry point', 'import', 'wall', 'mods', 'heavy modules')
+    for entry in args.entry or ENTRY_POINTS:
+        results[entry] = measure(entry, args.repeat)
+        r = results[entry]
+        if 'error' in r:
+            print "%-64s ERROR %s" % (entry, r['error'])
+        else:
+            print "%-64s %7.3fs %7.3fs %5d  %s" % (entry, r['seconds'], r['wall'], r['modules'], ' '.join(r['heavy']))
+
+    if not os.path.exists(args.baseline) or args.update:
+        write_json(args.baseline, results)
+        print "baseline written to", args.baseline
+        return 0
+    messages = regressions(results, read_json(args.baseline), args.tolerance)
+    for message in messages:
+        print "REGRESSION", message
+    return 1 if messages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
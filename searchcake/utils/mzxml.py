@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+import mmap
+import os
+import re
+
+_INDEX_OFFSET = re.compile(br'<indexOffset>\s*(\d+)\s*</indexOffset>')
+_OFFSET = re.compile(br'<offset\s+id="(\d+)"\s*>\s*(\d+)\s*</offset>')
+_SCAN = re.compile(br'<scan\s[^>]*?num="(\d+)"')
+
+
+def read_scan_offsets(path):
+    """
+    Returns the list of (scan number, byte offset) of all scans in an mzXML file.
+
+    Uses the index at the end of the file if there is one, otherwise the whole file is scanned
+    for <scan> start tags.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        m = _INDEX_OFFSET.search(f.read())
+        if m and 0 < int(m.group(1)) < size:
+            f.seek(int(m.group(1)))
+            offsets = [(int(num), int(pos)) for num, pos in _OFFSET.findall(f.read())]
+            if offsets:
+                return offsets
+
+        if size == 0:
+            return []
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return [(int(m.group(1)), m.start()) for m in _SCAN.finditer(mm)]
+        finally:
+            mm.close()
+
+
+def scan_ranges(path, nr_ranges):
+    """
+    Splits the scans of an mzXML into at most nr_ranges contiguous (first_scan, last_scan) ranges
+    holding about the same number of scans each.
+    """
+    scans = sorted(num for num, _ in read_scan_offsets(path))
+    if not scans:
+        return []
+    nr_ranges = max(1, min(int(nr_ranges), len(scans)))
+    ranges = []
+    for i in range(nr_ranges):
+        chunk = scans[i * len(scans) // nr_ranges:(i + 1) * len(scans) // nr_ranges]
+        ranges.append((chunk[0], chunk[-1]))
+    return ranges
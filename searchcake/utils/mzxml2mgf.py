@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Native mzXML to MGF conversion, written like MzXML2Search -mgf writes it.
+
+usage: python -m searchcake.utils.mzxml2mgf [--procs N] [--cache DIR] MZXML MGF
+"""
+import argparse
+import base64
+import hashlib
+import os
+import re
+import shutil
+import sys
+import zlib
+
+import numpy
+
+from searchcake.utils import processes
+from searchcake.utils.filecache import FileLock, file_signature, makedirs
+from searchcake.utils.mzxml import read_scan_offsets
+
+_ATTR = re.compile(br'([\w:]+)="([^"]*)"')
+_SCAN_TAG = re.compile(br'<scan\s[^>]*>')
+_PRECURSOR = re.compile(br'<precursorMz([^>]*)>\s*([^<\s]+)\s*</precursorMz>')
+_PEAKS = re.compile(br'<peaks([^>]*)>([^<]*)</peaks>')
+_DURATION = re.compile(r'PT(?:([\d.]+)H)?(?:([\d.]+)M)?(?:([\d.]+)S)?')
+
+# spectra without precursor charge: singly charged if at least this fraction of the intensity is
+# below the precursor m/z, else written once per charge of CHARGES (as MzXML2Search does)
+singly_charged_fraction = 0.95
+CHARGES = (2, 3)
+
+
+def mzxml_to_mgf(mzxml, mgf, nrprocs=1, log=None):
+    """
+    Writes all MS2 scans of an mzXML as MGF (titles like MzXML2Search: base.start.end.charge).
+
+    Scans are decoded one at a time straight from their byte offsets, so memory use does not
+    depend on the file size. With nrprocs > 1 contiguous scan ranges are converted in parallel
+    processes (see utils.processes) and concatenated.
+
+    :return: number of spectra written
+    """
+    offsets = sorted(pos for _, pos in read_scan_offsets(mzxml))
+    if not offsets:
+        raise RuntimeError("No scans found in %s" % mzxml)
+    bounds = offsets + [os.path.getsize(mzxml)]
+    base = os.path.splitext(os.path.basename(mzxml))[0]
+
+    nrprocs = max(1, min(int(nrprocs), len(offsets)))
+    chunks = []
+    for i in range(nrprocs):
+        lo, hi = i * len(offsets) // nrprocs, (i + 1) * len(offsets) // nrprocs
+        chunks.append((mzxml, base, bounds[lo:hi + 1], '%s.part%d' % (mgf, i)))
+
+    counts = list(processes.imap(_convert_chunk, chunks, nrprocs))
+
+    with open(mgf, 'wb') as fout:
+        for chunk in chunks:
+            with open(chunk[3], 'rb') as part:
+                shutil.copyfileobj(part, fout, 4 * 1024 * 1024)
+            os.remove(chunk[3])
+
+    if log:
+        log.debug('wrote %d spectra of %s to %s' % (sum(counts), mzxml, mgf))
+    return sum(counts)
+
+
+def cached_mzxml_to_mgf(mzxml, cachedir, nrprocs=1, log=None):
+    """
+    Like mzxml_to_mgf, but the MGF is kept in cachedir and reused as long as the mzXML (path,
+    size, mtime) does not change.
+
+    :return: path of the MGF
+    """
+    key = hashlib.sha1(file_signature(mzxml).encode('utf-8')).hexdigest()[:16]
+    mgf = os.path.join(cachedir, '%s.%s.mgf' % (os.path.splitext(os.path.basename(mzxml))[0], key))
+    with FileLock(mgf + '.lock'):
+        if os.path.exists(mgf):
+            if log:
+                log.debug('using cached mgf %s' % mgf)
+            return mgf
+        makedirs(cachedir)
+        mzxml_to_mgf(mzxml, mgf + '.tmp', nrprocs, log)
+        os.rename(mgf + '.tmp', mgf)
+    return mgf
+
+
+def _convert_chunk(args):
+    mzxml, base, bounds, out = args
+    nr = 0
+    with open(mzxml, 'rb') as fin, open(out, 'wb') as fout:
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            fin.seek(start)
+            for spectrum in _scan_to_mgf(fin.read(end - start), base):
+                fout.write(spectrum)
+                nr += 1
+    return nr
+
+
+def _scan_to_mgf(fragment, base):
+    """
+    :return: MGF spectra of a scan, one per charge state
+    """
+    tag = _SCAN_TAG.search(fragment)
+    if not tag:
+        return []
+    scan = dict(_ATTR.findall(tag.group(0)))
+    if scan.get(b'msLevel', b'2') == b'1':
+        return []
+    precursor = _PRECURSOR.search(fragment, tag.end())
+    peaks = _PEAKS.search(fragment, tag.end())
+    if not precursor or not peaks:
+        return []
+
+    num = int(scan[b'num'])
+    mz, intensity = _decode_peaks(dict(_ATTR.findall(peaks.group(1))), peaks.group(2))
+    charge = int(dict(_ATTR.findall(precursor.group(1))).get(b'precursorCharge', 0) or 0)
+    pepmass = precursor.group(2).decode('ascii')
+    # intensities as precise as stored
+    ions = ''.join('%.5f %r\n' % p for p in zip(mz, intensity))
+
+    spectra = []
+    for z in [charge] if charge else candidate_charges(float(pepmass), mz, intensity):
+        lines = ['BEGIN IONS',
+                 'TITLE=%s.%05d.%05d.%d' % (base, num, num, z),
+                 'PEPMASS=%s' % pepmass,
+                 'CHARGE=%d+' % z]
+        if b'retentionTime' in scan:
+            lines.append('RTINSECONDS=%g' % _seconds(scan[b'retentionTime'].decode('ascii')))
+        lines.append('SCANS=%d' % num)
+        spectra.append(('\n'.join(lines) + '\n' + ions + 'END IONS\n\n').encode('ascii'))
+    return spectra
+
+
+def candidate_charges(precursor_mz, mz, intensity):
+    """
+    :return: charge states of a spectrum without precursor charge
+    """
+    total = float(numpy.sum(intensity))
+    if total == 0 or numpy.sum(intensity[mz < precursor_mz]) >= singly_charged_fraction * total:
+        return [1]
+    return list(CHARGES)
+
+
+def _decode_peaks(attrs, data):
+    raw = base64.b64decode(data.strip())
+    if not raw:
+        return [], []
+    if attrs.get(b'compressionType') == b'zlib':
+        raw = zlib.decompress(raw)
+    order = '<' if attrs.get(b'byteOrder') == b'little' else '>'
+    values = numpy.frombuffer(raw, dtype=order + ('f8' if attrs.get(b'precision') == b'64' else 'f4'))
+    return values[0::2], values[1::2]
+
+
+def _seconds(duration):
+    m = _DURATION.match(duration)
+    if not m:
+        return float(duration)
+    h, mi, s = [float(v) if v else 0.0 for v in m.groups()]
+    return h * 3600 + mi * 60 + s
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Converts the MS2 scans of an mzXML to MGF.')
+    parser.add_argument('mzxml')
+    parser.add_argument('mgf')
+    parser.add_argument('--procs', type=int, default=1, help='processes converting scan ranges')
+    parser.add_argument('--cache', help='directory of converted files, mgf is a link to the one of mzxml')
+    args = parser.parse_args(argv)
+    if args.cache:
+        mgf = cached_mzxml_to_mgf(args.mzxml, args.cache, args.procs)
+        if os.path.lexists(args.mgf):
+            os.remove(args.mgf)
+        os.symlink(mgf, args.mgf)
+    else:
+        mzxml_to_mgf(args.mzxml, args.mgf, args.procs)
+    return 0
+
+
+if __name__ == "__main__":
+    # the chunk function is pickled by its importable name
+    from searchcake.utils.mzxml2mgf import main
+    sys.exit(main(sys.argv[1:]))
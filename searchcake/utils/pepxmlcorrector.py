@@ -1,10 +1,54 @@
 #!/usr/bin/env python
 import os
 import re
+import time
 
 from applicake2.base.app import BasicApp
 from applicake2.base.coreutils.arguments import Argument
 from applicake2.base.coreutils.keys import Keys, KeyHelp
+from searchcake.utils.pepxmlstream import rewrite_pepxml
+
+# all fixes in one pass: 1) spectrum_query scan padding, 1b) spectrumNativeID, 2) msms_run_summary base_name
+_FIXES = re.compile(br'(?P<sq><spectrum_query spectrum=")(?P<base>[^"]*)\.(?P<start>\d+)\.(?P<end>\d+)\.(?P<charge>\d+)"'
+                    br'|(?P<nativeid>spectrumNativeID="[^"]*")'
+                    br'|(?P<summary><msms_run_summary base_name="[^"]*\.pep\.xml[^>]*>)')
+
+
+class PepXMLFixer(object):
+    """
+    Filter for pepxmlstream.rewrite_pepxml applying the PepXMLCorrector fixes to blocks of lines
+    and counting them.
+    """
+
+    def __init__(self, mzxmlbase):
+        self.mzxmlbase = mzxmlbase.encode('utf-8') if not isinstance(mzxmlbase, bytes) else mzxmlbase
+        self.spectra = 0
+        self.padded = 0
+        self.nativeids = 0
+        self.summaries = 0
+
+    def __call__(self, block):
+        self.spectra += block.count(b'<spectrum_query')
+        return _FIXES.sub(self._fix, block)
+
+    def _fix(self, m):
+        if m.group('sq'):
+            if len(m.group('start')) >= 5:
+                return m.group(0)
+            self.padded += 1
+            return b'%s%s.%05d.%05d.%s"' % (m.group('sq'), m.group('base'), int(m.group('start')),
+                                            int(m.group('end')), m.group('charge'))
+        if m.group('nativeid'):
+            self.nativeids += 1
+            return b''
+        self.summaries += 1
+        return b'<msms_run_summary base_name="' + self.mzxmlbase + b'" raw_data_type="" raw_data=".mzXML">'
+
+    def merge(self, other):
+        self.spectra += other.spectra
+        self.padded += other.padded
+        self.nativeids += other.nativeids
+        self.summaries += other.summaries
 
 
 class PepXMLCorrector(BasicApp):
@@ -13,6 +57,7 @@ class PepXMLCorrector(BasicApp):
             Argument(Keys.MZXML, KeyHelp.MZXML),
             Argument(Keys.WORKDIR, KeyHelp.WORKDIR),
             Argument(Keys.PEPXML, KeyHelp.PEPXML),
+            Argument(Keys.THREADS, 'Number of processes correcting chunks of big files', default=1),
         ]
 
     def run(self, log, info):
@@ -21,7 +66,7 @@ class PepXMLCorrector(BasicApp):
 
         1) <spectrum_query spectrum=...>: different padding in scan numbers leads to mismatches in iProphet (CHLUDWIG_M1107_001.00650.00650.2 wont match CHLUDWIG_M1107_001.650.650.2)
         Tandem: Tandem2XML makes tags with 00000-Padding (00650, 123456)
-        Omssa: MzXML2Search makes tags with 00000-Padding (00650, 123456) 
+        Omssa: MzXML2Search makes tags with 00000-Padding (00650, 123456)
         Myrimatch: No padding (650, 123456)
         Fix: Add Padding for myrimatch
 
@@ -29,7 +74,7 @@ class PepXMLCorrector(BasicApp):
         Tandem2xml: /dspath/DSID OK
         Omssa: /temppath/DSID.pep.xml ERROR
         Myrimatch: DSID OK
-        Fix: Remove .pep.xml for Omssa        
+        Fix: Remove .pep.xml for Omssa
         """
         pepxmlin = info[Keys.PEPXML]
         pepxmlout = os.path.join(info[Keys.WORKDIR], 'corrected.pep.xml')
@@ -37,39 +82,16 @@ class PepXMLCorrector(BasicApp):
         mzxmlbase = os.path.splitext(os.path.basename(mzxml))[0]
 
         log.info("correcting pepxml")
-        fout = open(pepxmlout, 'w')
-        sq = 0
-        sn = 0
-        for line in open(pepxmlin).readlines():
-            #fix 1)
-            if '<spectrum_query spectrum="' in line:
-                spectrum = self._getValue(line, 'spectrum')
-                (basename, start_scan, end_scan, assumed_charge) = spectrum.split('.')
-                if len(start_scan) < 5:
-                    spectrum_mod = "%s.%05d.%05d.%s" % (basename, int(start_scan), int(end_scan), assumed_charge)
-                    line = line.replace(spectrum, spectrum_mod)
-                    sq += 1
-                if 'spectrumNativeID' in line:
-                    line = re.sub('spectrumNativeID="[^"]*"', '', line)
-                    sn += 1
-            #fix 2)            
-            elif '<msms_run_summary base_name' in line and ".pep.xml" in line:
-                spaces = line[:line.find('<')]
-                line = spaces + '<msms_run_summary base_name="%s" raw_data_type="" raw_data=".mzXML">\n' % mzxmlbase
-                log.debug('modified msms_run_summary (fixes omssa for IDFileConverter)')
-
-            fout.write(line)
+        start = time.time()
+        fixer = PepXMLFixer(mzxmlbase)
+        rewrite_pepxml(pepxmlin, [fixer], outfile=pepxmlout, nrprocs=int(info.get(Keys.THREADS) or 1))
+        elapsed = max(time.time() - start, 1e-6)
+        nrbytes = os.path.getsize(pepxmlin)
 
-        fout.close()
-        if sq != 0: log.debug('modified spectrum_query %s times (fixes myrimatch for iprophet)' % sq)
-        if sn != 0: log.debug('modified spectrumNativeID %s times (fixes myrimatch for xinteract 4.7.0)' % sn)
+        if fixer.padded != 0: log.debug('modified spectrum_query %s times (fixes myrimatch for iprophet)' % fixer.padded)
+        if fixer.nativeids != 0: log.debug('modified spectrumNativeID %s times (fixes myrimatch for xinteract 4.7.0)' % fixer.nativeids)
+        if fixer.summaries != 0: log.debug('modified msms_run_summary (fixes omssa for IDFileConverter)')
+        log.info('corrected %d spectra, %.1f MB in %.1f s (%.0f spectra/s, %.1f MB/s)' % (
+            fixer.spectra, nrbytes / 1e6, elapsed, fixer.spectra / elapsed, nrbytes / 1e6 / elapsed))
         info[Keys.PEPXML] = pepxmlout
         return info
-
-
-    def _getValue(self, line, attribute):
-        """Get the value of an attribute from the XML element contained in 'line'"""
-        pos0 = line.index(attribute + '="')
-        pos1 = line.index('"', pos0) + 1
-        pos2 = line.index('"', pos1)
-        return line[pos1:pos2]
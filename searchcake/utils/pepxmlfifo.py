@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Streams a pepXML through fixup filters into a named pipe, so that the reading tool (e.g.
+InteractParser) gets the fixed file without it ever being written to disk.
+
+usage: python -m searchcake.utils.pepxmlfifo FILTERS SOURCE FIFO
+
+FILTERS is a comma separated list of filter names of pepxmlstream.FILTERS, or
+'correct=<mzxml base name>' for the PepXMLCorrector fixes.
+"""
+import errno
+import fcntl
+import os
+import sys
+import time
+
+from searchcake.utils.pepxmlstream import FILTERS, filter_stream
+
+# seconds to wait for the reader to open the pipe
+open_timeout = 300
+
+
+def make_fifo(path):
+    if os.path.exists(path):
+        os.remove(path)
+    os.mkfifo(path)
+    return path
+
+
+def parse_filters(spec):
+    filters = []
+    for name in [s for s in spec.split(',') if s]:
+        if name.startswith('correct='):
+            from searchcake.utils.pepxmlcorrector import PepXMLFixer
+            filters.append(PepXMLFixer(name.split('=', 1)[1]))
+        elif name in FILTERS:
+            filters.append(FILTERS[name])
+        else:
+            raise RuntimeError("Unknown pepxml filter %s" % name)
+    return filters
+
+
+def fifo_command(spec, source, fifo, reader):
+    """
+    Shell command running the filter into fifo in background and reader, which has to read
+    fifo, in foreground. Exits with the exit code of the reader, or of the filter if only that
+    failed. A filter left behind by a failed reader is killed, not waited for.
+    """
+    return '({python} -m searchcake.utils.pepxmlfifo {spec} {source} {fifo} & fpid=$!; {reader}; rc=$?; ' \
+           'if [ $rc -eq 0 ]; then wait $fpid || rc=$?; else kill $fpid 2>/dev/null; wait $fpid; fi; ' \
+           'exit $rc)'.format(python=sys.executable, spec=spec, source=source, fifo=fifo, reader=reader)
+
+
+def open_writer(path, timeout=None):
+    """
+    Opens the write end of a fifo without blocking forever on a reader which never comes.
+
+    :raise IOError: if no reader opened the fifo within timeout seconds (open_timeout)
+    """
+    deadline = time.time() + (open_timeout if timeout is None else timeout)
+    while True:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            # ENXIO: no reader yet
+            if e.errno != errno.ENXIO:
+                raise
+            if time.time() > deadline:
+                raise IOError(errno.ETIMEDOUT, "no reader opened %s" % path)
+            time.sleep(0.1)
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+    return os.fdopen(fd, 'wb')
+
+
+def main(argv):
+    if len(argv) != 3:
+        sys.stderr.write(__doc__)
+        return 2
+    # open the pipe first (waits for the reader to open it), so that the reader gets an end of
+    # file and does not hang, whatever goes wrong later
+    try:
+        fout = open_writer(argv[2])
+    except IOError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    with fout:
+        try:
+            with open(argv[1], 'rb') as fin:
+                filter_stream(fin, fout, parse_filters(argv[0]))
+        except IOError as e:
+            if e.errno != errno.EPIPE:
+                raise
+            sys.stderr.write("reader closed %s early\n" % argv[2])
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+import csv
+import re
+
+import numpy
+
+ERROR_COLUMNS = ['min_prob', 'error', 'num_incorr', 'num_corr']
+
+_ROC_ERROR_DATA = re.compile(br'<roc_error_data\b.*?</roc_error_data>', re.S)
+_ERROR_POINT = re.compile(br'<error_point\s([^>]*?)/?>')
+_ATTR = re.compile(br'(\w+)="([^"]*)"')
+
+
+def parse_error_points(header):
+    """
+    Returns the error points of the first roc_error_data table in header (bytes of a pepXML up to
+    the first spectrum_query) as list of dicts of ERROR_COLUMNS -> attribute strings, as written.
+    """
+    m = _ROC_ERROR_DATA.search(header)
+    points = [dict(_ATTR.findall(p)) for p in _ERROR_POINT.findall(m.group(0))] if m else []
+    return [dict((c, p.get(c.encode('ascii'))) for c in ERROR_COLUMNS) for p in points]
+
+
+def read_error_points(path, blocksize=256 * 1024):
+    """
+    Returns the error points (see parse_error_points) of a pepXML. Only the analysis_summary
+    header is read, up to the end of the table or the first spectrum_query.
+    """
+    header = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            header += block
+            if b'</roc_error_data>' in header or b'<spectrum_query' in header:
+                break
+    return parse_error_points(header)
+
+
+def read_error_table(path):
+    """
+    Returns the first roc_error_data table (iProphet / PeptideProphet error points) of a pepXML
+    as dict of ERROR_COLUMNS -> numpy arrays, in file order.
+    """
+    points = read_error_points(path)
+    return dict((c, numpy.array([float(p[c]) if p[c] is not None else numpy.nan for p in points], dtype=float))
+                for c in ERROR_COLUMNS)
+
+
+def write_error_table(path, outfile, header=None):
+    """
+    Writes the error table of a pepXML as tab separated file, values as in the pepXML.
+
+    :param header: bytes of the pepXML before the first spectrum_query if already read (see
+     pepxmlparallel.read_header), else the header is read from path
+    """
+    points = parse_error_points(header) if header is not None else read_error_points(path)
+    with open(outfile, 'wb') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator="\n")
+        if points:
+            writer.writerow(ERROR_COLUMNS)
+        for p in points:
+            writer.writerow([p[c] for c in ERROR_COLUMNS])
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+import os
+import re
+
+_INDEX = re.compile(r'(<spectrum_query\s[^>]*?\bindex=")(\d+)(")')
+
+
+def merge_pepxml(shards, outfile, log=None):
+    """
+    Merges pepXMLs of scan range shards of one search into a single pepXML.
+
+    Header and tail are taken from the first shard, with the shard base name replaced by the one
+    of outfile. The spectrum_query elements of all shards are appended in shard order and
+    renumbered. Works line by line, so memory use does not depend on the file sizes.
+
+    :param shards: list of shard pepXMLs, ordered by scan range
+    :param outfile: merged pepXML, should end with .pep.xml
+    :return: number of spectrum queries written
+    """
+    shards = [s for s in shards if os.path.exists(s)]
+    if not shards:
+        raise RuntimeError("No shard pepXML found to merge into %s" % outfile)
+
+    base = _strip_pepxml_ext(outfile)
+    index = [0]
+
+    def renumber(m):
+        index[0] += 1
+        return m.group(1) + str(index[0]) + m.group(3)
+
+    tail = []
+    with open(outfile, 'w') as fout:
+        for nr, shard in enumerate(shards):
+            shard_base = _strip_pepxml_ext(shard)
+            shard_leaf, leaf = os.path.basename(shard_base), os.path.basename(base)
+            in_header = True
+            in_tail = False
+            for line in open(shard):
+                if in_tail:
+                    if nr == 0:
+                        tail.append(line)
+                    continue
+                if '</msms_run_summary>' in line:
+                    in_tail = True
+                    if nr == 0:
+                        tail.append(line)
+                    continue
+                if in_header and '<spectrum_query' in line:
+                    in_header = False
+                if in_header:
+                    if nr == 0:
+                        fout.write(line.replace(shard_base, base).replace(shard_leaf, leaf))
+                    continue
+                if shard_leaf in line:
+                    line = line.replace(shard_leaf, leaf)
+                if '<spectrum_query' in line:
+                    line = _INDEX.sub(renumber, line, 1)
+                fout.write(line)
+        fout.writelines(tail)
+
+    if log:
+        log.debug('merged %s spectrum queries of %s shards into %s' % (index[0], len(shards), outfile))
+    return index[0]
+
+
+def _strip_pepxml_ext(path):
+    for ext in ['.pep.xml', '.pepXML']:
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return os.path.splitext(path)[0]
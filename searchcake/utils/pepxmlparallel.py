@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+import mmap
+import os
+import re
+
+from lxml import etree
+
+from searchcake.utils import processes
+from searchcake.utils.pepxmlpsm import iter_queries
+
+_START = b'<spectrum_query'
+_END = b'</spectrum_query>'
+_XMLNS = re.compile(br'xmlns="([^"]*)"')
+_parser = etree.XMLParser(huge_tree=True)
+
+# file bytes per range handed to one worker
+rangesize = 64 * 1024 * 1024
+
+
+def query_ranges(path, nr_ranges):
+    """
+    Splits a pepXML into at most nr_ranges byte ranges which all start at a <spectrum_query tag.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            starts = []
+            for i in range(nr_ranges):
+                pos = mm.find(_START, i * size // nr_ranges)
+                if pos == -1:
+                    break
+                if not starts or pos > starts[-1]:
+                    starts.append(pos)
+        finally:
+            mm.close()
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def read_header(path, blocksize=1024 * 1024):
+    """
+    Returns the bytes of a pepXML before the first <spectrum_query tag (the analysis summaries
+    and run headers), reading no further than that.
+    """
+    header = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                return header
+            # a tag cut at the block border is found in the next round
+            searched = max(0, len(header) - len(_START))
+            header += block
+            pos = header.find(_START, searched)
+            if pos != -1:
+                return header[:pos]
+
+
+def iter_parallel(path, func, nrprocs=1, ordered=True):
+    """
+    Applies func to every spectrum_query element of a pepXML, parsing byte ranges of the
+    memory mapped file in nrprocs processes (see utils.processes). A single process streams the
+    file instead (see pepxmlpsm.iter_queries).
+
+    :param func: picklable (module level) function taking the spectrum_query element, results
+     which are None are dropped
+    :param ordered: yield results in file order, otherwise as ranges complete
+    """
+    nrprocs = max(1, int(nrprocs))
+    if nrprocs == 1:
+        for result in iter_queries(path, func):
+            yield result
+        return
+    # a process per range, ranges of big files no larger than rangesize
+    nr_ranges = max(nrprocs, os.path.getsize(path) // rangesize + 1)
+    tasks = [(path, start, end, func) for start, end in query_ranges(path, nr_ranges)]
+    for chunk in processes.imap(_parse_range, tasks, nrprocs, ordered):
+        for result in chunk:
+            yield result
+
+
+def map_parallel(path, func, nrprocs=1):
+    """
+    Like iter_parallel, but returns all results merged into one list in file order.
+    """
+    return list(iter_parallel(path, func, nrprocs))
+
+
+def _parse_range(args):
+    path, start, end, func = args
+    results = []
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            m = _XMLNS.search(mm[:min(len(mm), 65536)])
+            head = b'<r xmlns="' + m.group(1) + b'">' if m else b'<r>'
+            pos = start
+            while True:
+                s = mm.find(_START, pos, end)
+                if s == -1:
+                    break
+                e = mm.find(_END, s)
+                if e == -1:
+                    raise RuntimeError("Unterminated spectrum_query at byte %d of %s" % (s, path))
+                pos = e + len(_END)
+                result = func(etree.fromstring(head + mm[s:pos] + b'</r>', _parser)[0])
+                if result is not None:
+                    results.append(result)
+        finally:
+            mm.close()
+    return results
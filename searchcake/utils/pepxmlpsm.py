@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+from lxml import etree
+
+# columns of the PSM table written from iProphet results, in the order of the table pyteomics wrote
+PSM_COLUMNS = ['modified_peptide', 'iprophet_probability', 'nrproteins', 'nrhit', 'assumed_charge', 'spectrum',
+               'search_hit', 'retention_time_sec', 'protein_id']
+
+
+def psm_from_spectrum_query(sq, decoy='DECOY'):
+    """
+    Reads the PSM_COLUMNS of the top hit of a spectrum_query element.
+
+    :return: list of values, None if there is no hit or the top hit is a decoy
+    """
+    ns = sq.tag[:-len('spectrum_query')]
+    search_result = sq.find(ns + 'search_result')
+    if search_result is None:
+        return None
+    hits = search_result.findall(ns + 'search_hit')
+    if not hits:
+        return None
+    hit = hits[0]
+    protein = hit.get('protein')
+    if decoy in protein:
+        return None
+
+    modified_peptide = hit.get('peptide')
+    modification_info = hit.find(ns + 'modification_info')
+    if modification_info is not None:
+        modified_peptide = modification_info.get('modified_peptide', modified_peptide)
+
+    probability = None
+    for analysis_result in hit.iterfind(ns + 'analysis_result'):
+        if analysis_result.get('analysis') == 'interprophet':
+            probability = analysis_result.find(ns + 'interprophet_result').get('probability')
+            break
+
+    # a number as pyteomics read it (1234.50 -> 1234.5)
+    retention_time = sq.get('retention_time_sec')
+    return [modified_peptide, probability, 1 + len(hit.findall(ns + 'alternative_protein')), len(hits),
+            sq.get('assumed_charge'), sq.get('spectrum'), hit.get('peptide'),
+            float(retention_time) if retention_time is not None else None, protein]
+
+
+def iter_queries(path, func):
+    """
+    Streams func(spectrum_query element) of a pepXML, results which are None are dropped. Parsed
+    elements are dropped right away, so memory use stays flat for any file size.
+    """
+    for _, sq in etree.iterparse(path, events=('end',), tag='{*}spectrum_query', huge_tree=True):
+        result = func(sq)
+        sq.clear()
+        parent = sq.getparent()
+        while sq.getprevious() is not None:
+            del parent[0]
+        if result is not None:
+            yield result
+
+
+def iter_iprophet_psms(path, decoy='DECOY'):
+    """
+    Streams the target PSMs (see psm_from_spectrum_query) of an iProphet pepXML.
+    """
+    return iter_queries(path, lambda sq: psm_from_spectrum_query(sq, decoy))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+import csv
+from functools import partial
+
+from searchcake.utils.pepxmlheader import write_error_table
+from searchcake.utils.pepxmlparallel import iter_parallel, read_header
+from searchcake.utils.pepxmlpsm import PSM_COLUMNS, psm_from_spectrum_query
+
+
+class PepXMLSink(object):
+    """
+    Output of a single pass over a pepXML (see run_sinks).
+    """
+
+    #: picklable function spectrum_query element -> value given to write(), None values are skipped.
+    #: Sinks without extract only see the header.
+    extract = None
+
+    def start(self, path, header):
+        """
+        :param header: bytes of the pepXML before the first spectrum_query
+        """
+        pass
+
+    def write(self, value):
+        pass
+
+    def close(self):
+        pass
+
+
+class PsmTsvSink(PepXMLSink):
+    """
+    Table of the target top hits with iProphet probability (see pepxmlpsm.PSM_COLUMNS).
+    """
+    extract = staticmethod(psm_from_spectrum_query)
+
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.nr_rows = 0
+
+    def start(self, path, header):
+        self.f = open(self.outfile, 'wb')
+        self.writer = csv.writer(self.f, delimiter='\t')
+        self.writer.writerow(PSM_COLUMNS)
+
+    def write(self, value):
+        self.writer.writerow(value)
+        self.nr_rows += 1
+
+    def close(self):
+        self.f.close()
+
+
+class ErrorTableSink(PepXMLSink):
+    """
+    The first roc_error_data table (error_point elements) of the analysis summaries.
+    """
+
+    def __init__(self, outfile):
+        self.outfile = outfile
+
+    def start(self, path, header):
+        write_error_table(path, self.outfile, header)
+
+
+def run_sinks(path, sinks, nrprocs=1):
+    """
+    Feeds all sinks from one read of the pepXML: the header once, then the extracted values of
+    every spectrum_query (parsed in nrprocs processes, in file order).
+    """
+    header = read_header(path)
+    for sink in sinks:
+        sink.start(path, header)
+
+    psm_sinks = [sink for sink in sinks if sink.extract is not None]
+    if psm_sinks:
+        extract = partial(_extract_all, tuple(sink.extract for sink in psm_sinks))
+        for values in iter_parallel(path, extract, nrprocs):
+            for sink, value in zip(psm_sinks, values):
+                if value is not None:
+                    sink.write(value)
+
+    for sink in sinks:
+        sink.close()
+
+
+def _extract_all(extractors, sq):
+    values = [f(sq) for f in extractors]
+    return values if any(v is not None for v in values) else None
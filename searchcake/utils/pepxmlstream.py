@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+import gzip
+import mmap
+import os
+import re
+import shutil
+
+from searchcake.utils import processes
+
+blocksize = 8 * 1024 * 1024
+
+_NATIVE_ID = re.compile(br'spectrumNativeID="[^"]*"')
+
+
+def strip_native_id(block):
+    """
+    Removes spectrumNativeID attributes (Myrimatch output breaks xinteract 4.7.0)
+    https://groups.google.com/forum/#!topic/spctools-discuss/dV8LSaE60ao
+    """
+    return _NATIVE_ID.sub(b'', block)
+
+
+# filters by name, for use in configuration and on the command line
+FILTERS = {
+    'strip_native_id': strip_native_id,
+}
+
+
+def iter_blocks(fin, size=blocksize):
+    """
+    Reads a file in large blocks which always end at a line end, so line based substitutions
+    never see a line cut in two.
+    """
+    rest = b''
+    while True:
+        block = fin.read(size)
+        if not block:
+            break
+        block = rest + block
+        cut = block.rfind(b'\n') + 1
+        if cut == 0:
+            rest = block
+            continue
+        rest = block[cut:]
+        yield block[:cut]
+    if rest:
+        yield rest
+
+
+def filter_stream(fin, fout, filters, size=blocksize):
+    """
+    Copies fin to fout applying each filter (bytes -> bytes) to every block.
+
+    :return: number of bytes read
+    """
+    nrbytes = 0
+    for block in iter_blocks(fin, size):
+        nrbytes += len(block)
+        for f in filters:
+            block = f(block)
+        fout.write(block)
+    return nrbytes
+
+
+def rewrite_pepxml(infile, filters, outfile=None, gzip_out=False, size=blocksize, nrprocs=1):
+    """
+    Streams a pepXML through filters with constant memory.
+
+    Without outfile the file is rewritten in place: the output goes to a temporary file in the
+    same directory which then replaces the input, so no copy stays behind.
+
+    With nrprocs > 1 large files are cut at line ends into chunks which are filtered in parallel
+    processes (see utils.processes) and concatenated. Filters then have to be picklable; filter objects with a merge
+    method get the filters of every chunk merged back (e.g. to sum up counters).
+
+    :param filters: list of functions bytes -> bytes working on blocks of whole lines
+    :param gzip_out: write gzip compressed output, '.gz' is appended to the output name
+    :return: path of the written file
+    """
+    target = outfile or infile
+    if gzip_out:
+        target += '.gz'
+    tmp = target + '.tmp%d' % os.getpid()
+
+    chunks = _line_chunks(infile, nrprocs) if nrprocs > 1 else []
+    fout = gzip.open(tmp, 'wb', 6) if gzip_out else open(tmp, 'wb', size)
+    try:
+        if len(chunks) > 1:
+            tasks = [(infile, start, end, filters, '%s.part%d' % (tmp, i), size)
+                     for i, (start, end) in enumerate(chunks)]
+            chunk_filters = list(processes.imap(_filter_chunk, tasks, min(nrprocs, len(tasks))))
+            for task, done in zip(tasks, chunk_filters):
+                with open(task[4], 'rb') as part:
+                    shutil.copyfileobj(part, fout, size)
+                os.remove(task[4])
+                for f, chunk_f in zip(filters, done):
+                    if hasattr(f, 'merge'):
+                        f.merge(chunk_f)
+        else:
+            with open(infile, 'rb') as fin:
+                filter_stream(fin, fout, filters, size)
+    finally:
+        fout.close()
+
+    os.rename(tmp, target)
+    if outfile is None and gzip_out:
+        os.remove(infile)
+    return target
+
+
+# smallest chunk worth a process of its own
+chunksize = 256 * 1024 * 1024
+
+
+def _line_chunks(path, nrprocs):
+    size = os.path.getsize(path)
+    nr = max(1, min(int(nrprocs), size // chunksize))
+    if nr == 1:
+        return [(0, size)]
+    cuts = [0]
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for i in range(1, nr):
+                pos = mm.find(b'\n', i * size // nr) + 1
+                if pos > cuts[-1]:
+                    cuts.append(pos)
+        finally:
+            mm.close()
+    cuts = [c for c in cuts if c < size] + [size]
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def _filter_chunk(args):
+    path, start, end, filters, out, size = args
+    with open(path, 'rb') as fin, open(out, 'wb', size) as fout:
+        fin.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = fin.read(min(size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            # complete the last line of the block
+            if not block.endswith(b'\n') and remaining > 0:
+                rest = fin.readline()[:remaining]
+                remaining -= len(rest)
+                block += rest
+            for f in filters:
+                block = f(block)
+            fout.write(block)
+    return filters
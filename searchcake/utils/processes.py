@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Parallel map over processes which also works in the task processes of ruffus: pipeline_run
+(multiprocess=N) runs the tasks in the daemonic workers of a multiprocessing pool, and daemonic
+processes may not start children with multiprocessing. Every task runs in an interpreter started
+with subprocess instead, function and arguments go there and the result comes back pickled in files.
+
+usage (by imap only): python -m searchcake.utils.processes TASKFILE RESULTFILE
+"""
+import cPickle
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# seconds between checks of running processes
+poll = 0.05
+
+
+def python_env():
+    """
+    Environment of python subprocesses importing the modules this process imports.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p or os.getcwd() for p in sys.path)
+    return env
+
+
+def imap(func, tasks, nrprocs=1, ordered=True):
+    """
+    Yields func(task) for every task, computed in up to nrprocs processes, in this process if 1.
+
+    :param func: picklable (module level) function, tasks and results have to be picklable too
+    :param ordered: yield results in the order of tasks, otherwise as they complete
+    :raise RuntimeError: if a process fails, its traceback is on stderr
+    """
+    tasks = list(tasks)
+    if nrprocs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix='searchcake-procs')
+    env = python_env()
+    todo, running, done, next_result = range(len(tasks)), {}, {}, 0
+    try:
+        while todo or running or done:
+            while todo and len(running) < nrprocs:
+                i = todo.pop(0)
+                with open(os.path.join(tmpdir, '%d.task' % i), 'wb') as f:
+                    cPickle.dump((func, tasks[i]), f, cPickle.HIGHEST_PROTOCOL)
+                running[i] = subprocess.Popen([sys.executable, '-m', 'searchcake.utils.processes',
+                                               os.path.join(tmpdir, '%d.task' % i),
+                                               os.path.join(tmpdir, '%d.result' % i)], env=env)
+            for i, process in running.items():
+                if process.poll() is None:
+                    continue
+                del running[i]
+                if process.returncode:
+                    raise RuntimeError('%s of task %d failed with exit code %d' % (
+                        func.__name__ if hasattr(func, '__name__') else func, i, process.returncode))
+                with open(os.path.join(tmpdir, '%d.result' % i), 'rb') as f:
+                    done[i] = cPickle.load(f)
+                os.remove(os.path.join(tmpdir, '%d.result' % i))
+            if ordered:
+                while next_result in done:
+                    yield done.pop(next_result)
+                    next_result += 1
+            else:
+                for i in done.keys():
+                    yield done.pop(i)
+            if running:
+                time.sleep(poll)
+    finally:
+        for process in running.values():
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def main(argv):
+    with open(argv[0], 'rb') as f:
+        func, task = cPickle.load(f)
+    result = func(task)
+    with open(argv[1] + '.tmp', 'wb') as f:
+        cPickle.dump(result, f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(argv[1] + '.tmp', argv[1])
+    return 0
+
+
+if __name__ == "__main__":
+    # functions of this module are pickled by their importable name
+    from searchcake.utils.processes import main
+    sys.exit(main(sys.argv[1:]))
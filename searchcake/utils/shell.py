@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+import subprocess
+import tempfile
+
+
+def run_commands_parallel(log, commands):
+    """
+    Runs shell commands concurrently and waits for all of them.
+
+    :param commands: list of shell command strings
+    :return: exit code (first non zero one, else 0), concatenated output of all commands in the
+     order they were given
+    """
+    procs = []
+    for cmd in commands:
+        log.debug("command is [%s]" % cmd)
+        # output to temporary files, reading pipes of several processes can deadlock
+        out = tempfile.TemporaryFile()
+        procs.append((subprocess.Popen(cmd, shell=True, stdout=out, stderr=subprocess.STDOUT), out))
+
+    exit_code = 0
+    stdout = ""
+    for p, out in procs:
+        code = p.wait()
+        if code != 0 and exit_code == 0:
+            exit_code = code
+        out.seek(0)
+        stdout += out.read().decode('utf-8', 'replace')
+        out.close()
+    return exit_code, stdout
@@ -10,6 +10,7 @@ setup(
     description="tpp search workflow with peptideprophet and proteinprophet staring from mzXML files",
     license="BSD",
     packages=find_packages(),
+    package_data={'searchcake.searchengines': ['unimod_masses.tsv']},
     url='https://github.com/applicake-tools/searchcake',
     install_requires=['Unimod', 'applicake2', 'pyteomics', 'ruffus', 'configobj']
 )
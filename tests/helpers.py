@@ -0,0 +1,78 @@
+"""
+Small input files for the tests.
+"""
+import base64
+import os
+import struct
+
+
+def write_mzxml(path, scans, indexed=True):
+    """
+    Writes an mzXML with the given scans.
+
+    :param scans: list of dicts num, msLevel, peaks ((mz, intensity), ...) and for MS2 precursorMz,
+     optional charge and retentionTime (seconds)
+    """
+    parts = ['<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+             '<mzXML xmlns="http://sashimi.sourceforge.net/schema_revision/mzXML_3.2">\n'
+             ' <msRun scanCount="%d">\n' % len(scans)]
+    offsets = []
+    for scan in scans:
+        offsets.append((scan['num'], len(''.join(parts)) + 2))
+        peaks = base64.b64encode(struct.pack('>%df' % (2 * len(scan['peaks'])),
+                                             *[v for peak in scan['peaks'] for v in peak]))
+        attrs = 'num="%d" msLevel="%d" peaksCount="%d"' % (scan['num'], scan['msLevel'], len(scan['peaks']))
+        if 'retentionTime' in scan:
+            attrs += ' retentionTime="PT%gS"' % scan['retentionTime']
+        lines = ['  <scan %s>\n' % attrs]
+        if scan['msLevel'] > 1:
+            charge = ' precursorCharge="%d"' % scan['charge'] if scan.get('charge') else ''
+            lines.append('   <precursorMz precursorIntensity="1000"%s>%s</precursorMz>\n' % (
+                charge, scan['precursorMz']))
+        lines.append('   <peaks precision="32" byteOrder="network" pairOrder="m/z-int">%s</peaks>\n' % peaks)
+        lines.append('  </scan>\n')
+        parts.append(''.join(lines))
+    parts.append(' </msRun>\n')
+    if indexed:
+        index_offset = len(''.join(parts))
+        parts.append(' <index name="scan">\n')
+        parts.extend('  <offset id="%d">%d</offset>\n' % o for o in offsets)
+        parts.append(' </index>\n <indexOffset>%d</indexOffset>\n' % index_offset)
+    parts.append('</mzXML>\n')
+    with open(path, 'wb') as f:
+        f.write(''.join(parts))
+
+
+def ms2(num, precursor, peaks, charge=None, rt=None):
+    scan = {'num': num, 'msLevel': 2, 'precursorMz': precursor, 'peaks': peaks}
+    if charge:
+        scan['charge'] = charge
+    if rt is not None:
+        scan['retentionTime'] = rt
+    return scan
+
+
+def ms1(num, peaks=((400.0, 10.0),)):
+    return {'num': num, 'msLevel': 1, 'peaks': peaks}
+
+
+def write_pepxml(path, base, queries, analysis=''):
+    """
+    Writes a pepXML of one msms_run_summary with a spectrum_query per (scan, charge) of queries.
+    """
+    with open(path, 'wb') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<msms_pipeline_analysis xmlns="http://regis-web.systemsbiology.net/pepXML">\n'
+                '%s'
+                '<msms_run_summary base_name="%s" raw_data=".mzXML">\n'
+                '<search_summary base_name="%s" search_engine="Comet">\n'
+                '</search_summary>\n' % (analysis, base, base))
+        for i, (scan, charge) in enumerate(queries):
+            f.write('<spectrum_query spectrum="%s.%d.%d.%d" start_scan="%d" end_scan="%d" '
+                    'assumed_charge="%d" index="%d">\n'
+                    '<search_result>\n'
+                    '<search_hit hit_rank="1" peptide="PEPTIDE%d" protein="P%d"/>\n'
+                    '</search_result>\n'
+                    '</spectrum_query>\n' % (os.path.basename(base), scan, scan, charge, scan, scan, charge, i + 1,
+                                             scan, scan))
+        f.write('</msms_run_summary>\n</msms_pipeline_analysis>\n')
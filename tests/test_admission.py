@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import ms2, write_mzxml
+from searchcake.flow import admission
+from searchcake.flow.admission import search_slot
+from searchcake.flow.scheduler import CoreScheduler, cores
+from searchcake.flow.statestore import StateStore, run_flow_task
+
+
+class SearchSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saved = dict(os.environ)
+        for name in [n for n in os.environ if n.startswith('SEARCHCAKE_')]:
+            del os.environ[name]
+        os.environ.update({'SEARCHCAKE_LEDGER': os.path.join(self.tmp, 'cores.ledger'),
+                           'SEARCHCAKE_MEMORY_HISTORY': os.path.join(self.tmp, 'history.json'),
+                           'SEARCHCAKE_CORES': '16', 'SEARCHCAKE_MEMORY_BUDGET': '100'})
+        mzxml = os.path.join(self.tmp, 'run.mzXML')
+        write_mzxml(mzxml, [ms2(i, 500.0, [(100.0, 1.0)]) for i in range(1, 4)])
+        fasta = os.path.join(self.tmp, 'db.fasta')
+        open(fasta, 'w').write('>P1\nPEPTIDE\n>P2\nPEPTIDEK\n')
+        self.ini = os.path.join(self.tmp, 'split.ini_0')
+        open(self.ini, 'w').write('MZXML = %s\nDBASE = %s\n' % (mzxml, fasta))
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved)
+        shutil.rmtree(self.tmp)
+
+    def _granted(self):
+        return CoreScheduler().update(lambda state: dict(state['granted']))
+
+    def test_local_search_gets_at_least_its_share(self):
+        with search_slot('Comet', self.ini) as threads:
+            self.assertEqual(threads, 16)
+            self.assertEqual(self._granted().values(), [16])
+        self.assertEqual(self._granted(), {})
+        with search_slot('Comet', self.ini, want=2) as threads:
+            self.assertEqual(threads, 2)
+
+    def test_split_infos_are_read_from_the_state_store(self):
+        os.environ['SEARCHCAKE_STATE'] = os.path.join(self.tmp, 'state.db')
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        try:
+            mzxml = os.path.join(self.tmp, 'run.mzXML')
+            StateStore().put('input.ini', {'MZXML': [mzxml, mzxml], 'DBASE': os.path.join(self.tmp, 'db.fasta')})
+            run_flow_task(StateStore(), {'INPUT': 'input.ini', 'SPLIT': 'split.ini', 'SPLIT_KEY': 'MZXML'})
+            # ruffus globs for the parts of a split, they are empty files
+            self.assertEqual(open('split.ini_1').read(), '')
+            with search_slot('Comet', 'split.ini_1', want=2) as threads:
+                self.assertEqual(threads, 2)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(self._granted(), {})
+
+    def test_residues_are_counted(self):
+        self.assertEqual(admission.MemoryHistory().residues(os.path.join(self.tmp, 'db.fasta')), 15)
+
+    def test_dispatched_search_is_neither_admitted_nor_recorded(self):
+        os.environ['SEARCHCAKE_EXECUTOR'] = os.path.join(self.tmp, 'queue')
+        old = admission.min_record_seconds
+        admission.min_record_seconds = 0
+        try:
+            with search_slot('Comet', self.ini + '.missing', want=4) as threads:
+                self.assertEqual(threads, 4)
+            with cores(1) as threads:
+                self.assertEqual(threads, 1)
+        finally:
+            admission.min_record_seconds = old
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['db.fasta', 'run.mzXML', 'split.ini_0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from searchcake.flow.batch import run_batch
+
+
+def _sample(result):
+    open('sample.txt', 'w').write('ran in %s\n' % os.getcwd())
+    if result == 'raise':
+        raise RuntimeError('sample failed')
+    return result
+
+
+class RunBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saved = dict(os.environ)
+        for name in [n for n in os.environ if n.startswith('SEARCHCAKE_')]:
+            del os.environ[name]
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved)
+        shutil.rmtree(self.tmp)
+
+    def test_exit_codes_of_the_samples(self):
+        basedir = os.path.join(self.tmp, 'batch')
+        samples = [('ok', _sample, (None,)), ('zero', _sample, (0,)), ('failed', _sample, (1,)),
+                   ('raised', _sample, ('raise',))]
+        exitcodes = run_batch(samples, basedir, parallel=2, cores=4)
+        self.assertEqual(exitcodes, {'ok': 0, 'zero': 0, 'failed': 1, 'raised': 1})
+        for name, _, _ in samples:
+            self.assertIn(os.path.join(basedir, name), open(os.path.join(basedir, name, 'sample.txt')).read())
+        self.assertIn('sample failed', open(os.path.join(basedir, 'raised', 'batch.log')).read())
+        # the settings of the batch are gone with it
+        self.assertNotIn('SEARCHCAKE_CORES', os.environ)
+        self.assertNotIn('SEARCHCAKE_LEDGER', os.environ)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Process
+
+from searchcake.utils.blastdb import shared_blastdb
+
+# counts its builds, fails after writing part of the database if MAKEBLASTDB_FAIL is set
+MAKEBLASTDB = '''#!/bin/sh
+while [ $# -gt 0 ]; do
+  if [ "$1" = "-in" ]; then db="$2"; fi
+  shift
+done
+echo build >> "$MAKEBLASTDB_COUNT"
+echo partial > "$db.phr"
+sleep 0.2
+if [ -n "$MAKEBLASTDB_FAIL" ]; then echo "BLAST Database error" ; exit 1; fi
+echo index > "$db.pin"
+echo sequences > "$db.psq"
+'''
+
+
+def build(fasta, cachedir):
+    shared_blastdb(fasta, cachedir, logging.getLogger('test'))
+
+
+class SharedBlastdbTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saved = dict(os.environ)
+        bindir = os.path.join(self.tmp, 'bin')
+        os.makedirs(bindir)
+        exe = os.path.join(bindir, 'makeblastdb')
+        open(exe, 'w').write(MAKEBLASTDB)
+        os.chmod(exe, 0o755)
+        os.environ['PATH'] = bindir + os.pathsep + os.environ['PATH']
+        os.environ['MAKEBLASTDB_COUNT'] = os.path.join(self.tmp, 'builds')
+        self.fasta = os.path.join(self.tmp, 'db.fasta')
+        open(self.fasta, 'w').write('>P1\nPEPTIDE\n')
+        self.cachedir = os.path.join(self.tmp, 'cache')
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved)
+        shutil.rmtree(self.tmp)
+
+    def _builds(self):
+        path = os.environ['MAKEBLASTDB_COUNT']
+        return len(open(path).readlines()) if os.path.exists(path) else 0
+
+    def test_concurrent_callers_build_once_later_calls_reuse(self):
+        processes = [Process(target=build, args=(self.fasta, self.cachedir)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([p.exitcode for p in processes], [0, 0])
+        self.assertEqual(self._builds(), 1)
+        dbname = shared_blastdb(self.fasta, self.cachedir, logging.getLogger('test'))
+        self.assertEqual(self._builds(), 1)
+        self.assertEqual(os.path.basename(dbname), 'db.fasta')
+        self.assertEqual(open(dbname + '.pin').read(), 'index\n')
+
+    def test_failed_build_is_not_reused(self):
+        os.environ['MAKEBLASTDB_FAIL'] = '1'
+        self.assertRaises(RuntimeError, shared_blastdb, self.fasta, self.cachedir, logging.getLogger('test'))
+        # neither the entry nor the half written database of the build are left
+        self.assertEqual([name for name in os.listdir(self.cachedir) if not name.endswith('.lock')], [])
+        del os.environ['MAKEBLASTDB_FAIL']
+        dbname = shared_blastdb(self.fasta, self.cachedir, logging.getLogger('test'))
+        self.assertEqual(self._builds(), 2)
+        self.assertTrue(os.path.exists(dbname + '.psq'))
+
+
+if __name__ == '__main__':
+    unittest.main()
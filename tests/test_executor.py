@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from searchcake.flow import executor
+from searchcake.flow.executor import JobQueue, QueueExecutor, Worker, retries, with_threads
+
+
+class WorkerThreadsTest(unittest.TestCase):
+    def test_threads_of_the_worker_replace_those_of_the_workflow(self):
+        argv = ['--INPUT', 'split.ini_0', '--OUTPUT', 'rawcomet.ini_0', '--THREADS', '1']
+        self.assertEqual(with_threads(argv, 8)[-2:], ['--THREADS', '8'])
+        self.assertEqual(argv[-1], '1')
+        self.assertEqual(with_threads(argv[:4], 8), argv[:4])
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.queue = JobQueue(os.path.join(self.tmp, 'queue'))
+        self.saved = executor.stale, executor.poll
+
+    def tearDown(self):
+        executor.stale, executor.poll = self.saved
+        shutil.rmtree(self.tmp)
+
+    def _submit(self, name):
+        return self.queue.submit({'app': name, 'argv': [], 'stage': None, 'cwd': self.tmp, 'env': {}})
+
+    def test_claim_oldest_once(self):
+        first = self._submit('first')
+        second = self._submit('second')
+        self.assertEqual(self.queue.claim('node1:1')['id'], first)
+        self.assertEqual(self.queue.claim('node2:1')['id'], second)
+        self.assertEqual(self.queue.claim('node3:1'), None)
+        self.assertEqual(self.queue.owner(first), 'node1:1')
+
+    def test_finish(self):
+        jobid = self._submit('app')
+        job = self.queue.claim('node1:1')
+        # a worker whose claim was broken does not record
+        self.queue.finish(job, 'node2:1', 0)
+        self.assertEqual(self.queue.result(jobid), None)
+        self.queue.finish(job, 'node1:1', 0)
+        self.assertEqual(self.queue.result(jobid)['status'], 'ok')
+        self.assertEqual(self.queue.owner(jobid), None)
+        self.assertEqual(self.queue.claim('node1:1'), None)
+
+    def test_failed_job_is_retried(self):
+        jobid = self._submit('app')
+        for attempt in range(1, retries + 2):
+            job = self.queue.claim('node%d:1' % attempt)
+            self.assertEqual(job['attempts'], attempt)
+            self.queue.finish(job, 'node%d:1' % attempt, 1)
+        result = self.queue.result(jobid)
+        self.assertEqual((result['status'], result['attempts'], result['worker']),
+                         ('failed', retries + 1, 'node%d:1' % (retries + 1)))
+        self.assertEqual(self.queue.claim('node1:1'), None)
+
+    def test_stale_claims_are_aged_by_the_queue_clock(self):
+        jobid = self._submit('app')
+        self.queue.claim('node1:1')
+        real_time = time.time
+        # clock of this node an hour ahead of the file system
+        time.time = lambda: real_time() + 3600
+        try:
+            self.assertEqual(self.queue.claim('node2:1'), None)
+        finally:
+            time.time = real_time
+        lock = self.queue._file('locks', jobid, '.lock')
+        then = self.queue.now() - executor.stale - 1
+        os.utime(lock, (then, then))
+        self.assertEqual(self.queue.claim('node2:1')['attempts'], 2)
+        self.assertEqual(self.queue.owner(jobid), 'node2:1')
+
+    def test_two_workers_breaking_a_stale_claim(self):
+        jobid = self._submit('app')
+        self.queue.claim('node1:1')
+        lock = self.queue._file('locks', jobid, '.lock')
+        then = self.queue.now() - executor.stale - 1
+        os.utime(lock, (then, then))
+        other = JobQueue(self.queue.path)
+        read_claim = self.queue._claim
+
+        def slow_claim(path):
+            # node3 breaks the claim and claims the job after node2 read it as stale
+            claim = read_claim(path)
+            if path == lock:
+                self.queue._claim = read_claim
+                self.assertEqual(other.claim('node3:1')['id'], jobid)
+            return claim
+
+        self.queue._claim = slow_claim
+        self.assertEqual(self.queue.claim('node2:1'), None)
+        self.assertEqual(self.queue.owner(jobid), 'node3:1')
+        self.assertEqual(os.listdir(os.path.dirname(lock)), [os.path.basename(lock)])
+
+    def test_live_workers(self):
+        self.queue.alive('node1:1')
+        self.queue.alive('node2:1')
+        then = self.queue.now() - executor.stale - 1
+        os.utime(os.path.join(self.queue.path, 'workers', 'node2_1'), (then, then))
+        self.assertEqual(self.queue.live_workers(), ['node1_1'])
+        self.queue.retire('node1:1')
+        self.assertEqual(self.queue.live_workers(), [])
+
+    def test_run_fails_without_live_worker(self):
+        executor.stale, executor.poll = 0.2, 0.05
+        self.assertRaises(RuntimeError, QueueExecutor(self.queue.path).run, 'app', ['--INPUT', 'in.ini'])
+        self.assertEqual(os.listdir(os.path.join(self.queue.path, 'jobs')), [])
+
+    def test_run_times_out(self):
+        executor.poll = 0.05
+        self.queue.alive('node1:1')
+        self.assertRaises(RuntimeError, QueueExecutor(self.queue.path).run, 'app', [], timeout=0.2)
+        self.assertEqual(os.listdir(os.path.join(self.queue.path, 'jobs')), [])
+
+    def test_stopped_worker_retires(self):
+        self.queue.stop()
+        worker = Worker(self.queue.path, node='node1')
+        self.queue.alive(worker.id)
+        worker.run()
+        self.assertEqual(self.queue.live_workers(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
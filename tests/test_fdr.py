@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from helpers import write_pepxml
+from searchcake.utils.fdr import FdrResolver, resolve_iprobs
+from test_pepxmlheader import ANALYSIS
+
+
+class FdrResolverTest(unittest.TestCase):
+    def setUp(self):
+        # unsorted, with a run of equal fdrs
+        self.resolver = FdrResolver([0.02, 0.0, 0.01, 0.01], [0.9, 0.99, 0.95, 0.94])
+
+    def test_exact(self):
+        iprobs = self.resolver.exact([0.0, 0.01, 0.02, 0.015, 0.5])
+        self.assertEqual(list(iprobs[:3]), [0.99, 0.95, 0.9])
+        self.assertTrue(numpy.isnan(iprobs[3:]).all())
+
+    def test_closest_prefers_the_lower_and_first_of_equal_fdrs(self):
+        iprobs, fdrs = self.resolver.closest([0.011, 0.015, 0.019, -1.0, 1.0])
+        self.assertEqual(list(fdrs), [0.01, 0.01, 0.02, 0.0, 0.02])
+        self.assertEqual(list(iprobs), [0.95, 0.95, 0.9, 0.99, 0.9])
+
+    def test_interpolate_is_monotone_and_clipped(self):
+        iprobs = self.resolver.interpolate([0.005, 0.015, -1.0, 1.0])
+        numpy.testing.assert_allclose(iprobs, [0.97, 0.925, 0.99, 0.9])
+
+    def test_empty_table(self):
+        self.assertRaises(RuntimeError, FdrResolver, [], [])
+
+
+class ResolveIprobsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pepxml = os.path.join(self.tmp, 'iprophet.pep.xml')
+        write_pepxml(self.pepxml, os.path.join(self.tmp, 'run'), [(1, 2)], ANALYSIS)
+        self.mayu = os.path.join(self.tmp, 'mayu.csv')
+        with open(self.mayu, 'wb') as f:
+            f.write('IP/PPs,mFDR,pepFDR,protFDR\n0.99,0.001,0.0,0.0\n0.9,0.02,0.01,0.05\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_iprophet(self):
+        iprobs, fdrs = resolve_iprobs([0.01, 0.0], 'iprophet-pepFDR', pepxml=self.pepxml)
+        self.assertEqual(list(iprobs), [0.9513, 0.9999])
+        self.assertRaises(RuntimeError, resolve_iprobs, [0.02], 'iprophet-pepFDR', pepxml=self.pepxml)
+
+    def test_mayu(self):
+        iprobs, fdrs = resolve_iprobs([0.012], 'mayu-pepFDR', mayuout=self.mayu)
+        self.assertEqual((list(iprobs), list(fdrs)), ([0.9], [0.01]))
+        self.assertRaises(RuntimeError, resolve_iprobs, [0.01], 'mayu-pepFDR', mayuout=self.mayu + '.missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from searchcake.utils.importbench import measure, regressions
+
+
+def result(seconds, heavy=()):
+    return {'seconds': seconds, 'wall': seconds + 0.01, 'modules': 10, 'heavy': list(heavy)}
+
+
+class RegressionsTest(unittest.TestCase):
+    def test_regressions(self):
+        baseline = {'a:A': result(0.1), 'b:B': result(0.1), 'c:C': result(0.1), 'd:D': result(0.1)}
+        results = {'a:A': result(0.2), 'b:B': result(0.1, ['numpy']), 'c:C': {'error': 'ImportError: no c'},
+                   'd:D': result(0.11), 'e:E': result(5.0)}
+        self.assertEqual(regressions(results, baseline), [
+            'a:A: import took 0.200s, baseline 0.100s',
+            'b:B: imports numpy now',
+            'c:C: ImportError: no c'])
+
+    def test_tolerance_and_noise(self):
+        baseline = {'a:A': result(0.01)}
+        # twice as slow, but within the noise
+        self.assertEqual(regressions({'a:A': result(0.02)}, baseline), [])
+        self.assertEqual(len(regressions({'a:A': result(0.2)}, baseline, tolerance=1.0)), 1)
+
+    def test_measure(self):
+        r = measure('os:path', repeat=1)
+        self.assertTrue(r['seconds'] >= 0 and r['wall'] >= r['seconds'])
+        self.assertTrue(r['modules'] > 0)
+        self.assertEqual(r['heavy'], [])
+        self.assertIn('error', measure('os:no_such_attribute', repeat=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from searchcake.flow import manifest
+from searchcake.flow.manifest import TaskManifest, source_digest
+
+
+class TaskManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+        open('fakeapp.py', 'w').write('class FakeApp(object):\n    pass\n')
+        open('fakeapp.tpl', 'w').write('threshold = $THRESHOLD\n')
+        sys.path.insert(0, self.tmp)
+        import fakeapp
+        self.app = fakeapp.FakeApp
+        open('result.txt', 'w').write('result')
+        open('input.ini', 'w').write('THRESHOLD = 0.1\nTHREADS = 4\n')
+        self.argv = ['--INPUT', 'input.ini', '--OUTPUT', 'output.ini', '--THREADS', '4']
+
+    def tearDown(self):
+        sys.path.remove(self.tmp)
+        del sys.modules['fakeapp']
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def _key(self, argv=None):
+        return TaskManifest(self.app, argv or self.argv, os.path.join(self.tmp, '.manifests')).key()
+
+    def test_key_is_stable_and_ignores_threads(self):
+        self.assertEqual(self._key(), self._key())
+        self.assertEqual(self._key(self.argv[:-1] + ['8']), self._key())
+        open('input.ini', 'w').write('THRESHOLD = 0.1\nTHREADS = 8\n')
+        self.assertEqual(self._key(self.argv[:-1] + ['8']), self._key())
+
+    def test_key_covers_inputs_template_and_package_sources(self):
+        key = self._key()
+        open('fakeapp.tpl', 'a').write('# changed\n')
+        self.assertNotEqual(self._key(), key)
+        key = self._key()
+        saved = manifest._source_digest
+        manifest._source_digest = 'changed'
+        try:
+            self.assertNotEqual(self._key(), key)
+        finally:
+            manifest._source_digest = saved
+        open('input.ini', 'w').write('THRESHOLD = 0.2\nTHREADS = 4\n')
+        self.assertNotEqual(self._key(), key)
+
+    def test_source_digest_is_computed_once(self):
+        self.assertEqual(source_digest(), manifest._source_digest)
+        self.assertEqual(len(source_digest()), 40)
+
+    def test_restore_after_store(self):
+        task = TaskManifest(self.app, self.argv, os.path.join(self.tmp, '.manifests'))
+        self.assertFalse(task.restore())
+        open('output.ini', 'w').write('THRESHOLD = 0.1\nRESULT = %s\n' % os.path.join(self.tmp, 'result.txt'))
+        task.store()
+        os.remove('output.ini')
+        self.assertTrue(TaskManifest(self.app, self.argv, os.path.join(self.tmp, '.manifests')).restore())
+        self.assertTrue(os.path.exists('output.ini'))
+        open('result.txt', 'w').write('changed result')
+        self.assertFalse(TaskManifest(self.app, self.argv, os.path.join(self.tmp, '.manifests')).restore())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from searchcake.searchengines.myrimatch import Myrimatch
+
+PEPXML = ('<msms_pipeline_analysis>\n'
+          '<spectrum_query spectrum="run.2.2.2" spectrumNativeID="controllerType=0 scan=2" start_scan="2">\n'
+          '</spectrum_query>\n'
+          '</msms_pipeline_analysis>\n')
+
+
+class ValidateRunTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pepxml = os.path.join(self.tmp, 'run.pepXML')
+        open(self.pepxml, 'w').write(PEPXML)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _validate(self, streaming):
+        info = {'PEPXML': self.pepxml, 'PEPXML_STREAMING': streaming}
+        return Myrimatch().validate_run(logging.getLogger('test'), info, 0, '')
+
+    def test_streaming_leaves_the_fixup_to_the_filter(self):
+        for streaming in (True, 'True'):
+            info = self._validate(streaming)
+            self.assertEqual(info['PEPXML_FILTERS'], 'strip_native_id')
+            self.assertEqual(open(self.pepxml).read(), PEPXML)
+
+    def test_rewrite(self):
+        for streaming in (False, 'False'):
+            info = self._validate(streaming)
+            self.assertNotIn('PEPXML_FILTERS', info)
+            self.assertEqual(open(self.pepxml).read(), PEPXML.replace('spectrumNativeID="controllerType=0 scan=2"', ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
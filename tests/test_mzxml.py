@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import ms1, ms2, write_mzxml
+from searchcake.utils.mzxml import read_scan_offsets, scan_ranges
+
+
+class ScanRangesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.scans = [ms1(1)] + [ms2(num, 500.0, [(200.0, 10.0)]) for num in range(2, 12)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def mzxml(self, indexed):
+        path = os.path.join(self.tmp, 'a.mzXML')
+        write_mzxml(path, self.scans, indexed)
+        return path
+
+    def test_offsets_of_index_and_scan_tags_agree(self):
+        indexed = read_scan_offsets(self.mzxml(True))
+        self.assertEqual([num for num, _ in indexed], range(1, 12))
+        self.assertEqual(read_scan_offsets(self.mzxml(False)), indexed)
+        with open(self.mzxml(True), 'rb') as f:
+            for _, pos in indexed:
+                f.seek(pos)
+                self.assertEqual(f.read(5), '<scan')
+
+    def test_ranges_cover_all_scans_contiguously(self):
+        ranges = scan_ranges(self.mzxml(True), 3)
+        self.assertEqual(ranges, [(1, 3), (4, 7), (8, 11)])
+
+    def test_at_most_one_range_per_scan(self):
+        self.assertEqual(len(scan_ranges(self.mzxml(True), 50)), 11)
+        self.assertEqual(scan_ranges(self.mzxml(True), 1), [(1, 11)])
+
+    def test_empty_file_has_no_ranges(self):
+        path = os.path.join(self.tmp, 'empty.mzXML')
+        open(path, 'wb').close()
+        self.assertEqual(scan_ranges(path, 4), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
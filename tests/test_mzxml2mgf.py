@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from searchcake.utils.mzxml2mgf import candidate_charges, cached_mzxml_to_mgf, mzxml_to_mgf
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def _convert_in_worker(args):
+    return mzxml_to_mgf(*args)
+
+
+class MzXML2MGFTest(unittest.TestCase):
+    """
+    data/small.mgf is the expected MGF of data/small.mzXML following the conventions of
+    MzXML2Search -mgf: titles base.scan.scan.charge, intensities as stored, spectra without
+    precursor charge once per candidate charge.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.mzxml = os.path.join(DATA, 'small.mzXML')
+        self.reference = open(os.path.join(DATA, 'small.mgf')).read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_equals_reference(self):
+        mgf = os.path.join(self.tmp, 'small.mgf')
+        self.assertEqual(mzxml_to_mgf(self.mzxml, mgf), 4)
+        self.assertEqual(open(mgf).read(), self.reference)
+
+    def test_parallel_conversion_in_a_daemonic_worker(self):
+        mgf = os.path.join(self.tmp, 'small.mgf')
+        pool = multiprocessing.Pool(1)
+        try:
+            self.assertEqual(pool.apply(_convert_in_worker, ((self.mzxml, mgf, 3),)), 4)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(open(mgf).read(), self.reference)
+        self.assertEqual(os.listdir(self.tmp), ['small.mgf'])
+
+    def test_cached_conversion_is_reused(self):
+        cachedir = os.path.join(self.tmp, 'cache')
+        mgf = cached_mzxml_to_mgf(self.mzxml, cachedir)
+        mtime = os.path.getmtime(mgf)
+        self.assertEqual(cached_mzxml_to_mgf(self.mzxml, cachedir), mgf)
+        self.assertEqual(os.path.getmtime(mgf), mtime)
+        self.assertEqual(open(mgf).read(), self.reference)
+
+    def test_candidate_charges(self):
+        mz = numpy.array([100.0, 200.0, 600.0])
+        self.assertEqual(candidate_charges(500.0, mz, numpy.array([10.0, 10.0, 0.5])), [1])
+        self.assertEqual(candidate_charges(500.0, mz, numpy.array([10.0, 10.0, 5.0])), [2, 3])
+        self.assertEqual(candidate_charges(500.0, mz, numpy.zeros(3)), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from searchcake.searchengines.paramcompile import ParamCompile
+
+INFO = {
+    'FRAGMASSERR': '0.4', 'FRAGMASSUNIT': 'Da', 'PRECMASSERR': '15', 'PRECMASSUNIT': 'ppm',
+    'MISSEDCLEAVAGE': '1', 'ENZYME': 'Trypsin', 'STATIC_MODS': 'Carbamidomethyl (C)',
+    'VARIABLE_MODS': 'Oxidation (M)', 'XTANDEM_SCORE': 'k-score', 'DBASE': '/data/db.fasta',
+    'comet_fragment_bin_offset': '0.4', 'comet_theoretical_fragment_ions': '1',
+}
+
+
+class ParamCompileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.info = dict(INFO, WORKDIR=self.tmp)
+        self.log = logging.getLogger('test')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_one_content_named_file_per_engine(self):
+        info = ParamCompile().run(self.log, dict(self.info))
+        paths = [info[key] for key in ('COMET_PARAMS', 'MYRIMATCH_PARAMS', 'XTANDEM_PARAMS')]
+        self.assertEqual(sorted(os.listdir(self.tmp)), sorted(os.path.basename(p) for p in paths))
+        # threads are filled in per search
+        self.assertIn('num_threads = $THREADS', open(paths[0]).read())
+        self.assertEqual(ParamCompile().run(self.log, dict(self.info))['COMET_PARAMS'], paths[0])
+        changed = ParamCompile().run(self.log, dict(self.info, MISSEDCLEAVAGE='2'))
+        self.assertNotEqual(changed['COMET_PARAMS'], paths[0])
+
+    def test_engines_without_parameter_file_are_refused(self):
+        class NoParams(object):
+            params_key = None
+            params_name = None
+
+        compiler = ParamCompile()
+        compiler.engines = [NoParams]
+        self.assertRaises(RuntimeError, compiler.run, self.log, dict(self.info))
+
+
+if __name__ == '__main__':
+    unittest.main()
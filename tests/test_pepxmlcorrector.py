@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import write_pepxml
+from searchcake.utils import pepxmlstream
+from searchcake.utils.pepxmlcorrector import PepXMLFixer
+from searchcake.utils.pepxmlstream import rewrite_pepxml
+
+
+def _correct(infile, outfile, nrprocs):
+    fixer = PepXMLFixer('run')
+    old = pepxmlstream.chunksize
+    pepxmlstream.chunksize = 1000
+    try:
+        rewrite_pepxml(infile, [fixer], outfile=outfile, nrprocs=nrprocs)
+    finally:
+        pepxmlstream.chunksize = old
+    return open(outfile).read(), (fixer.spectra, fixer.padded, fixer.nativeids, fixer.summaries)
+
+
+class PepXMLFixerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pepxml = os.path.join(self.tmp, 'myrimatch.pep.xml')
+        # omssa style base name, myrimatch style scan numbers and native ids
+        write_pepxml(self.pepxml, os.path.join(self.tmp, 'run.pep.xml'), [(scan, 2) for scan in range(1, 41)]
+                     + [(123456, 3)])
+        content = open(self.pepxml).read().replace(' start_scan=', ' spectrumNativeID="scan=1" start_scan=')
+        open(self.pepxml, 'wb').write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fixes(self):
+        content, counts = _correct(self.pepxml, os.path.join(self.tmp, 'corrected.pep.xml'), 1)
+        self.assertEqual(counts, (41, 40, 41, 1))
+        self.assertIn('spectrum="run.pep.xml.00007.00007.2"', content)
+        self.assertIn('spectrum="run.pep.xml.123456.123456.3"', content)
+        self.assertIn('<msms_run_summary base_name="run" raw_data_type="" raw_data=".mzXML">', content)
+        self.assertNotIn('spectrumNativeID', content)
+
+    def test_corrected_file_is_left_alone(self):
+        corrected = os.path.join(self.tmp, 'corrected.pep.xml')
+        first = _correct(self.pepxml, corrected, 1)[0]
+        content, counts = _correct(corrected, os.path.join(self.tmp, 'again.pep.xml'), 1)
+        self.assertEqual((content, counts), (first, (41, 0, 0, 0)))
+
+    def test_chunks_in_processes_of_a_daemonic_worker(self):
+        serial = _correct(self.pepxml, os.path.join(self.tmp, 'serial.pep.xml'), 1)
+        # ruffus runs tasks in the daemonic workers of a multiprocessing pool
+        pool = multiprocessing.Pool(1)
+        try:
+            parallel = pool.apply(_correct, (self.pepxml, os.path.join(self.tmp, 'parallel.pep.xml'), 3))
+        finally:
+            pool.terminate()
+            pool.join()
+        self.assertEqual(parallel, serial)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['myrimatch.pep.xml', 'parallel.pep.xml', 'serial.pep.xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
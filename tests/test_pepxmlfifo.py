@@ -0,0 +1,51 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from helpers import write_pepxml
+from searchcake.utils.pepxmlfifo import fifo_command, make_fifo, open_writer
+from searchcake.utils.processes import python_env
+
+
+class PepXMLFifoTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pepxml = os.path.join(self.tmp, 'myrimatch.pep.xml')
+        write_pepxml(self.pepxml, os.path.join(self.tmp, 'run'), [(1, 2), (2, 2)])
+        content = open(self.pepxml).read().replace(' start_scan=', ' spectrumNativeID="scan=1" start_scan=')
+        open(self.pepxml, 'wb').write(content)
+        self.fifo = make_fifo(os.path.join(self.tmp, 'fifo.pep.xml'))
+        self.out = os.path.join(self.tmp, 'out.pep.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, reader):
+        command = fifo_command('strip_native_id', self.pepxml, self.fifo, reader)
+        return subprocess.call(command + ' && echo next > %s.next' % self.out, shell=True, env=python_env())
+
+    def test_reader_gets_the_filtered_file(self):
+        self.assertEqual(self._run('cat %s > %s' % (self.fifo, self.out)), 0)
+        self.assertEqual(open(self.out).read(), open(self.pepxml).read().replace('spectrumNativeID="scan=1"', ''))
+        self.assertTrue(os.path.exists(self.out + '.next'))
+
+    def test_reader_failing_before_opening_the_pipe(self):
+        start = time.time()
+        self.assertEqual(self._run('sh -c "exit 3"'), 3)
+        self.assertLess(time.time() - start, 10)
+        self.assertFalse(os.path.exists(self.out + '.next'))
+
+    def test_filter_failing(self):
+        self.pepxml += '.missing'
+        self.assertNotEqual(self._run('cat %s > %s' % (self.fifo, self.out)), 0)
+        self.assertEqual(open(self.out).read(), '')
+
+    def test_no_reader(self):
+        self.assertRaises(IOError, open_writer, self.fifo, 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import write_pepxml
+from searchcake.utils.pepxmlheader import ERROR_COLUMNS, read_error_table, write_error_table
+from searchcake.utils.pepxmlparallel import read_header
+
+ANALYSIS = ('<analysis_summary analysis="interprophet">\n'
+            '<interprophet_summary>\n'
+            '<roc_error_data charge="all">\n'
+            '<error_point error="0.0000" min_prob="0.9999" num_corr="1234" num_incorr="0"/>\n'
+            '<error_point error="0.0100" min_prob="0.9513" num_corr="2500" num_incorr="25"/>\n'
+            '<error_point error="0.0250" min_prob="0.8706123" num_corr="3000" num_incorr="75"/>\n'
+            '</roc_error_data>\n'
+            '<roc_error_data charge="2">\n'
+            '<error_point error="0.5" min_prob="0.1" num_corr="1" num_incorr="1"/>\n'
+            '</roc_error_data>\n'
+            '</interprophet_summary>\n'
+            '</analysis_summary>\n')
+
+
+class ErrorTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pepxml = os.path.join(self.tmp, 'iprophet.pep.xml')
+        write_pepxml(self.pepxml, os.path.join(self.tmp, 'run'), [(1, 2), (2, 3)], ANALYSIS)
+        self.outfile = os.path.join(self.tmp, 'error.tsv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_first_table_as_numbers(self):
+        table = read_error_table(self.pepxml)
+        self.assertEqual(list(table['error']), [0.0, 0.01, 0.025])
+        self.assertEqual(list(table['min_prob']), [0.9999, 0.9513, 0.8706123])
+        self.assertEqual(list(table['num_corr']), [1234, 2500, 3000])
+
+    def test_tsv_has_the_values_as_written(self):
+        write_error_table(self.pepxml, self.outfile)
+        self.assertEqual(open(self.outfile).read().splitlines(), [
+            '\t'.join(ERROR_COLUMNS),
+            '0.9999\t0.0000\t0\t1234',
+            '0.9513\t0.0100\t25\t2500',
+            '0.8706123\t0.0250\t75\t3000'])
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['error.tsv', 'iprophet.pep.xml'])
+
+    def test_from_header(self):
+        write_error_table(self.pepxml + '.missing', self.outfile, read_header(self.pepxml))
+        self.assertEqual(len(open(self.outfile).read().splitlines()), 4)
+
+    def test_no_table(self):
+        write_pepxml(self.pepxml, os.path.join(self.tmp, 'run'), [(1, 2)])
+        self.assertEqual(len(read_error_table(self.pepxml)['error']), 0)
+        write_error_table(self.pepxml, self.outfile)
+        self.assertEqual(open(self.outfile).read(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from helpers import write_pepxml
+from searchcake.utils.pepxmlmerge import merge_pepxml
+
+
+class MergePepXMLTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.shards = []
+        for i, queries in enumerate([[(1, 2), (2, 2)], [(5, 3)], [(7, 2), (9, 2)]]):
+            base = os.path.join(self.tmp, 'run.shard%02d' % i)
+            write_pepxml(base + '.pep.xml', base, queries)
+            self.shards.append(base + '.pep.xml')
+        self.merged = os.path.join(self.tmp, 'run.pep.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_queries_of_all_shards_in_order_and_renumbered(self):
+        self.assertEqual(merge_pepxml(self.shards, self.merged), 5)
+        content = open(self.merged).read()
+        self.assertEqual(re.findall(r'spectrum="run\.(\d+)\.', content), ['1', '2', '5', '7', '9'])
+        self.assertEqual(re.findall(r'index="(\d+)"', content), ['1', '2', '3', '4', '5'])
+
+    def test_one_header_and_tail_with_the_merged_base_name(self):
+        merge_pepxml(self.shards, self.merged)
+        content = open(self.merged).read()
+        self.assertEqual(content.count('<msms_run_summary'), 1)
+        self.assertEqual(content.count('</msms_pipeline_analysis>'), 1)
+        self.assertIn('base_name="%s"' % os.path.join(self.tmp, 'run'), content)
+        self.assertNotIn('shard', content)
+
+    def test_missing_shards_are_skipped(self):
+        self.assertEqual(merge_pepxml(self.shards + [self.merged + '.missing'], self.merged), 5)
+        self.assertRaises(RuntimeError, merge_pepxml, [self.merged + '.missing'], self.merged)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import write_pepxml
+from searchcake.utils import pepxmlparallel
+from searchcake.utils.pepxmlparallel import iter_parallel, query_ranges, read_header
+from searchcake.utils.pepxmlpsm import psm_from_spectrum_query
+
+
+def _spectra(path, nrprocs):
+    return [row[5] for row in iter_parallel(path, psm_from_spectrum_query, nrprocs)]
+
+
+class PepXMLParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pepxml = os.path.join(self.tmp, 'run.pep.xml')
+        write_pepxml(self.pepxml, os.path.join(self.tmp, 'run'), [(scan, 2) for scan in range(1, 21)])
+        self.spectra = ['run.%d.%d.2' % (scan, scan) for scan in range(1, 21)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_ranges_start_at_queries_and_cover_the_rest_of_the_file(self):
+        content = open(self.pepxml, 'rb').read()
+        ranges = query_ranges(self.pepxml, 4)
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[0][0], len(read_header(self.pepxml)))
+        self.assertEqual(ranges[-1][1], len(content))
+        for start, end in ranges:
+            self.assertTrue(content[start:].startswith('<spectrum_query'))
+        self.assertEqual([end for _, end in ranges[:-1]], [start for start, _ in ranges[1:]])
+
+    def test_more_ranges_than_queries(self):
+        self.assertEqual(len(query_ranges(self.pepxml, 100)), 20)
+
+    def test_serial_and_parallel_yield_the_same_in_order(self):
+        self.assertEqual(_spectra(self.pepxml, 1), self.spectra)
+        self.assertEqual(_spectra(self.pepxml, 3), self.spectra)
+
+    def test_parallel_in_daemonic_worker(self):
+        # ruffus runs tasks in the daemonic workers of a multiprocessing pool
+        pool = multiprocessing.Pool(1)
+        try:
+            self.assertEqual(pool.apply(_spectra, (self.pepxml, 3)), self.spectra)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def test_small_ranges(self):
+        old = pepxmlparallel.rangesize
+        pepxmlparallel.rangesize = 500
+        try:
+            self.assertEqual(_spectra(self.pepxml, 2), self.spectra)
+        finally:
+            pepxmlparallel.rangesize = old
+
+
+if __name__ == '__main__':
+    unittest.main()
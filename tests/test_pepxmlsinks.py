@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import write_pepxml
+from searchcake.utils.pepxmlsinks import ErrorTableSink, PsmTsvSink, run_sinks
+from test_pepxmlheader import ANALYSIS
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class PepXMLSinksTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pepxml = os.path.join(self.tmp, 'iprophet.pep.xml')
+        write_pepxml(self.pepxml, os.path.join(self.tmp, 'run'), [(1, 2), (2, 3), (3, 2)], ANALYSIS)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_one_pass_feeds_all_sinks(self):
+        psms = PsmTsvSink(os.path.join(self.tmp, 'psms.tsv'))
+        errors = ErrorTableSink(os.path.join(self.tmp, 'error.tsv'))
+        run_sinks(self.pepxml, [psms, errors], 2)
+        self.assertEqual(psms.nr_rows, 3)
+        self.assertEqual(len(open(psms.outfile).read().splitlines()), 4)
+        self.assertEqual(len(open(errors.outfile).read().splitlines()), 4)
+
+    def test_psm_table_as_written_with_pyteomics(self):
+        # iprophet.psms.tsv was written from iprophet.pep.xml by the pyteomics based table writer
+        for nrprocs in (1, 2):
+            psms = PsmTsvSink(os.path.join(self.tmp, 'psms%d.tsv' % nrprocs))
+            run_sinks(os.path.join(DATA, 'iprophet.pep.xml'), [psms], nrprocs)
+            self.assertEqual(open(psms.outfile).read(), open(os.path.join(DATA, 'iprophet.psms.tsv')).read())
+
+    def test_error_table_from_the_given_header(self):
+        errors = ErrorTableSink(os.path.join(self.tmp, 'error.tsv'))
+        header = open(self.pepxml).read().split('<spectrum_query')[0]
+        errors.start(self.pepxml + '.missing', header)
+        errors.close()
+        self.assertEqual(open(errors.outfile).read().splitlines()[1], '0.9999\t0.0000\t0\t1234')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from searchcake.flow.runner import run_settings, scoped_environ, workflow_run
+
+
+class RunSettingsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saved = dict(os.environ)
+        for name in [n for n in os.environ if n.startswith('SEARCHCAKE_')]:
+            del os.environ[name]
+        os.environ['SEARCHCAKE_METRICS'] = os.path.join(self.tmp, 'metrics.jsonl')
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved)
+        shutil.rmtree(self.tmp)
+
+    def test_settings(self):
+        env = run_settings(cores=8, memory_budget=4, scratch='scratch', inprocess=True, executor='local')
+        self.assertEqual(env, {'SEARCHCAKE_CORES': '8', 'SEARCHCAKE_MEMORY_BUDGET': '4',
+                               'SEARCHCAKE_SCRATCH': os.path.abspath('scratch'), 'SEARCHCAKE_INPROCESS': '1',
+                               'SEARCHCAKE_EXECUTOR': 'local'})
+        env = run_settings(state='state.db', export_inis=True)
+        self.assertEqual(env, {'SEARCHCAKE_INPROCESS': '1',
+                               'SEARCHCAKE_STATE': os.path.abspath('state.db'), 'SEARCHCAKE_STATE_EXPORT': '1'})
+        self.assertEqual(run_settings(incremental=True), {'SEARCHCAKE_INCREMENTAL': '1'})
+        self.assertEqual(run_settings(), {})
+
+    def test_incompatible_settings(self):
+        self.assertRaises(ValueError, run_settings, state='state.db', scratch='scratch')
+        self.assertRaises(ValueError, run_settings, state='state.db', incremental=True)
+        self.assertRaises(ValueError, run_settings, scratch='scratch', executor='queue')
+        os.environ['SEARCHCAKE_EXECUTOR'] = 'queue'
+        self.assertRaises(ValueError, run_settings, scratch='scratch')
+        self.assertEqual(run_settings(scratch='scratch', executor='local')['SEARCHCAKE_EXECUTOR'], 'local')
+
+    def test_scoped_environ_restores(self):
+        os.environ['SEARCHCAKE_CORES'] = '4'
+        try:
+            with scoped_environ({'SEARCHCAKE_CORES': '8', 'SEARCHCAKE_INCREMENTAL': '1'}):
+                self.assertEqual(os.environ['SEARCHCAKE_CORES'], '8')
+                self.assertEqual(os.environ['SEARCHCAKE_INCREMENTAL'], '1')
+                raise KeyError
+        except KeyError:
+            pass
+        self.assertEqual(os.environ['SEARCHCAKE_CORES'], '4')
+        self.assertNotIn('SEARCHCAKE_INCREMENTAL', os.environ)
+
+    def test_nested_run_keeps_the_settings_of_the_outer_run(self):
+        with workflow_run(run_settings(cores=8, incremental=True)) as outer:
+            self.assertTrue(outer)
+            with workflow_run(run_settings(cores=2)) as inner:
+                self.assertEqual(inner, None)
+                self.assertEqual(os.environ['SEARCHCAKE_CORES'], '2')
+                self.assertEqual(os.environ['SEARCHCAKE_INCREMENTAL'], '1')
+            self.assertEqual(os.environ['SEARCHCAKE_CORES'], '8')
+            self.assertEqual(os.environ['SEARCHCAKE_RUN'], outer)
+        self.assertEqual(sorted(n for n in os.environ if n.startswith('SEARCHCAKE_')), ['SEARCHCAKE_METRICS'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from searchcake.flow.scheduler import CoreScheduler
+
+GB = 1024 ** 3
+
+
+class GrantTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.scheduler = CoreScheduler(os.path.join(self.tmp, 'cores.ledger'), cores=16, memory=10 * GB)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    @staticmethod
+    def _state(waiting, granted=None, memory=None):
+        return {'waiting': dict((tid, i) for i, tid in enumerate(waiting)), 'granted': granted or {},
+                'memory': memory or {}}
+
+    def test_first_waiting_gets_an_equal_share_of_the_free_cores(self):
+        state = self._state(['a', 'b', 'c', 'd'])
+        self.assertEqual(self.scheduler._grant(state, 'b', 16, 1, 0), 0)
+        self.assertEqual(self.scheduler._grant(state, 'a', 16, 1, 0), 4)
+        self.assertEqual(state['granted'], {'a': 4})
+        self.assertEqual(sorted(state['waiting']), ['b', 'c', 'd'])
+        self.assertEqual(self.scheduler._grant(state, 'b', 2, 1, 0), 2)
+
+    def test_minimum_share(self):
+        # one core each for as many waiting searches as cores, unless a minimum is asked for
+        waiting = ['t%02d' % i for i in range(16)]
+        self.assertEqual(self.scheduler._grant(self._state(waiting), 't00', 16, 1, 0), 1)
+        state = self._state(waiting)
+        self.assertEqual(self.scheduler._grant(state, 't00', 16, 4, 0), 4)
+        for tid in waiting[1:4]:
+            self.assertEqual(self.scheduler._grant(state, tid, 16, 4, 0), 4)
+        self.assertEqual(self.scheduler._grant(state, 't04', 16, 4, 0), 0)
+
+    def test_memory_budget(self):
+        state = self._state(['a', 'b'])
+        self.assertEqual(self.scheduler._grant(state, 'a', 1, 1, 12 * GB), 1)
+        self.assertEqual(self.scheduler._grant(state, 'b', 1, 1, 1 * GB), 0)
+        state['granted'], state['memory'] = {}, {}
+        self.assertEqual(self.scheduler._grant(state, 'b', 1, 1, 1 * GB), 1)
+
+    def test_tasks_of_dead_processes_are_dropped(self):
+        dead = '%s:%d' % (socket.gethostname(), 2 ** 22 + 12345)
+        self.scheduler.update(lambda state: state['granted'].__setitem__(dead, 8))
+        self.assertEqual(self.scheduler.acquire(want=16, minimum=16), 16)
+        self.scheduler.release(16)
+        self.assertEqual(self.scheduler.update(lambda state: dict(state['granted'])), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
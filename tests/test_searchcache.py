@@ -0,0 +1,89 @@
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from searchcake.searchengines.searchcache import SearchCache, executables
+
+log = logging.getLogger('test')
+
+
+class SearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = SearchCache(os.path.join(self.tmp, 'cache'))
+        self.params = self.write('params/comet.params', 'num_threads = 4\npeptide_mass_tolerance = 10\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, content, mode=None):
+        path = os.path.join(self.tmp, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+        if mode:
+            os.chmod(path, mode)
+        return path
+
+    def key(self, mzxml, params=None, command='comet -Pparams'):
+        return self.cache.key('Comet', [mzxml], [params or self.params], command)
+
+    def test_key_depends_on_content_and_base_name_not_directory(self):
+        a = self.key(self.write('run1/sample.mzXML', 'spectra'))
+        self.assertEqual(a, self.key(self.write('run2/sample.mzXML', 'spectra')))
+        self.assertNotEqual(a, self.key(self.write('run3/other.mzXML', 'spectra')))
+        self.assertNotEqual(a, self.key(self.write('run4/sample.mzXML', 'other spectra')))
+
+    def test_thread_counts_do_not_change_the_key(self):
+        mzxml = self.write('sample.mzXML', 'spectra')
+        threads = self.write('params/comet8.params', 'num_threads = 8\npeptide_mass_tolerance = 10\n')
+        self.assertEqual(self.key(mzxml), self.key(mzxml, threads))
+        self.assertEqual(self.key(mzxml, command='comet -nt 2'), self.key(mzxml, command='comet -nt 16'))
+
+    def test_every_executable_of_a_command_chain_is_hashed(self):
+        bindir = os.path.join(self.tmp, 'bin')
+        self.write('bin/convert', '#!/bin/sh\n', 0o755)
+        search = self.write('bin/search', '#!/bin/sh\n', 0o755)
+        path = os.environ['PATH']
+        os.environ['PATH'] = bindir + os.pathsep + path
+        try:
+            self.assertEqual(executables('convert a > b && search b | grep -v x'),
+                             [os.path.join(bindir, 'convert'), search, executables('grep')[0]])
+            mzxml = self.write('sample.mzXML', 'spectra')
+            before = self.key(mzxml, command='convert a && search b')
+            self.write('bin/search', '#!/bin/sh\n# version 2\n', 0o755)
+            self.assertNotEqual(before, self.key(mzxml, command='convert a && search b'))
+        finally:
+            os.environ['PATH'] = path
+
+    def test_restore_rewrites_the_directories_of_the_stored_run(self):
+        out1 = self.write('run1/work/sample.pep.xml', '<msms_run_summary base_name="%s/work/sample" '
+                                                      'raw_data="%s/data/sample.mzXML">\n' % (
+                                                          os.path.join(self.tmp, 'run1'), self.tmp))
+        dirs1 = [os.path.join(self.tmp, 'run1/work'), os.path.join(self.tmp, 'data'), self.tmp]
+        self.cache.store(log, 'k', [out1], 'searched %s\n' % dirs1[0], dirs1)
+
+        out2 = os.path.join(self.tmp, 'run2/work/sample.pep.xml')
+        os.makedirs(os.path.dirname(out2))
+        dirs2 = [os.path.join(self.tmp, 'run2/work'), os.path.join(self.tmp, 'data2'), self.tmp]
+        self.assertEqual(self.cache.restore(log, 'k', [out2], dirs2), 'searched %s\n' % dirs2[0])
+        self.assertEqual(open(out2).read(), '<msms_run_summary base_name="%s/work/sample" '
+                                            'raw_data="%s/data2/sample.mzXML">\n' % (
+                                                os.path.join(self.tmp, 'run2'), self.tmp))
+        self.assertEqual(os.listdir(os.path.dirname(out2)), ['sample.pep.xml'])
+
+    def test_missing_and_evicted_entries_are_misses(self):
+        out = self.write('work/sample.pep.xml', 'result')
+        self.assertIsNone(self.cache.restore(log, 'k', [out]))
+        self.cache.store(log, 'k', [out], 'stdout')
+        os.remove(os.path.join(self.cache._entry('k'), '0'))
+        self.assertIsNone(self.cache.restore(log, 'k', [out]))
+        self.assertEqual(open(out).read(), 'result')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from configobj import ConfigObj
+
+from searchcake.flow.procstats import PeakSampler
+from searchcake.flow.staging import Scratch, StagedTask
+
+
+class CopyBackTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.scratch = Scratch(os.path.join(self.tmp, 'scratch'))
+        self.src = self.scratch.mirror(os.path.join(self.tmp, 'base', 'job'))
+        os.makedirs(self.src)
+        open(os.path.join(self.src, 'result.pep.xml'), 'w').write('<a base_name="%s/result"/>\n' % self.src)
+        open(os.path.join(self.src, 'result.tsv'), 'w').write('%s\n' % self.src)
+        self.files = [(os.path.join(self.src, name), self.scratch.unmirror(os.path.join(self.src, name)))
+                      for name in ('result.pep.xml', 'result.tsv')]
+        self.replace = [(self.scratch.work + os.sep, os.sep)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_copies_back_from_a_process_with_threads(self):
+        # tasks run under a TreeMonitor thread
+        with PeakSampler(os.getpid(), interval=0.01):
+            self.scratch.copy_back(self.files, self.replace)
+        self.assertEqual(self.scratch.finalize(poll=0.05), [])
+        pepxml, tsv = [dest for _, dest in self.files]
+        # paths rewritten in xml outputs only
+        self.assertEqual(open(pepxml).read(), '<a base_name="%s/result"/>\n' % os.path.dirname(pepxml))
+        self.assertEqual(open(tsv).read(), '%s\n' % self.src)
+        self.assertFalse(os.path.exists(self.files[0][0]))
+        self.assertEqual(os.listdir(self.scratch.copyback), [])
+
+    def test_failed_copy(self):
+        os.remove(self.files[1][0])
+        self.scratch.copy_back(self.files, self.replace)
+        failed = self.scratch.finalize(poll=0.05)
+        self.assertEqual([entry['dest'] for entry in failed], [self.files[1][1]])
+
+
+class StagedTaskTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.scratch = Scratch(os.path.join(self.tmp, 'scratch'))
+        self.base = os.path.join(self.tmp, 'base')
+        os.makedirs(self.base)
+        self.mzxml = os.path.join(self.tmp, 'sample.v2.mzXML')
+        open(self.mzxml, 'w').write('<mzXML/>\n')
+        self.infile, self.outfile = os.path.join(self.tmp, 'in.ini'), os.path.join(self.tmp, 'out.ini')
+        config = ConfigObj()
+        config.update({'BASEDIR': self.base, 'MZXML': self.mzxml})
+        config.filename = self.infile
+        config.write()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, outputs, keep=None):
+        """
+        Runs a task writing files into its work directory, outputs are keys of the output ini.
+        """
+        with StagedTask(['--INPUT', self.infile, '--OUTPUT', self.outfile], self.scratch) as argv:
+            info = ConfigObj(argv[1])
+            workdir = os.path.join(info['BASEDIR'], 'job', 'Omssa')
+            os.makedirs(workdir)
+            for name in ('sample.v2.pep.xml', 'sample.v2.mgf', 'sample.v2.pep.xml.tmp', 'sample.v2.mzXML',
+                         'consensus.splib', 'consensus.sptxt', 'consensus.spidx'):
+                open(os.path.join(workdir, name), 'w').write(name)
+            out = ConfigObj()
+            out.update(dict(info, WORKDIR=workdir, **dict((k, os.path.join(workdir, v)) for k, v in outputs.items())))
+            out.filename = self.outfile
+            out.write()
+        self.assertEqual(self.scratch.finalize(poll=0.05), [])
+        return workdir, ConfigObj(self.outfile)
+
+    def test_copies_back_declared_outputs_and_companions_only(self):
+        workdir, out = self._run({'PEPXML': 'sample.v2.pep.xml', 'SPLIB': 'consensus.splib'})
+        final = os.path.join(self.base, 'job', 'Omssa')
+        self.assertEqual((out['WORKDIR'], out['PEPXML']), (final, os.path.join(final, 'sample.v2.pep.xml')))
+        self.assertEqual(sorted(os.listdir(final)), ['consensus.spidx', 'consensus.splib', 'consensus.sptxt',
+                                                     'sample.v2.pep.xml'])
+        # the work directory is removed from scratch after the copy back
+        self.assertFalse(os.path.exists(workdir))
+
+    def test_work_directory_referenced_by_the_info_stays(self):
+        workdir, out = self._run({'PEPXML': 'sample.v2.pep.xml', 'MGF': 'sample.v2.mgf'})
+        self.assertEqual(out['MGF'], os.path.join(workdir, 'sample.v2.mgf'))
+        self.assertTrue(os.path.exists(out['MGF']))
+
+
+if __name__ == '__main__':
+    unittest.main()
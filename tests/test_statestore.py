@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ruffus import Pipeline
+
+from applicake2.base.app import BasicApp
+from applicake2.base.coreutils import IniInfoHandler
+from applicake2.base.coreutils.arguments import Argument
+from searchcake.flow.statestore import StateStore, merge_infos, split_info, tracked, uptodate
+from searchcake.flow.warmpool import run_task
+
+# jobs run by the pipeline of a test
+runs = []
+
+
+class AddApp(BasicApp):
+    def add_args(self):
+        return [Argument('VALUE', 'value')]
+
+    def run(self, log, info):
+        runs.append(info['VALUE'])
+        info['VALUE'] = str(int(info['VALUE']) + 1)
+        return info
+
+
+def add(infile, outfile):
+    run_task(AddApp, ['--INPUT', infile, '--OUTPUT', outfile])
+
+
+class StateStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.saved = dict(os.environ)
+        os.environ['SEARCHCAKE_STATE'] = os.path.join(self.tmp, 'state.db')
+        del runs[:]
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_split_and_merge(self):
+        infos = split_info({'MZXML': ['a', 'b'], 'DBASE': 'db'}, 'MZXML')
+        self.assertEqual(infos, [{'MZXML': 'a', 'DBASE': 'db'}, {'MZXML': 'b', 'DBASE': 'db'}])
+        self.assertEqual(merge_infos(infos), {'MZXML': ['a', 'b'], 'DBASE': 'db'})
+
+    def test_uptodate(self):
+        store = StateStore()
+        self.assertTrue(uptodate('input.ini', 'first.ini')[0])
+        store.put('first.ini', {})
+        store.put('second.ini', {})
+        self.assertFalse(uptodate('input.ini', 'first.ini')[0])
+        self.assertFalse(uptodate('first.ini', ['second.ini'])[0])
+        store.put('first.ini', {'VALUE': '1'})
+        self.assertTrue(uptodate('first.ini', ['second.ini'])[0])
+
+    def test_pipeline_runs_on_the_store_without_files(self):
+        IniInfoHandler().write({'VALUE': '1'}, 'input.ini')
+        pipeline = Pipeline('statestore')
+        pipeline.files(add, 'input.ini', 'first.ini', name='first')
+        pipeline.files(add, 'first.ini', 'second.ini', name='second').follows('first')
+        with tracked(pipeline):
+            pipeline.run(verbose=0)
+        self.assertEqual(StateStore().get('second.ini')['VALUE'], '3')
+        # besides the job history of ruffus
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['.ruffus_history.sqlite', 'input.ini', 'state.db'])
+        # stored outputs are up to date, a changed info runs the jobs after it
+        with tracked(pipeline):
+            pipeline.run(verbose=0)
+        self.assertEqual(runs, ['1', '2'])
+        StateStore().put('first.ini', {'VALUE': '5'})
+        with tracked(pipeline):
+            pipeline.run(verbose=0)
+        self.assertEqual(runs, ['1', '2', '5'])
+        self.assertEqual(StateStore().get('second.ini')['VALUE'], '6')
+
+
+if __name__ == '__main__':
+    unittest.main()
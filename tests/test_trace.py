@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from searchcake.flow.trace import trace_events, write_trace
+
+
+def record(stage, pid, start, wall, command=None, status='ok', host='node1', argv=()):
+    return {'run': 'run1', 'stage': stage, 'host': host, 'pid': pid, 'argv': list(argv), 'command': command,
+            'start': start, 'wall': wall, 'status': status, 'user': 1.5, 'sys': 0.0, 'peak_rss': 1024,
+            'read': 0, 'written': 10}
+
+
+class TraceTest(unittest.TestCase):
+    def setUp(self):
+        # two tasks overlapping in two workers, the second failed, a command of the first
+        self.records = [
+            record('Comet', 100, 10.0, 5.0, argv=['--INPUT', 'split.ini_0', '--OUTPUT', 'rawcomet.ini_0']),
+            record('Comet', 100, 11.0, 3.5, command='comet.exe -P comet.params run.mzXML'),
+            record('Comet', 200, 12.0, 0.0, status='failed',
+                   argv=['--INPUT', 'split.ini_1', '--OUTPUT', 'rawcomet.ini_1']),
+        ]
+
+    def _spans(self, events):
+        return [e for e in events if e['ph'] == 'X']
+
+    def test_spans(self):
+        spans = self._spans(trace_events(self.records))
+        self.assertEqual([(e['name'], e['cat'], e['pid'], e['tid'], e['ts'], e['dur']) for e in spans], [
+            ('Comet rawcomet.ini_0', 'stage', 1, 1, 10000000, 5000000),
+            ('comet.exe', 'command', 1, 1, 11000000, 3500000),
+            # shorter than a microsecond, still shown
+            ('Comet rawcomet.ini_1', 'stage', 1, 2, 12000000, 1)])
+        self.assertEqual(spans[2]['args']['status'], 'failed')
+        self.assertEqual(spans[1]['args']['command'], 'comet.exe -P comet.params run.mzXML')
+        self.assertNotIn('sys', spans[0]['args'])
+
+    def test_lanes_per_host_and_worker(self):
+        events = trace_events(self.records + [record('Xtandem', 100, 11.0, 1.0, host='node2')])
+        names = dict(((e['pid'], e.get('tid')), e['args']['name']) for e in events if e['ph'] == 'M')
+        self.assertEqual(names, {(1, 1): 'worker 1 (pid 100)', (1, 2): 'worker 2 (pid 200)',
+                                 (2, 1): 'worker 1 (pid 100)', (1, None): 'node1', (2, None): 'node2'})
+        self.assertEqual([(e['pid'], e['tid']) for e in self._spans(events) if e['name'] == 'Xtandem'], [(2, 1)])
+
+    def test_write_trace(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = write_trace(self.records, os.path.join(tmp, 'trace.json'))
+            trace = json.load(open(path))
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(trace['displayTimeUnit'], 'ms')
+        self.assertEqual(len(self._spans(trace['traceEvents'])), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
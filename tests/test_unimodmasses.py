@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from searchcake.searchengines import unimodmasses
+
+
+class UnimodMassesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.massfile = os.path.join(self.tmp, 'unimod_masses.tsv')
+        unimodmasses.write_mass_table(self.massfile, {'Oxidation': (15.994915, 15.9994)})
+        self.content = open(self.massfile).read()
+        self.looked_up = []
+        self.saved = unimodmasses.MASSFILE, unimodmasses.unimod_mass, unimodmasses._table
+        unimodmasses.MASSFILE, unimodmasses.unimod_mass, unimodmasses._table = self.massfile, self._unimod, None
+
+    def tearDown(self):
+        unimodmasses.MASSFILE, unimodmasses.unimod_mass, unimodmasses._table = self.saved
+        shutil.rmtree(self.tmp)
+
+    def _unimod(self, label):
+        self.looked_up.append(label)
+        return (79.966331, 79.9799) if label == 'Phospho' else None
+
+    def test_table(self):
+        self.assertEqual(unimodmasses.get_mass('Oxidation'), (15.994915, 15.9994))
+        self.assertEqual(self.looked_up, [])
+
+    def test_misses_are_looked_up_once_and_the_table_is_not_written(self):
+        for _ in range(2):
+            self.assertEqual(unimodmasses.get_mass('Phospho'), (79.966331, 79.9799))
+            self.assertEqual(unimodmasses.get_mass('Nonsense'), None)
+        self.assertEqual(self.looked_up, ['Phospho', 'Nonsense'])
+        self.assertEqual(open(self.massfile).read(), self.content)
+        self.assertEqual(os.listdir(self.tmp), ['unimod_masses.tsv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from applicake2.base.app import BasicApp
+from applicake2.base.coreutils import IniInfoHandler
+from applicake2.base.coreutils.arguments import Argument
+from searchcake.flow import statestore, warmpool
+from searchcake.flow.statestore import StateStore
+from searchcake.flow.warmpool import WarmPool, run_task
+
+
+class ScaleApp(BasicApp):
+    def add_args(self):
+        return [Argument('WORKDIR', 'work directory'), Argument('VALUE', 'value'),
+                Argument('FACTOR', 'factor', default='2')]
+
+    def run(self, log, info):
+        info['RESULT'] = str(int(info['VALUE']) * int(info['FACTOR']))
+        return info
+
+
+class NoIni(object):
+    def read(self, path):
+        raise AssertionError('read %s' % path)
+
+    def write(self, info, path):
+        raise AssertionError('wrote %s' % path)
+
+
+class WarmPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.saved = dict(os.environ)
+        self.info = {'BASEDIR': self.tmp, 'JOB_ID': 'job', 'NAME': 'scale', 'VALUE': '5'}
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_task_of_the_state_store_runs_on_the_info(self):
+        os.environ['SEARCHCAKE_STATE'] = os.path.join(self.tmp, 'state.db')
+        StateStore().put('split.ini_0', self.info)
+        saved = warmpool.IniInfoHandler, statestore.IniInfoHandler
+        warmpool.IniInfoHandler = statestore.IniInfoHandler = NoIni
+        try:
+            run_task(ScaleApp, ['--INPUT', 'split.ini_0', '--OUTPUT', 'scale.ini_0', '--FACTOR', '3'])
+        finally:
+            warmpool.IniInfoHandler, statestore.IniInfoHandler = saved
+        info = StateStore().get('scale.ini_0')
+        self.assertEqual(info['RESULT'], '15')
+        # the work directory of main, named after NAME
+        self.assertEqual(info['WORKDIR'], os.path.join(self.tmp, 'job', 'scale'))
+        self.assertTrue(os.path.isdir(info['WORKDIR']))
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['job', 'state.db'])
+
+    def test_task_of_ini_files(self):
+        IniInfoHandler().write(dict(self.info, NAME='other'), 'split.ini_0')
+        run_task(ScaleApp, ['--INPUT', 'split.ini_0', '--OUTPUT', 'scale.ini_0', '--NAME', 'scale'])
+        info = IniInfoHandler().read('scale.ini_0')
+        # defaults of the arguments < info < arguments of the task
+        self.assertEqual((info['RESULT'], info['NAME']), ('10', 'scale'))
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['job', 'scale.ini_0', 'split.ini_0'])
+
+    def test_failing_task(self):
+        os.environ['SEARCHCAKE_STATE'] = os.path.join(self.tmp, 'state.db')
+        StateStore().put('split.ini_0', dict(self.info, VALUE='x'))
+        self.assertRaises(ValueError, run_task, ScaleApp, ['--INPUT', 'split.ini_0', '--OUTPUT', 'scale.ini_0'])
+        self.assertEqual(StateStore().get('scale.ini_0'), None)
+
+    def test_pool(self):
+        with WarmPool(2) as pool:
+            results = [pool.submit(ScaleApp, dict(self.info, VALUE=str(v))) for v in range(3)]
+            self.assertEqual([r.get()['RESULT'] for r in results], ['0', '2', '4'])
+
+
+if __name__ == '__main__':
+    unittest.main()